@@ -1,2 +1,4 @@
 from .hardware_client import HardwareClient
-from .ni_usb_6525 import RelayController
+from .ni_usb_6525 import RelayController, relays_to_mask
+from .relay_backends import RelayBackend, NidaqmxRelayBackend, SimulatedRelayBackend, create_relay_backend
+from .current_stream import CurrentStream, SampleRingBuffer
@@ -0,0 +1,185 @@
+"""
+asyncio implementation of the Raspberry Pi client.
+
+A single reader task demultiplexes responses by request id, so several commands can be in flight
+at once, a command that misses its deadline does not poison the connection, and late replies are
+simply discarded. Current stream blocks, which carry a stream id instead of a request id, are handed
+to the sink registered for the stream. Failed connection attempts back off exponentially so an unreachable server fails
+fast instead of stalling every caller on a connect timeout.
+"""
+
+import asyncio
+import itertools
+import socket
+
+from utils import event_system, EventType, LogLevel
+from .protocol import FrameReader, ProtocolError, RECV_SIZE, encode_frame
+
+class AsyncHardwareClient:
+    def __init__(self, host, port, command_timeout=5.0, connect_timeout=3.0,
+                 initial_backoff=0.5, max_backoff=10.0):
+        self.host = host
+        self.port = port
+        self.command_timeout = command_timeout
+        self.connect_timeout = connect_timeout
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._connect_lock = None  # Created lazily so it binds to the running loop
+        self._pending = {}  # request_id -> Future awaiting the response
+        self._streams = {}  # stream_id -> callable receiving the stream's pushed messages
+        self._request_ids = itertools.count(1)
+        self._backoff = 0.0
+        self._next_attempt = 0.0
+
+    @property
+    def connected(self):
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self):
+        """Opens the connection unless it is already open or a reconnect backoff is in effect."""
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self.connected:
+                return
+            loop = asyncio.get_running_loop()
+            wait = self._next_attempt - loop.time()
+            if wait > 0:
+                raise ConnectionError(f"Raspberry Pi server unreachable, next reconnect attempt in {wait:.1f} s.")
+            try:
+                self._reader, self._writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), self.connect_timeout)
+            except (OSError, asyncio.TimeoutError) as e:
+                self._backoff = min(max(self._backoff * 2, self.initial_backoff), self.max_backoff)
+                self._next_attempt = loop.time() + self._backoff
+                raise ConnectionError(f"Could not connect to {self.host}:{self.port}: {e or 'timed out'}") from e
+
+            self._backoff = 0.0
+            self._next_attempt = 0.0
+            sock = self._writer.get_extra_info('socket')
+            if sock is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._reader_task = asyncio.create_task(self._read_loop(self._reader))
+            event_system.dispatch_event(EventType.LOG_EVENT, {
+                "message": f"Connected to Raspberry Pi server at {self.host}:{self.port}.",
+                "level": LogLevel.DEBUG
+            })
+
+    async def _read_loop(self, reader):
+        frames = FrameReader()
+        error = ConnectionError("Connection closed by the server.")
+        try:
+            while True:
+                data = await reader.read(RECV_SIZE)
+                if not data:
+                    break
+                frames.feed(data)
+                while (message := frames.next_frame()) is not None:
+                    self._deliver(message)
+        except asyncio.CancelledError:
+            error = ConnectionError("Connection closed.")
+            raise
+        except (OSError, ProtocolError) as e:
+            error = e
+        finally:
+            if self._reader is reader:  # A newer connection may already have replaced this one
+                self._drop_connection(error)
+
+    def _deliver(self, message):
+        if 'stream_id' in message and message.get('request_id') is None:
+            sink = self._streams.get(message['stream_id'])
+            if sink is not None:
+                sink(message)
+            return
+        future = self._pending.pop(message.get('request_id'), None)
+        if future is None or future.done():
+            event_system.dispatch_event(EventType.LOG_EVENT, {
+                "message": f"Discarded stale response with request id {message.get('request_id')}.",
+                "level": LogLevel.DEBUG
+            })
+            return
+        future.set_result(message)
+
+    def _drop_connection(self, error):
+        """Closes the transport and fails every command still waiting for a reply."""
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+        streams, self._streams = self._streams, {}
+        for stream_id, sink in streams.items():
+            sink({'stream_id': stream_id, 'event': 'end', 'reason': str(error)})
+
+    async def send_commands(self, commands, timeout=None):
+        """
+        Pipelines the commands and returns their responses in command order.
+        Raises asyncio.TimeoutError if the whole exchange does not finish within the deadline.
+        """
+        timeout = self.command_timeout if timeout is None else timeout
+        return await asyncio.wait_for(self._exchange(commands), timeout)
+
+    async def send_command(self, command, timeout=None):
+        return (await self.send_commands([command], timeout))[0]
+
+    async def _exchange(self, commands):
+        await self.connect()
+        loop = asyncio.get_running_loop()
+        request_ids = [next(self._request_ids) for _ in commands]
+        futures = []
+        for request_id in request_ids:
+            future = loop.create_future()
+            self._pending[request_id] = future
+            futures.append(future)
+        try:
+            self._writer.write(b''.join(
+                encode_frame({**command, 'request_id': request_id})
+                for command, request_id in zip(commands, request_ids)
+            ))
+            await self._writer.drain()
+            return list(await asyncio.gather(*futures))
+        finally:
+            # On timeout or cancellation, forget the requests so late replies are discarded
+            for request_id in request_ids:
+                self._pending.pop(request_id, None)
+
+    async def start_stream(self, command, sink, timeout=None):
+        """
+        Sends a command that opens a server-pushed stream and registers sink for its messages before
+        the first block can arrive. Returns the response; the stream id is in response['stream_id'].
+        """
+        stream_id = next(self._request_ids)
+        self._streams[stream_id] = sink
+        try:
+            response = await self.send_command({**command, 'stream_id': stream_id}, timeout)
+        except BaseException:
+            self._streams.pop(stream_id, None)
+            raise
+        if response.get('status') != 'success':
+            self._streams.pop(stream_id, None)
+        return {**response, 'stream_id': stream_id}
+
+    async def stop_stream(self, stream_id, timeout=None):
+        """Stops a stream. Its end message is delivered before the sink is removed."""
+        try:
+            return await self.send_command({'command': 'stop_stream', 'stream_id': stream_id}, timeout)
+        finally:
+            self._streams.pop(stream_id, None)
+
+    async def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._reader_task = None
+        if self._writer is not None:
+            self._drop_connection(ConnectionError("Connection closed."))
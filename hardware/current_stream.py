@@ -0,0 +1,98 @@
+"""
+Client side of a streamed current acquisition.
+
+Sample blocks pushed by the server are decoded straight into NumPy arrays and copied into a
+preallocated ring buffer, so a kHz stream costs a few array operations per block instead of
+Python objects per sample. See hardware.protocol for the block format.
+"""
+
+import base64
+import threading
+
+import numpy as np
+
+SAMPLE_DTYPE = np.dtype('<f4')
+
+def decode_samples(encoded):
+    """Unpacks the base64 float32 samples of a stream block into a float32 array."""
+    return np.frombuffer(base64.b64decode(encoded), dtype=SAMPLE_DTYPE).astype(np.float32, copy=False)
+
+class SampleRingBuffer:
+    """
+    Fixed-capacity buffer of (timestamp, current) samples in preallocated arrays. Once full, the
+    oldest samples are overwritten. One thread writes while others read, so access is locked.
+    """
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("Capacity must be at least one sample.")
+        self.capacity = capacity
+        self._times = np.empty(capacity, dtype=np.float64)  # Seconds since the acquisition started
+        self._currents = np.empty(capacity, dtype=np.float32)  # mA
+        self.written = 0  # Samples written in total, also the position after the newest sample
+        self._lock = threading.Lock()
+
+    def extend(self, times, currents):
+        count = len(currents)
+        skipped = max(0, count - self.capacity)  # More samples than fit: only the newest are kept
+        times = np.asarray(times, dtype=np.float64)[skipped:]
+        currents = np.asarray(currents, dtype=np.float32)[skipped:]
+        with self._lock:
+            start = (self.written + skipped) % self.capacity
+            first = min(len(currents), self.capacity - start)
+            self._times[start:start + first] = times[:first]
+            self._currents[start:start + first] = currents[:first]
+            rest = len(currents) - first
+            if rest:
+                self._times[:rest] = times[first:]
+                self._currents[:rest] = currents[first:]
+            self.written += count
+
+    def read(self, since=0):
+        """
+        Returns (times, currents, position): copies of the samples written after position `since`,
+        oldest first, and the position to pass on the next call. Overwritten samples are skipped.
+        """
+        with self._lock:
+            end = self.written
+            since = min(max(since, end - self.capacity, 0), end)
+            start, stop = since % self.capacity, end % self.capacity
+            if since == end:
+                return self._times[:0].copy(), self._currents[:0].copy(), end
+            if start < stop:
+                return self._times[start:stop].copy(), self._currents[start:stop].copy(), end
+            return (np.concatenate((self._times[start:], self._times[:stop])),
+                    np.concatenate((self._currents[start:], self._currents[:stop])), end)
+
+    def __len__(self):
+        return min(self.written, self.capacity)
+
+class CurrentStream:
+    """
+    A running current stream, see HardwareClient.start_current_stream. Blocks are fed in on the
+    client's I/O loop; readers poll the buffer and can wait on `ended`.
+    """
+
+    def __init__(self, stream_id, rate, capacity):
+        self.stream_id = stream_id
+        self.rate = rate  # Samples per second
+        self.buffer = SampleRingBuffer(capacity)
+        self.blocks = 0
+        self.lost_samples = 0  # Samples missing between blocks
+        self.ended = threading.Event()
+        self.end_reason = None
+        self._next_index = 0
+
+    def feed(self, message):
+        if message.get('event') == 'end':
+            self.end_reason = message.get('reason')
+            self.ended.set()
+            return
+        currents = decode_samples(message['samples'])
+        index = message['index']
+        if index > self._next_index:
+            self.lost_samples += index - self._next_index
+        times = message['timestamp'] + np.arange(len(currents)) / self.rate
+        self.buffer.extend(times, currents)
+        self._next_index = index + len(currents)
+        self.blocks += 1
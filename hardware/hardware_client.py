@@ -1,72 +1,173 @@
-import socket
-import json
+import asyncio
+import concurrent.futures
 import threading
 
 from utils import event_system, EventType, LogLevel
-from .ni_usb_6525 import RelayController
+from .ni_usb_6525 import RelayController, relays_to_mask, mask_to_relays
+from .async_hardware_client import AsyncHardwareClient
+from .relay_watchdog import RelayWatchdog
+from .current_stream import CurrentStream
+from .protocol import ProtocolError
+
+DEFAULT_HOST = '192.168.0.2'
+DEFAULT_PORT = 65432
 
 class HardwareClient:
+    """
+    One client per Raspberry Pi endpoint, keyed by (host, port), so each test station has its own.
+    The first client created is the primary one: HardwareClient() without arguments returns it, and
+    only it handles the global hardware events dispatched by the UI. Station clients are driven directly.
+    The relay selection (DEFAULT_RELAY_SELECTED) applies to every station, so every client handles it.
+    """
     _instance = None
+    _instances = {}  # (host, port) -> HardwareClient
+    _instances_lock = threading.Lock()
 
-    def __new__(cls, *args, **kwargs):
-        if not cls._instance:
-            cls._instance = super(HardwareClient, cls).__new__(cls)
-            cls._instance._initialized = False
-        return cls._instance
+    def __new__(cls, host=None, port=None, *args, **kwargs):
+        with cls._instances_lock:
+            if host is None and port is None and cls._instance:
+                return cls._instance
+            key = (host or DEFAULT_HOST, port or DEFAULT_PORT)
+            instance = cls._instances.get(key)
+            if instance is None:
+                instance = super(HardwareClient, cls).__new__(cls)
+                instance._initialized = False
+                cls._instances[key] = instance
+                if cls._instance is None:
+                    cls._instance = instance
+            return instance
 
-    def __init__(self, host='192.168.0.2', port=65432):
+    def __init__(self, host=None, port=None, timeout=5.0, relay_backend=None, relay_device='Dev1'):
         if self._initialized:
             return
         self._initialized = True
 
-        self.host = host
-        self.port = port
-        self.socket = None
+        self.host = host or DEFAULT_HOST
+        self.port = port or DEFAULT_PORT
+        self.timeout = timeout  # Per-command deadline in seconds
         self.use_backup_relay = False
-        self.backup_relay = RelayController()
-        self.relay_timers = {}  # For managing relay timers
+        self.relay_backend = relay_backend  # Backend for the backup relay, see hardware.relay_backends
+        self.relay_device = relay_device  # NI-DAQmx device name of this station's backup relay
+        self._backup_relay = None  # Created on first use so startup does not pay for the DAQmx task setup
+        self._backup_relay_lock = threading.Lock()
+        self.relay_watchdog = RelayWatchdog(self._turn_off_expired_relays)  # Enforces relay on-time limits
+
+        # All socket I/O runs on a private event loop so callers on any thread never block on the network
+        # for longer than the command deadline.
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop.run_forever, name="HardwareClientLoop", daemon=True)
+        self._loop_thread.start()
+        self._client = AsyncHardwareClient(self.host, self.port, command_timeout=timeout)
+        self.streaming_supported = True  # Cleared when the server does not know the stream commands
 
-        event_system.register_listener(EventType.VERIFY_RASPBERRY_PI_CONNECTION, self.check_connection)
-        event_system.register_listener(EventType.DEFAULT_RELAY_SELECTED, self.set_default_relay)
-        event_system.register_listener(EventType.SET_HIPOT_VOLTAGE, self.set_hipot_voltage)
-        event_system.register_listener(EventType.SET_RELAYS, self.set_relays)
+        self.is_primary = HardwareClient._instance is self
+        for event_type, listener in self._event_listeners():
+            event_system.register_listener(event_type, listener)
+
+    def _event_listeners(self):
+        listeners = [(EventType.DEFAULT_RELAY_SELECTED, self.set_default_relay)]
+        if self.is_primary:
+            listeners += [
+                (EventType.VERIFY_RASPBERRY_PI_CONNECTION, self.verify_connection),
+                (EventType.SET_HIPOT_VOLTAGE, self.set_hipot_voltage),
+                (EventType.SET_RELAYS, self.set_relays),
+                (EventType.SET_TEST_CONDITIONS, self.set_test_conditions),
+            ]
+        return listeners
     
-    def close(self):
-        """Closes the socket connection if it's open and cancels relay timers."""
-        # Cancel all relay timers
-        for timer in self.relay_timers.values():
-            timer.cancel()
-        self.relay_timers.clear()
+    @property
+    def backup_relay(self):
+        with self._backup_relay_lock:
+            if self._backup_relay is None:
+                self._backup_relay = RelayController(self.relay_device, backend=self.relay_backend)
+            return self._backup_relay
 
-        if self.socket:
+    def close(self):
+        """Closes the connection if it's open, stops the relay watchdog and stops the I/O loop."""
+        with HardwareClient._instances_lock:
+            HardwareClient._instances.pop((self.host, self.port), None)
+        for event_type, listener in self._event_listeners():
             try:
-                self.socket.close()
-                event_system.dispatch_event(EventType.LOG_EVENT, {"message": "Hardware client closed.", "level": LogLevel.INFO})
-            except Exception as e:
-                event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Error closing HardwareClient socket: {e}", "level": LogLevel.ERROR})
-            finally:
-                self.socket = None
-
-    def send_command(self, command):
+                event_system.unregister_listener(event_type, listener)
+            except ValueError:
+                pass
+        self.relay_watchdog.stop()
+        if self._backup_relay is not None:
+            self._backup_relay.close()
+
+        if not self._loop.is_running():
+            return
         try:
-            if not self.socket:
-                self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.socket.connect((self.host, self.port))
-            self.socket.sendall(json.dumps(command).encode())
-            data = self.socket.recv(1024)
-            response = json.loads(data.decode())
-            return response
-        except ConnectionError as e:
+            asyncio.run_coroutine_threadsafe(self._client.close(), self._loop).result(timeout=self.timeout)
+            event_system.dispatch_event(EventType.LOG_EVENT, {"message": "Hardware client closed.", "level": LogLevel.INFO})
+        except Exception as e:
+            event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Error closing HardwareClient connection: {e}", "level": LogLevel.ERROR})
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join(timeout=self.timeout)
+
+    def submit_commands(self, commands, timeout=None):
+        """
+        Schedules a pipelined exchange on the I/O loop and returns a concurrent.futures.Future
+        without waiting for it. Cancelling the future cancels the exchange.
+        """
+        return asyncio.run_coroutine_threadsafe(self._client.send_commands(commands, timeout), self._loop)
+
+    def _submit_single(self, coroutine):
+        """Schedules a coroutine returning one response, shaped like submit_commands for _resolve."""
+        async def as_list():
+            return [await coroutine]
+        return asyncio.run_coroutine_threadsafe(as_list(), self._loop)
+
+    def send_command(self, command, timeout=None):
+        return self.send_commands([command], timeout)[0]
+
+    def send_commands(self, commands, timeout=None):
+        """
+        Pipelines several commands to the server without waiting for each reply in between.
+        All frames go out in a single write and the responses are returned in command order.
+        Blocks the calling thread until the responses arrive or the deadline passes.
+        """
+        if not commands:
+            return []
+        return self._resolve(self.submit_commands(commands, timeout), commands, timeout)
+
+    def _resolve(self, future, commands, timeout=None):
+        """Waits for a submitted exchange and turns failures into error responses."""
+        command_names = ", ".join(f"'{command.get('command')}'" for command in commands)
+        # The deadline is enforced on the loop; the margin only guards against a stopped loop
+        deadline = (self.timeout if timeout is None else timeout) + 1.0
+        try:
+            return future.result(timeout=deadline)
+        except (asyncio.TimeoutError, concurrent.futures.TimeoutError):
+            future.cancel()
+            event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Timed out waiting for response to {command_names}.", "level": LogLevel.ERROR})
+            error = {'status': 'error', 'message': 'Timed out'}
+        except asyncio.CancelledError:
+            event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Command {command_names} was cancelled.", "level": LogLevel.WARNING})
+            error = {'status': 'error', 'message': 'Cancelled'}
+        except (ConnectionError, OSError) as e:
             event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Connection error: {e}", "level": LogLevel.ERROR})
-            return {'status': 'error', 'message': 'Connection failed'}
+            error = {'status': 'error', 'message': 'Connection failed'}
+        except ProtocolError as e:
+            event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Protocol error: {e}", "level": LogLevel.ERROR})
+            error = {'status': 'error', 'message': 'Malformed response'}
         except Exception as e:
             event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Unexpected error: {e}", "level": LogLevel.ERROR})
-            return {'status': 'error', 'message': 'Unexpected error occurred'}
+            error = {'status': 'error', 'message': 'Unexpected error occurred'}
+        return [dict(error) for _ in commands]
+
+    def stuck_relays(self):
+        """Relays the watchdog failed to switch off and is still retrying; no unit may start meanwhile."""
+        return self.relay_watchdog.faulted()
 
     def check_connection(self, event_data=None):  # Add event_data parameter with default None
         command = {'command': 'check_connection'}
         debug_level = event_data.get('level', LogLevel.DEBUG) if event_data else LogLevel.DEBUG
         response = self.send_command(command)
+        return self._report_connection(response, debug_level)
+
+    def _report_connection(self, response, debug_level):
         if response['status'] == 'success' and response['message'] == 'Connection established':
             event_system.dispatch_event(EventType.LOG_EVENT, {"message": "Connection to Raspberry Pi server verified.", "level": debug_level})
             return True
@@ -74,6 +175,34 @@ class HardwareClient:
             event_system.dispatch_event(EventType.LOG_EVENT, {"message": "Connection to Raspberry Pi server failed.", "level": LogLevel.ERROR})
             return False
 
+    def submit_connection_check(self):
+        """Starts a connection check without waiting for it. See connection_verified."""
+        return self.submit_commands([{'command': 'check_connection'}])
+
+    def connection_verified(self, future, debug_level=LogLevel.DEBUG):
+        """
+        Returns True if a check from submit_connection_check has already succeeded. Never blocks;
+        a check that is still pending or failed returns False so the caller can check again.
+        """
+        if not future.done() or future.cancelled() or future.exception() is not None:
+            return False
+        response = future.result()[0]
+        if response.get('status') == 'success' and response.get('message') == 'Connection established':
+            event_system.dispatch_event(EventType.LOG_EVENT, {"message": "Connection to Raspberry Pi server verified ahead of the test.", "level": debug_level})
+            return True
+        return False
+
+    def verify_connection(self, event_data=None):
+        """
+        Non-blocking variant of check_connection used by the VERIFY_RASPBERRY_PI_CONNECTION event,
+        which is dispatched from the Tk main thread. The result is reported through LOG_EVENT.
+        """
+        debug_level = event_data.get('level', LogLevel.DEBUG) if event_data else LogLevel.DEBUG
+        commands = [{'command': 'check_connection'}]
+        future = self.submit_commands(commands)
+        future.add_done_callback(lambda f: self._report_connection(self._resolve(f, commands)[0], debug_level))
+        return future
+
     def initialize(self):
         if self.check_connection():
             event_system.dispatch_event(EventType.LOG_EVENT, {"message": "Hardware client initialized.", "level": LogLevel.INFO})
@@ -82,11 +211,15 @@ class HardwareClient:
             event_system.dispatch_event(EventType.LOG_EVENT, {"message": "Hardware client initialization failed.", "level": LogLevel.ERROR})
             return False
 
-    def set_relays(self, event_data):
+    def _parse_relay_request(self, event_data):
+        """Validates a relay request and returns (relay_indices, state, timeout)."""
+        if "relay_mask" in event_data:
+            # Requests from compiled test plan steps were validated when the plan was loaded
+            return event_data["relays"], event_data["state"], event_data.get("timeout", 10)
         relay_indices = event_data.get("relays")
         timeout = event_data.get("timeout", 10)
         state = event_data.get("state")
-        
+
         # Ensure relay_indices is a tuple of integers
         if isinstance(relay_indices, int):
             relay_indices = (relay_indices,)
@@ -118,6 +251,18 @@ class HardwareClient:
             event_system.dispatch_event(EventType.LOG_EVENT, {"message": error_msg, "level": LogLevel.ERROR})
             raise TypeError(error_msg)
 
+        return relay_indices, state, timeout
+
+    def _relay_command(self, relay_indices, state):
+        return {
+            'command': 'set_relays',
+            'relay_indices': relay_indices,
+            'state': state
+        }
+
+    def set_relays(self, event_data):
+        relay_indices, state, timeout = self._parse_relay_request(event_data)
+
         # DEBUG Log: Relays being set and their target state
         relay_state_str = "open" if state else "closed"
         event_system.dispatch_event(EventType.LOG_EVENT, {
@@ -131,65 +276,110 @@ class HardwareClient:
             self.backup_relay.set_relay_state(relay_indices, state)
         else:
             # Send command to server
-            command = {
-                'command': 'set_relays',
-                'relay_indices': relay_indices,
-                'state': state
-            }
-            self.send_command(command)
-
-        # Safety feature: manage timers
-        for relay_index in relay_indices:
-            if state:  # Relay is being turned ON
-                # Cancel existing timer if any
-                if relay_index in self.relay_timers:
-                    self.relay_timers[relay_index].cancel()
-
-                # DEBUG Log: Starting timer for relay
-                event_system.dispatch_event(EventType.LOG_EVENT, {
-                    "message": f"Starting timer for relay {relay_index} with timeout {timeout} seconds.",
-                    "level": LogLevel.DEBUG
-                })
-
-                # Define function to turn off relay after timeout
-                def turn_off_relay(relay_index=relay_index):
-                    # Turn off the relay
-                    if self.use_backup_relay:
-                        self.backup_relay.set_relay_state(relay_index, False)
-                    else:
-                        command = {
-                            'command': 'set_relays',
-                            'relay_indices': [relay_index],
-                            'state': False
-                        }
-                        self.send_command(command)
-                    # Remove timer from dictionary
-                    del self.relay_timers[relay_index]
-                    event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Relay {relay_index} automatically turned off after timeout.", "level": LogLevel.WARNING})
-
-                # Start new timer
-                t = threading.Timer(timeout, turn_off_relay)
-                t.start()
-                # Save timer
-                self.relay_timers[relay_index] = t
-            else:  # Relay is being turned OFF
-                # Cancel existing timer if any
-                if relay_index in self.relay_timers:
-                    self.relay_timers[relay_index].cancel()
-                    del self.relay_timers[relay_index]
+            self.send_command(self._relay_command(relay_indices, state))
 
-    def set_hipot_voltage(self, event_data):
-        voltage = event_data.get("voltage")
-        command = {
+        self._update_relay_timers(relay_indices, state, timeout)
+
+    def _update_relay_timers(self, relay_indices, state, timeout):
+        # Safety feature: relays that are turned ON are switched off again by the watchdog after the timeout
+        if state:
+            event_system.dispatch_event(EventType.LOG_EVENT, {
+                "message": f"Arming watchdog for relay(s) {relay_indices} with timeout {timeout} seconds.",
+                "level": LogLevel.DEBUG
+            })
+            self.relay_watchdog.arm(relay_indices, timeout)
+        else:
+            self.relay_watchdog.disarm(relay_indices)
+
+    def _turn_off_expired_relays(self, relay_indices):
+        """
+        Called from the watchdog thread with the relays whose on-time limit expired. Raises if the relays
+        could not be switched off, so the watchdog reports the failure.
+        """
+        if self.use_backup_relay:
+            if not self.backup_relay.set_relay_state(tuple(relay_indices), False):
+                raise RuntimeError("the backup relay port could not be written")
+        else:
+            response = self.send_command(self._relay_command(relay_indices, False))
+            if response.get('status') != 'success':
+                raise RuntimeError(response.get('message', 'no response from the Raspberry Pi server'))
+        event_system.dispatch_event(EventType.LOG_EVENT, {
+            "message": f"Relay(s) {relay_indices} automatically turned off after timeout.",
+            "level": LogLevel.WARNING
+        })
+
+    def _hipot_voltage_command(self, voltage):
+        return {
             'command': 'set_hipot_voltage',
             'voltage': voltage
         }
-        return self.send_command(command)
+
+    def set_hipot_voltage(self, event_data):
+        voltage = event_data.get("voltage")
+        return self.send_command(self._hipot_voltage_command(voltage))
+
+    def set_test_conditions(self, event_data):
+        """
+        Applies the hi-pot voltage and the relay pattern of a sub-test in one pipelined exchange.
+        With the backup relay selected, only the voltage goes to the server and the relays are set locally.
+        """
+        voltage = event_data.get("voltage")
+        relay_indices, state, timeout = self._parse_relay_request(event_data)
+
+        event_system.dispatch_event(EventType.LOG_EVENT, {
+            "message": f"Setting hi-pot voltage to {voltage}V and relay(s) {relay_indices} to {'open' if state else 'closed'}.",
+            "level": LogLevel.DEBUG
+        })
+
+        if self.use_backup_relay:
+            responses = [self.send_command(self._hipot_voltage_command(voltage))]
+            if state:
+                # Energize exactly this sub-test's relay pair in one port write; the write opens every other relay
+                cleared = mask_to_relays(self.backup_relay.mask & ~relays_to_mask(relay_indices))
+                if self.backup_relay.apply_relay_pattern(relay_indices):
+                    self.relay_watchdog.disarm(cleared)
+            else:
+                self.backup_relay.set_relay_state(relay_indices, state)
+        else:
+            responses = self.send_commands([
+                self._hipot_voltage_command(voltage),
+                self._relay_command(relay_indices, state)
+            ])
+
+        self._update_relay_timers(relay_indices, state, timeout)
+        return responses
 
     def read_current(self):
         command = {'command': 'read_current'}
         return self.send_command(command)
 
+    def start_current_stream(self, rate=1000, block_size=50, capacity=None, max_duration=10.0):
+        """
+        Asks the server to push current samples at `rate` per second in blocks of block_size, for at
+        most max_duration seconds. Returns a CurrentStream whose ring buffer holds the last `capacity`
+        samples (default: max_duration worth), or None if the stream could not be started.
+        """
+        if not self.streaming_supported:
+            return None
+        stream = CurrentStream(None, rate, capacity or int(rate * max_duration) + block_size)
+        command = {'command': 'start_stream', 'rate': rate, 'block_size': block_size, 'max_duration': max_duration}
+        future = self._submit_single(self._client.start_stream(command, stream.feed))
+        response = self._resolve(future, [command])[0]
+        if response.get('status') != 'success':
+            if str(response.get('message', '')).startswith('Unknown command'):
+                self.streaming_supported = False
+                event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Raspberry Pi server at {self.host}:{self.port} does not stream current samples, polling instead.", "level": LogLevel.WARNING})
+            else:
+                event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Could not start current stream: {response.get('message')}", "level": LogLevel.ERROR})
+            return None
+        stream.stream_id = response['stream_id']
+        return stream
+
+    def stop_current_stream(self, stream):
+        command = {'command': 'stop_stream', 'stream_id': stream.stream_id}
+        future = self._submit_single(self._client.stop_stream(stream.stream_id))
+        return self._resolve(future, [command])[0]
+
     def get_serial_number(self):
         command = {'command': 'get_serial_number'}
         return self.send_command(command)
@@ -198,11 +388,11 @@ class HardwareClient:
         selected_relay = event_data.get("selected_relay")
         if selected_relay == "Electromechanical":
             self.use_backup_relay = False
-            event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Default relay set to {selected_relay.lower()}.", "level": LogLevel.INFO})
+            event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Default relay of {self.host}:{self.port} set to {selected_relay.lower()}.", "level": LogLevel.INFO})
         elif selected_relay == "Solid State":
             self.use_backup_relay = True
-            event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Default relay set to {selected_relay.lower()}.", "level": LogLevel.INFO})
-        elif selected_relay is None:
+            event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Default relay of {self.host}:{self.port} set to {selected_relay.lower()}.", "level": LogLevel.INFO})
+        elif selected_relay is None and self.is_primary:
             event_system.dispatch_event(EventType.LOG_EVENT, {"message": "Default relay was not updated.", "level": LogLevel.INFO})
 
     def stop_tests(self):
@@ -6,24 +6,43 @@ relay connected to the Raspberry Pi fails.
 import time
 import logging
 
-import nidaqmx
-from nidaqmx.constants import LineGrouping
-from nidaqmx.system import System
-from nidaqmx.errors import DaqError
+from .relay_backends import DaqError, create_relay_backend
+
+RELAY_COUNT = 8
+ALL_RELAYS_MASK = (1 << RELAY_COUNT) - 1
+
+def relays_to_mask(relay_indices):
+    """Converts a relay index or a tuple/list of indices into an 8-bit port mask."""
+    if isinstance(relay_indices, int):
+        relay_indices = (relay_indices,)
+    elif not isinstance(relay_indices, (list, tuple)):
+        raise TypeError("Parameter 'relay_indices' must be an integer or a tuple/list of integers.")
+    mask = 0
+    for index in relay_indices:
+        if not isinstance(index, int) or not 0 <= index < RELAY_COUNT:
+            raise ValueError("Relay indices must be integers between 0 and 7.")
+        mask |= 1 << index
+    return mask
+
+def mask_to_relays(mask):
+    return tuple(index for index in range(RELAY_COUNT) if mask & (1 << index))
 
 class RelayController:
-    def __init__(self, device_name='Dev1'):
+    def __init__(self, device_name='Dev1', backend=None):
+        """
+        Args:
+            device_name (str): NI device name as shown in NI MAX.
+            backend (RelayBackend): Port driver. Defaults to create_relay_backend(), i.e. NI-DAQmx
+                                    unless HV_TESTER_RELAY_BACKEND selects another backend.
+        """
         self.device_name = device_name
-        self.task = None
-        self.state = [False] * 8  # Initial state: all relays OFF (open)
+        self.backend = backend or create_relay_backend()
+        self.mask = 0  # Relay states as an 8-bit port value, bit n = relay n. Initial state: all relays OFF (open)
         self.connected = False  # Flag to indicate device connection status
 
         try:
-            self.task = nidaqmx.Task()
-            # Initialize the digital output channels for all 8 relays
-            self.task.do_channels.add_do_chan(
-                f'{device_name}/port0/line0:7', line_grouping=LineGrouping.CHAN_PER_LINE)
-            self.task.write(self.state)
+            self.backend.open(device_name)
+            self.backend.write(self.mask)
             self.connected = True
             logging.info(f"RelayController initialized for device '{self.device_name}'.")
         except DaqError as e:
@@ -31,19 +50,49 @@ class RelayController:
             logging.error(f"Failed to initialize RelayController for device '{self.device_name}': {e}")
             # Additional handling can be performed here, such as notifying the user or attempting retries
 
+    @property
+    def state(self):
+        """Relay states as a list of 8 bools, derived from the port mask."""
+        return [bool(self.mask & (1 << index)) for index in range(RELAY_COUNT)]
+
+    def _write_mask(self, mask, description):
+        """Writes the port mask in one DAQmx call, skipping the write if nothing changes."""
+        if mask == self.mask:
+            return True
+        try:
+            self.backend.write(mask)
+            self.mask = mask
+            logging.info(description)
+            return True
+        except DaqError as e:
+            logging.error(f"Failed to write relay port: {e}")
+            self.connected = False
+            # Handle the disconnection, possibly attempt to reconnect or alert the user
+            return False
+
+    def set_relay_mask(self, mask):
+        """
+        Sets all 8 relays at once from a port mask, e.g. a precomputed sub-test pattern.
+        Returns True if the port was written.
+        """
+        if not self.connected:
+            logging.warning("Attempted to set relay mask, but RelayController is not connected.")
+            return False
+        if not isinstance(mask, int) or not 0 <= mask <= ALL_RELAYS_MASK:
+            raise ValueError("Relay mask must be an integer between 0 and 255.")
+        return self._write_mask(mask, f"Set relay port to {mask:#010b}.")
+
+    def apply_relay_pattern(self, relay_indices):
+        """Turns on exactly the given relays and turns off all others in one atomic port write."""
+        return self.set_relay_mask(relays_to_mask(relay_indices))
+
     def set_relay_state(self, relay_indices, state):
+        """Switches the given relays and leaves the others as they are. Returns True if the port was written."""
         if not self.connected:
             logging.warning("Attempted to set relay state, but RelayController is not connected.")
-            return
+            return False
 
-        # Ensure relay_indices is a tuple of integers
-        if isinstance(relay_indices, int):
-            relay_indices = (relay_indices,)
-        elif isinstance(relay_indices, (list, tuple)):
-            if not all(isinstance(i, int) and 0 <= i <= 7 for i in relay_indices):
-                raise ValueError("Relay indices must be integers between 0 and 7.")
-        else:
-            raise TypeError("Parameter 'relay_indices' must be an integer or a tuple/list of integers.")
+        relay_mask = relays_to_mask(relay_indices)
 
         # Validate state
         if isinstance(state, str):
@@ -59,48 +108,25 @@ class RelayController:
             raise TypeError("State must be 'open', 'closed', True, or False.")
 
         # Update the state of specified relays
-        for index in relay_indices:
-            self.state[index] = relay_state
-
-        try:
-            # Write the new state to the device
-            self.task.write(self.state)
-            logging.info(f"Set relay(s) {relay_indices} to {'ON (closed)' if relay_state else 'OFF (open)'}.")
-        except DaqError as e:
-            logging.error(f"Failed to set relay state: {e}")
-            self.connected = False
-            # Handle the disconnection, possibly attempt to reconnect or alert the user
+        new_mask = self.mask | relay_mask if relay_state else self.mask & ~relay_mask
+        return self._write_mask(new_mask, f"Set relay(s) {mask_to_relays(relay_mask)} to {'ON (closed)' if relay_state else 'OFF (open)'}.")
 
     def turn_on_all_relays(self):
         if not self.connected:
             logging.warning("Attempted to turn on all relays, but RelayController is not connected.")
             return
 
-        self.state = [True] * 8
-        try:
-            self.task.write(self.state)
-            logging.info("All relays turned ON (closed).")
-        except DaqError as e:
-            logging.error(f"Failed to turn on all relays: {e}")
-            self.connected = False
+        self._write_mask(ALL_RELAYS_MASK, "All relays turned ON (closed).")
 
     def turn_off_all_relays(self):
         if not self.connected:
             logging.warning("Attempted to turn off all relays, but RelayController is not connected.")
             return
 
-        self.state = [False] * 8
-        try:
-            self.task.write(self.state)
-            logging.info("All relays turned OFF (open).")
-        except DaqError as e:
-            logging.error(f"Failed to turn off all relays: {e}")
-            self.connected = False
+        self._write_mask(0, "All relays turned OFF (open).")
 
     def check_device_connection(self):
-        system = System.local()
-        device_names = [device.name for device in system.devices]
-        if self.device_name in device_names:
+        if self.backend.is_device_present(self.device_name):
             logging.info(f"Device '{self.device_name}' is connected.")
             self.connected = True
             return True
@@ -110,17 +136,15 @@ class RelayController:
             return False
 
     def close(self):
-        if self.task:
-            try:
-                self.task.close()
-                logging.info("RelayController task closed.")
-            except DaqError as e:
-                logging.error(f"Failed to close RelayController task: {e}")
+        try:
+            self.backend.close()
+            logging.info("RelayController task closed.")
+        except DaqError as e:
+            logging.error(f"Failed to close RelayController task: {e}")
 
     def __del__(self):
         # Ensure the task is closed when the object is deleted
         try:
-            if self.task:
-                self.task.close()
+            self.backend.close()
         except Exception as e:
             logging.error(f"Error during RelayController deletion: {e}")
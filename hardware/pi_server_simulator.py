@@ -0,0 +1,351 @@
+"""
+Local stand-in for the Raspberry Pi server, for running and load testing the tester without hardware.
+
+It speaks the framed protocol from hardware.protocol and implements the commands the HardwareClient
+sends, including pushed current streams. Network conditions (latency, jitter, responses split across
+TCP segments, dropped connections) and the leakage current of each relay pair are configurable.
+
+Run standalone with:
+    python -m hardware.pi_server_simulator --port 65432 --latency 0.01 --jitter 0.005
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+
+from .protocol import FrameReader, ProtocolError, RECV_SIZE, encode_frame, encode_samples
+
+MAX_STREAM_RATE = 20000  # Samples per second
+
+@dataclass
+class LeakageModel:
+    """
+    Leakage current of one relay pair: a resistive part V/R, plus a capacitive charging
+    current that decays after the relays close, plus Gaussian measurement noise.
+    """
+    insulation_resistance: float = 0.6  # MOhm, so V / R gives the current in uA
+    charging_current: float = 0.8  # mA right after the relays close
+    time_constant: float = 0.3  # s
+    noise: float = 0.05  # mA standard deviation
+
+    def current(self, voltage, elapsed, rng):
+        elapsed = max(0.0, elapsed)
+        resistive = abs(voltage) / self.insulation_resistance / 1000.0  # uA -> mA
+        charging = self.charging_current * math.exp(-elapsed / self.time_constant) if voltage else 0.0
+        return max(0.0, resistive + charging + rng.gauss(0.0, self.noise))
+
+# Relay pairs used by the test sequence, see utils.constants.test_number_to_relays
+DEFAULT_LEAKAGE_MODELS = {
+    (2, 3): LeakageModel(insulation_resistance=0.7),
+    (2, 6): LeakageModel(insulation_resistance=0.65),
+    (0, 6): LeakageModel(insulation_resistance=0.6),
+    (0, 7): LeakageModel(insulation_resistance=0.55, charging_current=1.0),
+    (1, 3): LeakageModel(insulation_resistance=0.5, charging_current=1.0),
+    (0, 3): LeakageModel(insulation_resistance=0.45, charging_current=1.2),
+}
+
+@dataclass
+class SimulatorConfig:
+    latency: float = 0.002  # s, one-way network delay applied to every batch of received frames
+    jitter: float = 0.001  # s, uniform extra delay on top of latency
+    processing_time: float = 0.0  # s, per command on the Pi
+    split_probability: float = 0.0  # chance a response is written in several small TCP segments
+    drop_probability: float = 0.0  # chance the connection is dropped instead of answering
+    breakdown_probability: float = 0.0  # chance an energized relay pair breaks down
+    breakdown_current: float = 12.0  # mA
+    leakage_models: dict = field(default_factory=lambda: dict(DEFAULT_LEAKAGE_MODELS))
+    default_leakage: LeakageModel = field(default_factory=LeakageModel)
+    seed: int = None
+
+class _Connection:
+    """Writer and open current streams of one client connection."""
+
+    def __init__(self, simulator, writer):
+        self.simulator = simulator
+        self.writer = writer
+        self.streams = {}  # stream_id -> (stop event, task)
+        self._write_lock = asyncio.Lock()  # Keeps pushed blocks and split responses from interleaving
+
+    async def send(self, message):
+        async with self._write_lock:
+            await self.simulator._write_response(self.writer, encode_frame(message))
+
+    def close(self):
+        for stop, task in self.streams.values():
+            task.cancel()
+        self.streams.clear()
+
+class PiServerSimulator:
+    def __init__(self, host='127.0.0.1', port=65432, config=None):
+        self.host = host
+        self.port = port
+        self.config = config or SimulatorConfig()
+        self.rng = random.Random(self.config.seed)
+
+        # Simulated fixture state, shared by all connections like the real Pi
+        self.relay_states = [False] * 8
+        self.voltage = 0
+        self.energized_since = None
+        self.breakdown = False
+        self._serial_counter = 0
+
+        self.command_counts = {}
+        self.connections = 0
+        self.dropped_connections = 0
+
+        self._server = None
+        self._loop = None
+        self._thread = None
+        self._handlers = {
+            'check_connection': self._check_connection,
+            'set_relays': self._set_relays,
+            'set_hipot_voltage': self._set_hipot_voltage,
+            'read_current': self._read_current,
+            'get_serial_number': self._get_serial_number,
+        }
+        self._stream_handlers = {
+            'start_stream': self._start_stream,
+            'stop_stream': self._stop_stream,
+        }
+
+    # Commands
+
+    def _check_connection(self, message):
+        return {'status': 'success', 'message': 'Connection established'}
+
+    def _set_relays(self, message):
+        indices = message.get('relay_indices')
+        state = message.get('state')
+        if isinstance(indices, int):
+            indices = [indices]
+        if not isinstance(indices, list) or not all(isinstance(i, int) and 0 <= i <= 7 for i in indices):
+            return {'status': 'error', 'message': 'Relay indices must be integers between 0 and 7.'}
+        if not isinstance(state, bool):
+            return {'status': 'error', 'message': 'State must be a boolean.'}
+        for index in indices:
+            self.relay_states[index] = state
+        self._update_energized()
+        return {'status': 'success', 'message': 'Relays set'}
+
+    def _set_hipot_voltage(self, message):
+        voltage = message.get('voltage')
+        if not isinstance(voltage, (int, float)):
+            return {'status': 'error', 'message': 'Voltage must be a number.'}
+        self.voltage = voltage
+        self._update_energized()
+        return {'status': 'success', 'message': 'Voltage set'}
+
+    def _read_current(self, message):
+        return {'status': 'success', 'current': self.measure_current()}
+
+    def _get_serial_number(self, message):
+        self._serial_counter += 1
+        return {'status': 'success', 'serial_number': f"SIM{self._serial_counter:06d}"}
+
+    async def _start_stream(self, message, connection):
+        stream_id = message.get('stream_id')
+        rate = message.get('rate', 1000)
+        block_size = message.get('block_size', 50)
+        max_duration = message.get('max_duration', 10.0)
+        if stream_id is None or stream_id in connection.streams:
+            return {'status': 'error', 'message': 'A new stream needs a unique stream_id.'}
+        if not isinstance(rate, (int, float)) or not 0 < rate <= MAX_STREAM_RATE:
+            return {'status': 'error', 'message': f"Rate must be between 0 and {MAX_STREAM_RATE} samples per second."}
+        if not isinstance(block_size, int) or block_size < 1 or not isinstance(max_duration, (int, float)):
+            return {'status': 'error', 'message': 'Block size must be a positive integer and max_duration a number.'}
+        stop = asyncio.Event()
+        task = asyncio.get_running_loop().create_task(
+            self._stream(connection, stream_id, rate, block_size, max_duration, stop))
+        connection.streams[stream_id] = (stop, task)
+        return {'status': 'success', 'message': 'Stream started', 'rate': rate}
+
+    async def _stop_stream(self, message, connection):
+        stream = connection.streams.get(message.get('stream_id'))
+        if stream is None:
+            return {'status': 'error', 'message': 'Unknown stream.'}
+        stop, task = stream
+        stop.set()
+        await task  # The end message goes out before the response
+        return {'status': 'success', 'message': 'Stream stopped'}
+
+    async def _stream(self, connection, stream_id, rate, block_size, max_duration, stop):
+        """Pushes blocks of samples timed like a hardware ADC until stopped or max_duration has passed."""
+        start = time.monotonic()
+        index = 0
+        reason = 'max_duration'
+        try:
+            while index / rate < max_duration:
+                block_end = start + (index + block_size) / rate
+                try:
+                    await asyncio.wait_for(stop.wait(), max(0.0, block_end - time.monotonic()))
+                    reason = 'stopped'
+                    break
+                except asyncio.TimeoutError:
+                    pass
+                currents = [self.measure_current(start + (index + i) / rate) for i in range(block_size)]
+                await connection.send({'stream_id': stream_id, 'index': index, 'timestamp': index / rate,
+                                       'samples': encode_samples(currents)})
+                index += block_size
+            await connection.send({'stream_id': stream_id, 'event': 'end', 'reason': reason})
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            connection.streams.pop(stream_id, None)
+
+    # Physics
+
+    def closed_relays(self):
+        return tuple(i for i, state in enumerate(self.relay_states) if state)
+
+    def _update_energized(self):
+        if self.voltage and self.closed_relays():
+            if self.energized_since is None:
+                self.energized_since = time.monotonic()
+                self.breakdown = self.rng.random() < self.config.breakdown_probability
+        else:
+            self.energized_since = None
+            self.breakdown = False
+
+    def measure_current(self, at=None):
+        """Returns the simulated leakage current in mA through the currently closed relays, at monotonic time `at`."""
+        if self.energized_since is None:
+            return max(0.0, self.rng.gauss(0.0, self.config.default_leakage.noise / 5))
+        if self.breakdown:
+            return self.config.breakdown_current + self.rng.gauss(0.0, 0.5)
+        model = self.config.leakage_models.get(self.closed_relays(), self.config.default_leakage)
+        return model.current(self.voltage, (at or time.monotonic()) - self.energized_since, self.rng)
+
+    # Networking
+
+    def handle_message(self, message):
+        command = message.get('command')
+        self.command_counts[command] = self.command_counts.get(command, 0) + 1
+        handler = self._handlers.get(command)
+        if handler is None:
+            response = {'status': 'error', 'message': f"Unknown command: {command}"}
+        else:
+            response = handler(message)
+        response['request_id'] = message.get('request_id')
+        return response
+
+    async def _handle_connection(self, reader, writer):
+        self.connections += 1
+        frames = FrameReader()
+        connection = _Connection(self, writer)
+        try:
+            while True:
+                data = await reader.read(RECV_SIZE)
+                if not data:
+                    break
+                frames.feed(data)
+                messages = []
+                while (message := frames.next_frame()) is not None:
+                    messages.append(message)
+                if not messages:
+                    continue
+                await asyncio.sleep(self.config.latency + self.rng.uniform(0.0, self.config.jitter))
+                for message in messages:
+                    if self.rng.random() < self.config.drop_probability:
+                        self.dropped_connections += 1
+                        return
+                    if self.config.processing_time:
+                        await asyncio.sleep(self.config.processing_time)
+                    if message.get('command') in self._stream_handlers:
+                        response = await self._handle_stream_command(message, connection)
+                    else:
+                        response = self.handle_message(message)
+                    await connection.send(response)
+        except (ConnectionError, ProtocolError):
+            pass
+        finally:
+            connection.close()
+            writer.close()
+
+    async def _handle_stream_command(self, message, connection):
+        command = message.get('command')
+        self.command_counts[command] = self.command_counts.get(command, 0) + 1
+        response = await self._stream_handlers[command](message, connection)
+        response['request_id'] = message.get('request_id')
+        return response
+
+    async def _write_response(self, writer, frame):
+        if self.rng.random() < self.config.split_probability and len(frame) > 1:
+            # Split into a few segments and yield in between so they leave as separate writes
+            cuts = sorted(self.rng.sample(range(1, len(frame)), min(3, len(frame) - 1)))
+            for start, end in zip([0] + cuts, cuts + [len(frame)]):
+                writer.write(frame[start:end])
+                await writer.drain()
+                await asyncio.sleep(0.001)
+        else:
+            writer.write(frame)
+            await writer.drain()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]  # Resolves port 0 to the bound port
+        return self.port
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start_in_thread(self):
+        """Starts the simulator on a background event loop and returns the port it listens on."""
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="PiServerSimulator", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.port
+
+    def stop(self):
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._server.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = None
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated Raspberry Pi server for the high voltage tester.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=65432)
+    parser.add_argument('--latency', type=float, default=0.002, help="One-way network delay in seconds.")
+    parser.add_argument('--jitter', type=float, default=0.001, help="Uniform extra delay in seconds.")
+    parser.add_argument('--processing-time', type=float, default=0.0, help="Per-command processing time in seconds.")
+    parser.add_argument('--split', type=float, default=0.0, help="Probability of splitting a response into segments.")
+    parser.add_argument('--drop', type=float, default=0.0, help="Probability of dropping the connection per command.")
+    parser.add_argument('--breakdown', type=float, default=0.0, help="Probability of a breakdown per energization.")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    config = SimulatorConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        processing_time=args.processing_time,
+        split_probability=args.split,
+        drop_probability=args.drop,
+        breakdown_probability=args.breakdown,
+        seed=args.seed
+    )
+    simulator = PiServerSimulator(args.host, args.port, config)
+    print(f"Simulated Raspberry Pi server listening on {args.host}:{args.port}")
+    try:
+        asyncio.run(simulator.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Wire protocol spoken between the HardwareClient and the Raspberry Pi server.
+
+Every message is a 4-byte big-endian length prefix followed by a UTF-8 encoded JSON object.
+Commands carry a 'request_id' which the server echoes back, so responses can be matched to
+the command that produced them even if an earlier reply arrives late.
+
+Current streams are the exception: after 'start_stream' the server pushes sample blocks carrying the
+'stream_id' chosen by the client and no request id, until 'stop_stream' or the stream's max_duration.
+A block holds its first sample 'index', the 'timestamp' of that sample in seconds since the stream
+started, and the 'samples' as base64 of little-endian float32 currents in mA, evenly spaced at the
+stream's rate. The last message of a stream is {'stream_id': ..., 'event': 'end', 'reason': ...}.
+"""
+
+import base64
+import json
+import struct
+import sys
+from array import array
+
+HEADER = struct.Struct('>I')
+MAX_FRAME_SIZE = 16 * 1024 * 1024  # Guard against reading garbage as a huge length
+RECV_SIZE = 65536
+
+class ProtocolError(Exception):
+    """Raised when the byte stream does not contain a valid frame."""
+
+def encode_frame(message):
+    """Serializes a message dict into a length-prefixed frame."""
+    payload = json.dumps(message, separators=(',', ':')).encode('utf-8')
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {len(payload)} bytes exceeds the maximum of {MAX_FRAME_SIZE} bytes.")
+    return HEADER.pack(len(payload)) + payload
+
+def encode_samples(currents):
+    """Packs current samples into the base64 float32 format of stream blocks."""
+    packed = array('f', currents)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return base64.b64encode(packed.tobytes()).decode('ascii')
+
+def decode_payload(payload):
+    """Deserializes the JSON payload of a single frame."""
+    try:
+        message = json.loads(payload.decode('utf-8'))
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ProtocolError(f"Malformed frame payload: {e}") from e
+    if not isinstance(message, dict):
+        raise ProtocolError(f"Frame payload must be a JSON object, not {type(message).__name__}.")
+    return message
+
+def parse_frame_length(header):
+    """Returns the payload length announced by a frame header."""
+    (length,) = HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Announced frame length {length} exceeds the maximum of {MAX_FRAME_SIZE} bytes.")
+    return length
+
+class FrameReader:
+    """
+    Buffers raw bytes from a stream socket and reassembles them into complete frames.
+    Partial reads are kept until the rest of the frame arrives, and several frames
+    received in one read are returned one at a time.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        self._buffer.extend(data)
+
+    def next_frame(self):
+        """Returns the next complete message, or None if more data is needed."""
+        if len(self._buffer) < HEADER.size:
+            return None
+        length = parse_frame_length(self._buffer[:HEADER.size])
+        end = HEADER.size + length
+        if len(self._buffer) < end:
+            return None
+        payload = bytes(self._buffer[HEADER.size:end])
+        del self._buffer[:end]
+        return decode_payload(payload)
+
+    def read_frame(self, sock):
+        """Blocks on the socket until one complete message has been received."""
+        while True:
+            message = self.next_frame()
+            if message is not None:
+                return message
+            data = sock.recv(RECV_SIZE)
+            if not data:
+                raise ConnectionError("Connection closed by the server.")
+            self.feed(data)
+
+    def clear(self):
+        self._buffer.clear()
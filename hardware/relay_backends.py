@@ -0,0 +1,143 @@
+"""
+Backends that drive the relay port for RelayController.
+
+The NI-DAQmx backend imports nidaqmx only when it is opened, so the hardware package can be imported
+on machines without the NI driver stack. The simulated backend keeps the port in memory, records the
+timing of every write and can inject DaqError failures for testing and benchmarking.
+"""
+
+import os
+import random
+import time
+import logging
+from abc import ABC, abstractmethod
+
+try:
+    from nidaqmx.errors import DaqError
+except ImportError:
+    class DaqError(Exception):
+        """Stand-in for nidaqmx.errors.DaqError when the NI driver stack is not installed."""
+        def __init__(self, message, error_code, task_name=''):
+            super().__init__(message)
+            self.error_code = error_code
+            self.task_name = task_name
+
+SIMULATED_ERROR_CODE = -200000  # Generic DAQmx error code used for injected failures
+
+class RelayBackend(ABC):
+    """Interface between RelayController and the device that drives the 8-line relay port."""
+
+    @abstractmethod
+    def open(self, device_name):
+        """Prepares the port for writing. Raises DaqError if the device cannot be used."""
+
+    @abstractmethod
+    def write(self, mask):
+        """Writes the 8-bit relay mask to the port in one operation. Raises DaqError on failure."""
+
+    @abstractmethod
+    def is_device_present(self, device_name):
+        """Returns True if the device is attached."""
+
+    @abstractmethod
+    def close(self):
+        """Releases the port. Safe to call more than once."""
+
+class NidaqmxRelayBackend(RelayBackend):
+    def __init__(self):
+        self.task = None
+
+    def open(self, device_name):
+        try:
+            import nidaqmx
+            from nidaqmx.constants import LineGrouping
+        except ImportError as e:
+            raise DaqError(f"NI-DAQmx is not available: {e}", SIMULATED_ERROR_CODE) from e
+        self.task = nidaqmx.Task()
+        try:
+            # Drive all 8 relay lines as one port channel, so a whole relay pattern is a single write
+            self.task.do_channels.add_do_chan(
+                f'{device_name}/port0/line0:7', line_grouping=LineGrouping.CHAN_FOR_ALL_LINES)
+        except DaqError:
+            self.close()
+            raise
+
+    def write(self, mask):
+        self.task.write(mask)
+
+    def is_device_present(self, device_name):
+        try:
+            from nidaqmx.system import System
+        except ImportError:
+            return False
+        return device_name in [device.name for device in System.local().devices]
+
+    def close(self):
+        if self.task:
+            self.task.close()
+            self.task = None
+
+class SimulatedRelayBackend(RelayBackend):
+    def __init__(self, write_latency=0.0, failure_rate=0.0, fail_on_open=False, seed=None):
+        """
+        Args:
+            write_latency (float): Seconds each write blocks, to mimic USB round trips.
+            failure_rate (float): Probability that any write raises DaqError.
+            fail_on_open (bool): Make open() raise DaqError, as if the device were unplugged.
+            seed (int): Seed for the failure injection.
+        """
+        self.write_latency = write_latency
+        self.failure_rate = failure_rate
+        self.fail_on_open = fail_on_open
+        self.rng = random.Random(seed)
+
+        self.port = 0
+        self.is_open = False
+        self.writes = []  # (perf_counter timestamp, mask, duration in seconds)
+        self.write_count = 0
+        self.failure_count = 0
+        self._forced_failures = 0
+
+    def inject_failures(self, count=1):
+        """Makes the next `count` writes raise DaqError."""
+        self._forced_failures += count
+
+    def open(self, device_name):
+        if self.fail_on_open:
+            raise DaqError(f"Device '{device_name}' is not present (simulated).", SIMULATED_ERROR_CODE)
+        self.is_open = True
+
+    def write(self, mask):
+        start = time.perf_counter()
+        if self._forced_failures or self.rng.random() < self.failure_rate:
+            self._forced_failures = max(0, self._forced_failures - 1)
+            self.failure_count += 1
+            raise DaqError("Simulated relay port write failure.", SIMULATED_ERROR_CODE)
+        if self.write_latency:
+            time.sleep(self.write_latency)
+        self.port = mask
+        self.write_count += 1
+        self.writes.append((start, mask, time.perf_counter() - start))
+
+    def is_device_present(self, device_name):
+        return not self.fail_on_open
+
+    def close(self):
+        self.is_open = False
+
+RELAY_BACKENDS = {
+    'nidaqmx': NidaqmxRelayBackend,
+    'simulated': SimulatedRelayBackend,
+}
+
+def create_relay_backend(name=None):
+    """
+    Creates a relay backend by name. Without a name, the HV_TESTER_RELAY_BACKEND environment
+    variable is used, defaulting to the NI-DAQmx backend.
+    """
+    name = name or os.environ.get('HV_TESTER_RELAY_BACKEND', 'nidaqmx')
+    try:
+        return RELAY_BACKENDS[name]()
+    except KeyError:
+        logging.error(f"Unknown relay backend '{name}', falling back to 'nidaqmx'.")
+        return NidaqmxRelayBackend()
@@ -0,0 +1,149 @@
+"""
+Safety watchdog that forces energized relays off once their on-time limit expires.
+
+One thread serves every relay. Deadlines live in a min-heap, so arming is O(log n); disarming
+only invalidates the relay's entry and stale heap entries are skipped when they reach the top.
+
+A relay whose forced turn-off fails stays tracked: it is retried with an exponential backoff until the
+turn-off succeeds, and is reported by faulted() meanwhile, so stations refuse to start another unit.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+from utils import event_system, EventType, LogLevel
+
+RETRY_INTERVAL = 0.5  # Seconds before the first retry of a failed turn-off
+MAX_RETRY_INTERVAL = 30.0
+
+class RelayWatchdog:
+    def __init__(self, on_expired):
+        """
+        Args:
+            on_expired (callable): Called from the watchdog thread with the sorted list of relay
+                                   indices whose deadline passed. It must switch those relays off.
+        """
+        self._on_expired = on_expired
+        self._heap = []  # (deadline, generation, relay_index)
+        self._armed = {}  # relay_index -> (deadline, generation) of its live heap entry
+        self._generations = itertools.count()
+        self._failures = {}  # relay_index -> consecutive failed turn-offs, for relays that may still be energized
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="RelayWatchdog", daemon=True)
+        self._thread.start()
+
+    def arm(self, relay_indices, timeout):
+        """(Re)starts the on-time limit of the given relays."""
+        with self._condition:
+            self._arm(relay_indices, time.monotonic() + timeout)
+            self._condition.notify()
+
+    def _arm(self, relay_indices, deadline):
+        """Caller holds the lock."""
+        for relay_index in relay_indices:
+            generation = next(self._generations)
+            self._armed[relay_index] = (deadline, generation)
+            heapq.heappush(self._heap, (deadline, generation, relay_index))
+
+    def disarm(self, relay_indices):
+        """Cancels the on-time limit of the given relays. Faulted relays keep their turn-off retry."""
+        with self._condition:
+            for relay_index in relay_indices:
+                if relay_index in self._failures:
+                    self._arm((relay_index,), time.monotonic() + self._retry_interval(relay_index))
+                else:
+                    self._armed.pop(relay_index, None)
+            # Rebuild once stale entries dominate so the heap stays proportional to armed relays
+            if len(self._heap) > 2 * len(self._armed) + 16:
+                self._heap = [(deadline, generation, relay_index)
+                              for relay_index, (deadline, generation) in self._armed.items()]
+                heapq.heapify(self._heap)
+
+    def disarm_all(self):
+        with self._condition:
+            self._armed.clear()
+            self._heap.clear()
+            self._failures.clear()
+
+    def faulted(self):
+        """Returns the sorted relay indices whose forced turn-off failed and is still being retried."""
+        with self._condition:
+            return sorted(self._failures)
+
+    def _retry_interval(self, relay_index):
+        return min(MAX_RETRY_INTERVAL, RETRY_INTERVAL * 2 ** (self._failures[relay_index] - 1))
+
+    def armed(self):
+        """Returns a dict of armed relay indices and their remaining on-time in seconds."""
+        now = time.monotonic()
+        with self._condition:
+            return {relay_index: max(0.0, deadline - now) for relay_index, (deadline, _) in self._armed.items()}
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._armed.clear()
+            self._heap.clear()
+            self._failures.clear()
+            self._condition.notify()
+        self._thread.join(timeout=1)
+
+    def _pop_expired(self):
+        """Removes and returns every relay whose deadline has passed. Caller holds the lock."""
+        now = time.monotonic()
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, generation, relay_index = heapq.heappop(self._heap)
+            if self._armed.get(relay_index) == (deadline, generation):
+                del self._armed[relay_index]
+                expired.append(relay_index)
+        return sorted(expired)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._stopped:
+                        return
+                    # Drop stale entries so the wait below targets a live deadline
+                    while self._heap and self._armed.get(self._heap[0][2]) != self._heap[0][:2]:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    remaining = self._heap[0][0] - time.monotonic()
+                    if remaining > 0:
+                        self._condition.wait(remaining)
+                        continue
+                    expired = self._pop_expired()
+                    if expired:
+                        break
+            # Switch relays off outside the lock so arm/disarm never wait on hardware I/O
+            try:
+                self._on_expired(expired)
+            except Exception as e:
+                self._retry_later(expired, e)
+            else:
+                with self._condition:
+                    for relay_index in expired:
+                        self._failures.pop(relay_index, None)
+
+    def _retry_later(self, relay_indices, error):
+        """Keeps relays whose turn-off failed armed with a backed-off retry deadline."""
+        with self._condition:
+            retries = []
+            for relay_index in relay_indices:
+                self._failures[relay_index] = self._failures.get(relay_index, 0) + 1
+                if relay_index not in self._armed:  # Unless re-armed while the turn-off ran
+                    self._arm((relay_index,), time.monotonic() + self._retry_interval(relay_index))
+                    retries.append(self._retry_interval(relay_index))
+            self._condition.notify()
+        retry = f", retrying in {min(retries):g} s" if retries else ""
+        event_system.dispatch_event(EventType.LOG_EVENT, {
+            "message": f"Failed to turn off relay(s) {relay_indices} after timeout: {error}{retry}. "
+                       f"They may still be energized; no unit is started until they are off.",
+            "level": LogLevel.ERROR
+        })
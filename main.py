@@ -1,23 +1,107 @@
+import argparse
+
 import customtkinter
 from ui.main_window import MainWindow
 from test_logic.test_runner import TestRunner
-from hardware import HardwareClient
+from test_logic.station import Station
+from test_logic.test_plan import load_test_plan, TestPlanError
+from test_logic.spc import SpcEngine
+from hardware import HardwareClient, SimulatedRelayBackend
+from storage import ResultsStore, Uploader, HttpSink, LocalSink
+from utils import event_system, EventType, LogLevel, Logger, StructuredLogSink
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="High voltage tester")
+    parser.add_argument('--host', default='192.168.0.2', help="Address of the Raspberry Pi server.")
+    parser.add_argument('--port', type=int, default=65432, help="Port of the Raspberry Pi server.")
+    parser.add_argument('--simulate', action='store_true', help="Run against a local simulated Raspberry Pi server and relay port.")
+    parser.add_argument('--station', action='append', default=[], metavar='HOST:PORT[:DEVICE]',
+                        help="Additional test fixture to run in parallel, with the NI-DAQmx device of its backup relay. "
+                             "Can be repeated. With --simulate, every station gets its own simulator.")
+    parser.add_argument('--plan', help="Test plan file (.json, .toml or .yaml). Defaults to test_logic/plans/default.json.")
+    parser.add_argument('--pipelined', action='store_true',
+                        help="Let the operator scan the next unit while the current one is under test.")
+    parser.add_argument('--results-db', help="SQLite database the results are stored in. Defaults to results/HV_tester_results.sqlite3.")
+    upload = parser.add_mutually_exclusive_group()
+    upload.add_argument('--upload-url', help="Bulk insert endpoint of the central results database. Results are queued and uploaded in the background.")
+    upload.add_argument('--upload-dir', help="Upload result batches to this directory instead, for testing without the central database.")
+    return parser.parse_args()
+
+def parse_station(value):
+    """Parses HOST:PORT[:DEVICE] into (host, port, device)."""
+    parts = value.split(':')
+    if len(parts) not in (2, 3):
+        raise SystemExit(f"Invalid station '{value}', expected HOST:PORT[:DEVICE].")
+    return parts[0], int(parts[1]), parts[2] if len(parts) == 3 else 'Dev1'
 
 def main():
-    hardware_client = HardwareClient()
-    test_runner = TestRunner(hardware_client)
+    args = parse_args()
+    # Created here rather than on import, so tools importing the packages leave the log files alone
+    logger = Logger()
+    structured_log = StructuredLogSink()
+    try:
+        plan = load_test_plan(args.plan)
+    except TestPlanError as e:
+        raise SystemExit(str(e))
+    voltage_changes, relay_switches = plan.cost
+    event_system.dispatch_event(EventType.LOG_EVENT, {
+        "message": f"Loaded test plan '{plan.name}': {len(plan)} steps, order {[step.test_number for step in plan]}, "
+                   f"{voltage_changes} voltage changes and {relay_switches} relay switches per unit.",
+        "level": LogLevel.INFO
+    })
+    simulators = []
+    endpoints = [(args.host, args.port, 'Dev1')] + [parse_station(value) for value in args.station]
+    if args.simulate:
+        from hardware.pi_server_simulator import PiServerSimulator
+        simulators = [PiServerSimulator(port=0) for _ in endpoints]
+        endpoints = [('127.0.0.1', simulator.start_in_thread(), device) for simulator, (_, _, device) in zip(simulators, endpoints)]
+
+    # The first client is the primary one that also serves the UI's hardware events
+    stations = []
+    for number, (host, port, device) in enumerate(endpoints, start=1):
+        relay_backend = SimulatedRelayBackend() if args.simulate else None
+        client = HardwareClient(host, port, relay_backend=relay_backend, relay_device=device)
+        stations.append(Station(f"Station {number}", client, plan))
+    hardware_client = stations[0].hardware_client
+    uploading = bool(args.upload_url or args.upload_dir)
+    results_store = ResultsStore(args.results_db, outbox=uploading)
+    uploader = None
+    if uploading:
+        sink = HttpSink(args.upload_url) if args.upload_url else LocalSink(args.upload_dir)
+        uploader = Uploader(results_store.path, sink).start()
+    test_runner = TestRunner(hardware_client, stations, pipelined=args.pipelined, results_store=results_store)
+    spc = SpcEngine()
     app = MainWindow(test_runner, hardware_client)
     
     def clean_exit():
         """Handles the cleanup process before application exit."""
-        try:
-            hardware_client.close()
-        except Exception as e:
-            print(f"Error closing HardwareClient: {e}")
         try:
             test_runner.close()
         except Exception as e:
             print(f"Error closing TestRunner: {e}")
+        spc.close()
+        try:
+            results_store.close()
+            if uploader:
+                uploader.close()
+        except Exception as e:
+            print(f"Error closing results database: {e}")
+        for station in stations:
+            try:
+                station.hardware_client.close()
+            except Exception as e:
+                print(f"Error closing HardwareClient of {station.name}: {e}")
+        try:
+            event_system.shutdown()
+        except Exception as e:
+            print(f"Error shutting down event system: {e}")
+        try:
+            logger.close()
+            structured_log.close()
+        except Exception as e:
+            print(f"Error closing log files: {e}")
+        for simulator in simulators:
+            simulator.stop()
         try:
             app.destroy()
         except Exception as e:
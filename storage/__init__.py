@@ -0,0 +1,30 @@
+import importlib
+
+# Submodules are imported on first use, so `python -m storage.export` and other standalone tools do not
+# pull in the event system, its UI dependencies and the log files through the results store.
+_EXPORTS = {
+    "ResultsStore": "results_store",
+    "unit_status": "results_store",
+    "Uploader": "outbox",
+    "UploadError": "outbox",
+    "UploadRejected": "outbox",
+    "HttpSink": "sinks",
+    "SqlSink": "sinks",
+    "LocalSink": "sinks",
+    "export_results": "export",
+    "compact": "export",
+    "open_dataset": "export",
+    "ExportError": "export",
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
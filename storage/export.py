@@ -0,0 +1,220 @@
+"""
+Columnar export of the results database for analysis.
+
+export_results appends every unit finished since the last export to Parquet files, one row per sub-test
+with its unit and batch columns and its waveform as float32 lists. Files are partitioned Hive style by
+finish date and work order (date=2024-05-02/work_order=WO123/part-....parquet), so a query on a date
+range or a work order only opens the matching files, and the column statistics let readers skip row
+groups by serial number, test number or current. compact merges the small files of repeated exports.
+
+The export state (the last exported unit id) is kept in _export_state.json next to the partitions.
+Needs the optional pyarrow package. Run standalone with:
+    python -m storage.export --db results/HV_tester_results.sqlite3 --out results/parquet [--compact]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import time
+import urllib.parse
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+STATE_FILE = "_export_state.json"
+DEFAULT_PARTITION = "__HIVE_DEFAULT_PARTITION__"  # Partition value of units without a work order
+UNITS_PER_FILE = 20000  # Units read from the database per export step
+
+class ExportError(RuntimeError):
+    """Raised when results cannot be exported."""
+
+def _require_pyarrow():
+    if pa is None:
+        raise ExportError("Exporting results to Parquet requires the pyarrow package.")
+
+def _schema():
+    return pa.schema([
+        ("unit_id", pa.int64()),
+        ("serial_number", pa.string()),
+        ("lot_hardener", pa.string()),
+        ("lot_molding_compound", pa.string()),
+        ("station", pa.string()),
+        ("plan", pa.string()),
+        ("unit_status", pa.string()),
+        ("started_at", pa.timestamp('ms')),
+        ("finished_at", pa.timestamp('ms')),
+        ("test_number", pa.int16()),
+        ("voltage", pa.float32()),
+        ("current", pa.float32()),
+        ("status", pa.string()),
+        ("dwell_time", pa.float32()),
+        ("peak", pa.float32()),
+        ("mean", pa.float32()),
+        ("rms", pa.float32()),
+        ("slope", pa.float32()),
+        ("sample_rate", pa.float32()),
+        ("sample_count", pa.int32()),
+        ("waveform_times", pa.list_(pa.float32())),
+        ("waveform_currents", pa.list_(pa.float32())),
+    ])
+
+QUERY = """
+SELECT units.id AS unit_id, units.serial_number, batches.work_order, batches.lot_hardener, batches.lot_molding_compound,
+       units.station, units.plan, units.status AS unit_status, units.started_at, units.finished_at,
+       sub_tests.test_number, sub_tests.voltage, sub_tests.current, sub_tests.status, sub_tests.dwell_time,
+       sub_tests.peak, sub_tests.mean, sub_tests.rms, sub_tests.slope,
+       waveforms.sample_rate, waveforms.sample_count, waveforms.times, waveforms.currents
+FROM units
+JOIN sub_tests ON sub_tests.unit_id = units.id
+LEFT JOIN batches ON units.batch_id = batches.id
+LEFT JOIN waveforms ON waveforms.sub_test_id = sub_tests.id
+WHERE units.id > ? AND units.id <= ?
+ORDER BY units.id, sub_tests.id
+"""
+
+def _read_state(directory):
+    path = os.path.join(directory, STATE_FILE)
+    if not os.path.exists(path):
+        return {"last_unit_id": 0, "pending_until": None}
+    with open(path, 'r', encoding='utf-8') as state_file:
+        return json.load(state_file)
+
+def _write_state(directory, state):
+    path = os.path.join(directory, STATE_FILE)
+    with open(path + ".tmp", 'w', encoding='utf-8') as state_file:
+        json.dump(state, state_file)
+    os.replace(path + ".tmp", path)
+
+def _timestamps(seconds):
+    missing = np.array([value is None for value in seconds], dtype=bool)
+    milliseconds = np.array([0.0 if value is None else value * 1000.0 for value in seconds]).astype('int64')
+    return pa.array(milliseconds.astype('datetime64[ms]'), type=pa.timestamp('ms'), mask=missing)
+
+def _float_lists(blobs):
+    """float32 list column from the little-endian float32 blobs of the waveforms table."""
+    arrays = [np.frombuffer(blob, dtype='<f4') if blob is not None else np.empty(0, dtype='<f4') for blob in blobs]
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int32)
+    np.cumsum([len(array) for array in arrays], out=offsets[1:])
+    values = np.concatenate(arrays).astype(np.float32) if arrays else np.empty(0, dtype=np.float32)
+    mask = pa.array([blob is None for blob in blobs])
+    return pa.ListArray.from_arrays(pa.array(offsets), pa.array(values, type=pa.float32()), mask=mask)
+
+def _table(rows):
+    schema = _schema()
+    columns = {}
+    for field in schema:
+        if field.name in ("started_at", "finished_at"):
+            columns[field.name] = _timestamps([row[field.name] for row in rows])
+        elif field.name in ("waveform_times", "waveform_currents"):
+            columns[field.name] = _float_lists([row[field.name[len("waveform_"):]] for row in rows])
+        else:
+            columns[field.name] = pa.array([row[field.name] for row in rows], type=field.type)
+    return pa.table(columns, schema=schema)
+
+def _partition(row):
+    day = time.strftime("%Y-%m-%d", time.localtime(row["finished_at"]))
+    work_order = row["work_order"] or DEFAULT_PARTITION
+    return os.path.join(f"date={day}", f"work_order={urllib.parse.quote(work_order, safe='')}")
+
+def _write_file(path, table):
+    directory, name = os.path.split(path)
+    os.makedirs(directory, exist_ok=True)
+    temporary = os.path.join(directory, f".{name}.tmp")  # Hidden files are skipped by dataset readers
+    pq.write_table(table, temporary, compression='zstd', row_group_size=64 * 1024)
+    os.replace(temporary, path)
+
+def _export_range(connection, directory, after, until):
+    """Writes the units with ids in (after, until]. File names depend only on the range, so a rerun overwrites."""
+    rows = connection.execute(QUERY, (after, until)).fetchall()
+    partitions = {}
+    for row in rows:
+        partitions.setdefault(_partition(row), []).append(row)
+    for partition, partition_rows in partitions.items():
+        path = os.path.join(directory, partition, f"part-{after + 1:010d}-{until:010d}.parquet")
+        _write_file(path, _table(partition_rows))
+    return len(rows)
+
+def export_results(database_path, directory, units_per_file=UNITS_PER_FILE):
+    """
+    Exports the units finished since the last export. Returns the number of sub-test rows written.
+    Raises ExportError.
+    """
+    _require_pyarrow()
+    os.makedirs(directory, exist_ok=True)
+    state = _read_state(directory)
+    connection = sqlite3.connect(f"file:{database_path}?mode=ro", uri=True)
+    connection.row_factory = sqlite3.Row
+    try:
+        # An interrupted export is finished over the same range first, rewriting the same files
+        until = state.get("pending_until") or connection.execute("SELECT COALESCE(MAX(id), 0) FROM units").fetchone()[0]
+        if until <= state["last_unit_id"]:
+            return 0
+        state["pending_until"] = until
+        _write_state(directory, state)
+
+        written = 0
+        for after in range(state["last_unit_id"], until, units_per_file):
+            written += _export_range(connection, directory, after, min(after + units_per_file, until))
+    except sqlite3.Error as e:
+        raise ExportError(f"Cannot read results from '{database_path}': {e}") from e
+    finally:
+        connection.close()
+    _write_state(directory, {"last_unit_id": until, "pending_until": None})
+    return written
+
+def _unit_range(path):
+    first, last = os.path.basename(path)[len("part-"):-len(".parquet")].split("-")
+    return int(first), int(last)
+
+def compact(directory, min_files=2):
+    """Merges the part files of each partition into one. Returns the number of partitions compacted."""
+    _require_pyarrow()
+    compacted = 0
+    for partition in sorted({os.path.dirname(path) for path in glob.glob(os.path.join(directory, "date=*", "work_order=*", "part-*.parquet"))}):
+        paths = sorted(glob.glob(os.path.join(partition, "part-*.parquet")), key=_unit_range)
+        # Files covered by a larger one are leftovers of an interrupted compaction
+        ranges = [_unit_range(path) for path in paths]
+        covered = {path for path, (first, last) in zip(paths, ranges)
+                   if any(other != (first, last) and other[0] <= first and last <= other[1] for other in ranges)}
+        for path in covered:
+            os.remove(path)
+        paths = [path for path in paths if path not in covered]
+        if len(paths) < min_files:
+            continue
+        table = pa.concat_tables([pq.read_table(path, schema=_schema()) for path in paths])
+        first, last = _unit_range(paths[0])[0], _unit_range(paths[-1])[1]
+        _write_file(os.path.join(partition, f"part-{first:010d}-{last:010d}.parquet"), table)
+        for path in paths:
+            if _unit_range(path) != (first, last):
+                os.remove(path)
+        compacted += 1
+    return compacted
+
+def open_dataset(directory):
+    """The exported results as a pyarrow dataset, e.g. open_dataset(d).to_table(filter=ds.field("work_order") == "WO1")."""
+    _require_pyarrow()
+    import pyarrow.dataset as ds
+    return ds.dataset(directory, format="parquet", partitioning="hive")
+
+def main():
+    parser = argparse.ArgumentParser(description="Export hi-pot results to partitioned Parquet files.")
+    parser.add_argument('--db', default=os.path.join("results", "HV_tester_results.sqlite3"), help="Results database.")
+    parser.add_argument('--out', default=os.path.join("results", "parquet"), help="Export directory.")
+    parser.add_argument('--compact', action='store_true', help="Merge the part files of each partition afterwards.")
+    args = parser.parse_args()
+    try:
+        print(f"Exported {export_results(args.db, args.out)} sub-test results to {args.out}.")
+        if args.compact:
+            print(f"Compacted {compact(args.out)} partitions.")
+    except ExportError as e:
+        raise SystemExit(str(e))
+
+if __name__ == "__main__":
+    main()
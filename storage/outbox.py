@@ -0,0 +1,191 @@
+"""
+Store-and-forward upload of finished units to the central database.
+
+Every unit committed to the ResultsStore also gets an outbox row in the same transaction, so a unit is
+either stored and queued for upload or neither. The Uploader drains the outbox on its own thread: it
+sends the oldest units as one gzip-compressed batch to a sink, deletes them once the sink accepted
+them, and backs off exponentially while the sink is unreachable. Testing never waits on the network.
+
+Each record carries an idempotency key (serial number plus finish time in milliseconds), so a batch
+that is resent after a lost acknowledgement does not create duplicates on the receiving side.
+
+Rejected units stay in the outbox for inspection and are purged once they are older than the retention
+period; the units themselves remain in the ResultsStore tables.
+"""
+
+import gzip
+import json
+import random
+import sqlite3
+import threading
+import time
+
+from utils import event_system, EventType, LogLevel
+
+OUTBOX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    serial_number TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    rejected INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (rejected, id);
+"""
+
+class UploadError(Exception):
+    """The sink could not take the batch now; it is retried after a backoff."""
+
+class UploadRejected(Exception):
+    """The sink refused the batch as invalid; retrying cannot help."""
+
+def idempotency_key(serial_number, finished_at):
+    return f"{serial_number}:{int(finished_at * 1000)}"
+
+def outbox_record(unit):
+    """Upload record of a unit queued by ResultsStore.record_unit."""
+    batch_info = unit["batch_info"]
+    return {
+        "idempotency_key": idempotency_key(unit["serial_number"], unit["finished_at"]),
+        "serial_number": unit["serial_number"],
+        "work_order": batch_info.work_order_number if batch_info else None,
+        "lot_hardener": batch_info.lot_hardener_number if batch_info else None,
+        "lot_molding_compound": batch_info.lot_molding_compound_number if batch_info else None,
+        "station": unit["station"],
+        "plan": unit["plan"],
+        "status": unit["status"],
+        "started_at": unit["started_at"],
+        "finished_at": unit["finished_at"],
+        "sub_tests": [
+            {**{key: value for key, value in result.items() if key not in ("waveform", "station", "serial_number")},
+             "waveform": result["waveform"].to_dict() if result.get("waveform") is not None else None}
+            for result in unit["results"]
+        ],
+    }
+
+def encode_batch(records):
+    """Gzip-compressed JSON body of a batch upload."""
+    return gzip.compress(json.dumps({"records": records}, separators=(',', ':')).encode('utf-8'))
+
+class Uploader:
+    PURGE_INTERVAL = 3600.0  # Seconds between purges of expired rejected units
+
+    def __init__(self, database_path, sink, batch_size=50, poll_interval=2.0, initial_backoff=1.0, max_backoff=300.0,
+                 rejected_retention=30.0):
+        """
+        Args:
+            database_path (str): ResultsStore database with the outbox table.
+            sink: Receives the batches, see storage.sinks.
+            batch_size (int): Units sent in one batch at most.
+            poll_interval (float): Seconds between looks at an empty outbox.
+            initial_backoff (float): Seconds to wait after the first failed batch, doubled per failure up to max_backoff.
+            rejected_retention (float): Days a rejected unit is kept in the outbox, counted from when it was
+                queued. None keeps them forever.
+        """
+        self.database_path = database_path
+        self.sink = sink
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.rejected_retention = rejected_retention
+        self.uploaded = 0
+        self.failures = 0  # Consecutive failed batches
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="Uploader", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def wake(self):
+        """Looks at the outbox right away instead of after the poll interval or backoff."""
+        self._wake.set()
+
+    def close(self, timeout=5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def pending(self):
+        """Number of units waiting to be uploaded."""
+        connection = self._connect()
+        try:
+            return connection.execute("SELECT COUNT(*) FROM outbox WHERE rejected = 0").fetchone()[0]
+        finally:
+            connection.close()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.database_path, isolation_level=None)
+        connection.execute("PRAGMA busy_timeout = 5000")  # Waits for the ResultsStore writer instead of failing
+        return connection
+
+    def _run(self):
+        connection = self._connect()
+        next_purge = 0.0
+        try:
+            while not self._stop.is_set():
+                try:
+                    if self.rejected_retention is not None and time.monotonic() >= next_purge:
+                        self._purge_rejected(connection)
+                        next_purge = time.monotonic() + self.PURGE_INTERVAL
+                    wait = self._send_next_batch(connection)
+                except sqlite3.Error as e:
+                    event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Cannot read the upload outbox: {e}", "level": LogLevel.ERROR})
+                    wait = self.max_backoff
+                if wait:
+                    self._wake.wait(wait)
+                    self._wake.clear()
+        finally:
+            connection.close()
+
+    def _send_next_batch(self, connection):
+        """Sends one batch. Returns how long to wait before the next one, 0 to continue at once."""
+        rows = connection.execute(
+            "SELECT id, idempotency_key, payload FROM outbox WHERE rejected = 0 ORDER BY id LIMIT ?",
+            (self.batch_size,)).fetchall()
+        if not rows:
+            return self.poll_interval
+        ids = [row[0] for row in rows]
+        keys = [row[1] for row in rows]
+        body = encode_batch([json.loads(row[2]) for row in rows])
+        try:
+            self.sink.send(body, keys)
+        except UploadRejected as e:
+            self._mark(connection, ids, str(e), rejected=True)
+            event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Upload of {len(ids)} unit(s) rejected: {e}", "level": LogLevel.ERROR})
+            return 0
+        except Exception as e:
+            self.failures += 1
+            self._mark(connection, ids, str(e))
+            # Jitter keeps several testers from retrying in lockstep once the database is back
+            backoff = min(self.max_backoff, self.initial_backoff * 2 ** (self.failures - 1))
+            backoff = random.uniform(backoff / 2, backoff)
+            level = LogLevel.WARNING if self.failures == 1 else LogLevel.DEBUG
+            event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Upload of {len(ids)} unit(s) failed ({e}), retrying in {backoff:.1f} s.", "level": level})
+            return backoff
+
+        connection.execute(f"DELETE FROM outbox WHERE id IN ({','.join('?' * len(ids))})", ids)
+        if self.failures:
+            event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Upload resumed after {self.failures} failed attempt(s).", "level": LogLevel.INFO})
+        self.failures = 0
+        self.uploaded += len(ids)
+        event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Uploaded {len(ids)} unit(s) to the central database.", "level": LogLevel.DEBUG})
+        return 0 if len(rows) == self.batch_size else self.poll_interval
+
+    def _purge_rejected(self, connection):
+        """Deletes rejected units queued longer ago than the retention period."""
+        cutoff = time.time() - self.rejected_retention * 86400
+        purged = connection.execute("DELETE FROM outbox WHERE rejected = 1 AND created_at < ?", (cutoff,)).rowcount
+        if purged:
+            event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Purged {purged} rejected unit(s) older than {self.rejected_retention:g} days from the upload outbox.", "level": LogLevel.INFO})
+
+    def _mark(self, connection, ids, error, rejected=False):
+        connection.execute(
+            f"UPDATE outbox SET attempts = attempts + 1, last_error = ?, rejected = ? WHERE id IN ({','.join('?' * len(ids))})",
+            [error, int(rejected), *ids])
@@ -0,0 +1,307 @@
+"""
+Local SQLite store of every tested unit, its batch, its sub-test results and their current waveforms.
+
+Writes are queued and committed from a dedicated thread, several units per transaction, so recording a
+unit never blocks a station. The database runs in WAL mode, so readers (queries, exports, the uploader)
+do not block the writer and a crash loses at most the units still queued.
+"""
+
+import os
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from utils import event_system, EventType, LogLevel
+from .outbox import OUTBOX_SCHEMA, outbox_record
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY,
+    work_order TEXT NOT NULL,
+    lot_hardener TEXT NOT NULL,
+    lot_molding_compound TEXT NOT NULL,
+    UNIQUE (work_order, lot_hardener, lot_molding_compound)
+);
+CREATE TABLE IF NOT EXISTS units (
+    id INTEGER PRIMARY KEY,
+    serial_number TEXT NOT NULL,
+    batch_id INTEGER REFERENCES batches (id),
+    station TEXT,
+    plan TEXT,
+    status TEXT NOT NULL,
+    started_at REAL,
+    finished_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sub_tests (
+    id INTEGER PRIMARY KEY,
+    unit_id INTEGER NOT NULL REFERENCES units (id),
+    test_number INTEGER NOT NULL,
+    voltage REAL,
+    current REAL,
+    status TEXT,
+    dwell_time REAL,
+    peak REAL,
+    mean REAL,
+    rms REAL,
+    slope REAL
+);
+CREATE TABLE IF NOT EXISTS waveforms (
+    sub_test_id INTEGER PRIMARY KEY REFERENCES sub_tests (id),
+    sample_rate REAL NOT NULL,
+    sample_count INTEGER NOT NULL,
+    times BLOB NOT NULL,
+    currents BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS units_serial_number ON units (serial_number);
+CREATE INDEX IF NOT EXISTS units_finished_at ON units (finished_at);
+CREATE INDEX IF NOT EXISTS units_batch ON units (batch_id);
+CREATE INDEX IF NOT EXISTS batches_work_order ON batches (work_order);
+CREATE INDEX IF NOT EXISTS sub_tests_unit ON sub_tests (unit_id);
+"""
+
+LOCKED_RETRIES = 5  # Retries of a transaction that found the database locked, after the busy timeout
+LOCKED_RETRY_INTERVAL = 0.1  # Seconds before the first retry, doubled per retry
+
+_FLUSH = object()
+_CLOSE = object()
+
+def unit_status(results, completed=True):
+    """PASS if every sub-test passed, FAIL if any failed, otherwise ERROR."""
+    statuses = {result.get("status") for result in results}
+    if "FAILURE" in statuses:
+        return "FAIL"
+    if completed and results and statuses == {"SUCCESS"}:
+        return "PASS"
+    return "ERROR"
+
+class ResultsStore:
+    def __init__(self, path=None, max_batch_units=64, flush_interval=0.5, outbox=False):
+        """
+        Args:
+            path (str): Database file. Defaults to results/HV_tester_results.sqlite3 in the working directory.
+            max_batch_units (int): Units committed in one transaction at most.
+            flush_interval (float): Seconds a queued unit waits for others to share its transaction.
+            outbox (bool): Also queue every unit for upload to the central database, see storage.outbox.
+        """
+        self.path = path or os.path.join(os.getcwd(), "results", "HV_tester_results.sqlite3")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.max_batch_units = max_batch_units
+        self.flush_interval = flush_interval
+        self.outbox = outbox
+
+        self._connection = self._connect()
+        self._connection.executescript(SCHEMA)
+        if outbox:
+            self._connection.executescript(OUTBOX_SCHEMA)
+        self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._batch_ids = {}  # (work_order, lot_hardener, lot_molding_compound) -> batches.id
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="ResultsStore", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")  # WAL stays consistent; a power cut loses only the last commits
+        connection.execute("PRAGMA foreign_keys = ON")
+        connection.execute("PRAGMA busy_timeout = 5000")  # Waits for exports and the uploader instead of failing
+        return connection
+
+    def record_unit(self, serial_number, batch_info, results, station=None, plan=None, started_at=None,
+                    finished_at=None, completed=True):
+        """Queues a tested unit with its SubTest results for writing. Never blocks on the database."""
+        if self._closed:
+            return
+        self._queue.put({
+            "serial_number": serial_number,
+            "batch_info": batch_info,
+            "results": list(results),
+            "station": station,
+            "plan": plan,
+            "status": unit_status(results, completed),
+            "started_at": started_at,
+            "finished_at": finished_at or time.time(),
+        })
+
+    def flush(self, wait=False):
+        """Commits everything queued so far. With wait=True, blocks until it is committed."""
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        if wait:
+            done.wait()
+
+    def close(self):
+        """Commits everything queued, then stops the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        self._connection.close()
+
+    # Writer thread
+
+    def _run(self):
+        pending = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _CLOSE:
+                self._commit(pending)
+                return
+            if isinstance(item, tuple) and item[0] is _FLUSH:
+                self._commit(pending)
+                item[1].set()
+                deadline = None
+                continue
+            if item is not None:
+                pending.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if pending and (item is None or len(pending) >= self.max_batch_units):
+                self._commit(pending)
+                deadline = None
+
+    def _commit(self, units):
+        """
+        Writes the units in one transaction. If that fails, they are written one per transaction, so a
+        unit that cannot be stored does not take the rest of the batch with it.
+        """
+        if not units:
+            return
+        try:
+            self._write_retrying(units)
+        except Exception as e:
+            if len(units) == 1:
+                self._report_lost(units[0], e)
+            else:
+                for unit in units:
+                    try:
+                        self._write_retrying([unit])
+                    except Exception as unit_error:
+                        self._report_lost(unit, unit_error)
+        finally:
+            units.clear()
+
+    def _write_retrying(self, units):
+        """Writes the units in one transaction, retrying while the database is locked by another connection."""
+        for attempt in range(LOCKED_RETRIES + 1):
+            try:
+                return self._write(units)
+            except sqlite3.OperationalError as e:
+                message = str(e).lower()
+                if attempt == LOCKED_RETRIES or ("locked" not in message and "busy" not in message):
+                    raise
+                time.sleep(LOCKED_RETRY_INTERVAL * 2 ** attempt)
+
+    def _write(self, units):
+        try:
+            self._connection.execute("BEGIN")
+            for unit in units:
+                self._insert_unit(unit)
+            self._connection.execute("COMMIT")
+        except Exception:
+            try:
+                if self._connection.in_transaction:
+                    self._connection.execute("ROLLBACK")
+            except Exception:
+                pass
+            self._batch_ids.clear()  # Ids inserted by the rolled back transaction are gone
+            raise
+
+    def _report_lost(self, unit, error):
+        event_system.dispatch_event(EventType.LOG_EVENT, {
+            "message": f"Could not store results of {unit['serial_number']}: {error}",
+            "level": LogLevel.ERROR
+        })
+
+    def _batch_id(self, batch_info):
+        if batch_info is None:
+            return None
+        key = (batch_info.work_order_number, batch_info.lot_hardener_number, batch_info.lot_molding_compound_number)
+        batch_id = self._batch_ids.get(key)
+        if batch_id is None:
+            self._connection.execute(
+                "INSERT OR IGNORE INTO batches (work_order, lot_hardener, lot_molding_compound) VALUES (?, ?, ?)", key)
+            (batch_id,) = self._connection.execute(
+                "SELECT id FROM batches WHERE work_order = ? AND lot_hardener = ? AND lot_molding_compound = ?", key).fetchone()
+            self._batch_ids[key] = batch_id
+        return batch_id
+
+    def _insert_unit(self, unit):
+        cursor = self._connection.execute(
+            "INSERT INTO units (serial_number, batch_id, station, plan, status, started_at, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (unit["serial_number"], self._batch_id(unit["batch_info"]), unit["station"], unit["plan"], unit["status"],
+             unit["started_at"], unit["finished_at"]))
+        unit_id = cursor.lastrowid
+        for result in unit["results"]:
+            cursor = self._connection.execute(
+                "INSERT INTO sub_tests (unit_id, test_number, voltage, current, status, dwell_time, peak, mean, rms, slope) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (unit_id, result["test_number"], result.get("voltage"), result.get("current"), result.get("status"),
+                 result.get("dwell_time"), result.get("peak"), result.get("mean"), result.get("rms"), result.get("slope")))
+            waveform = result.get("waveform")
+            if waveform is not None:
+                self._connection.execute(
+                    "INSERT INTO waveforms (sub_test_id, sample_rate, sample_count, times, currents) VALUES (?, ?, ?, ?, ?)",
+                    (cursor.lastrowid, waveform.sample_rate, waveform.sample_count,
+                     waveform.times.astype('<f4').tobytes(), waveform.currents.astype('<f4').tobytes()))
+        if self.outbox:
+            record = outbox_record(unit)
+            self._connection.execute(
+                "INSERT OR IGNORE INTO outbox (idempotency_key, serial_number, payload, created_at) VALUES (?, ?, ?, ?)",
+                (record["idempotency_key"], unit["serial_number"], json.dumps(record, separators=(',', ':')), time.time()))
+
+    # Queries, on their own connection so they never wait for the writer
+
+    def query(self, sql, parameters=()):
+        """Runs a read-only query and returns the rows as sqlite3.Row."""
+        connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        connection.row_factory = sqlite3.Row
+        try:
+            return connection.execute(sql, parameters).fetchall()
+        finally:
+            connection.close()
+
+    def units(self, serial_number=None, work_order=None, since=None, until=None):
+        """Tested units with their batch, newest first, optionally filtered."""
+        conditions, parameters = [], []
+        for condition, value in (("units.serial_number = ?", serial_number), ("batches.work_order = ?", work_order),
+                                 ("units.finished_at >= ?", since), ("units.finished_at < ?", until)):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self.query(
+            "SELECT units.*, batches.work_order, batches.lot_hardener, batches.lot_molding_compound "
+            f"FROM units LEFT JOIN batches ON units.batch_id = batches.id {where} ORDER BY units.finished_at DESC",
+            parameters)
+
+    def sub_tests(self, unit_id):
+        return self.query("SELECT * FROM sub_tests WHERE unit_id = ? ORDER BY id", (unit_id,))
+
+    def waveform(self, sub_test_id):
+        """Returns the Waveform of a sub-test, or None."""
+        from test_logic.waveform import Waveform  # Imported here, the test_logic package pulls in the UI
+        rows = self.query("SELECT * FROM waveforms WHERE sub_test_id = ?", (sub_test_id,))
+        if not rows:
+            return None
+        row = rows[0]
+        return Waveform(np.frombuffer(row["times"], dtype='<f4').astype(np.float32),
+                        np.frombuffer(row["currents"], dtype='<f4').astype(np.float32),
+                        row["sample_rate"], row["sample_count"])
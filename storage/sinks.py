@@ -0,0 +1,156 @@
+"""
+Destinations of the Uploader. A sink has one method, send(body, keys): body is a gzip-compressed JSON
+batch {"records": [...]} and keys are the idempotency keys of its records. It raises UploadError (or
+any other exception) when the batch should be retried, UploadRejected when it never can succeed.
+
+HttpSink posts to the central results service, SqlSink inserts straight into its database through any
+DB-API 2 driver, LocalSink stands in for either when testing.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import urllib.error
+import urllib.request
+
+from .outbox import UploadError, UploadRejected
+
+def batch_key(keys):
+    """Idempotency key of a whole batch, identical when the same records are resent."""
+    return hashlib.sha256("\n".join(keys).encode('utf-8')).hexdigest()
+
+class HttpSink:
+    """POSTs batches to the bulk insert endpoint of the central results service."""
+
+    def __init__(self, url, timeout=10.0, headers=None):
+        self.url = url
+        self.timeout = timeout
+        self.headers = headers or {}
+
+    def send(self, body, keys):
+        request = urllib.request.Request(self.url, data=body, method='POST', headers={
+            **self.headers,
+            'Content-Type': 'application/json',
+            'Content-Encoding': 'gzip',
+            'Idempotency-Key': batch_key(keys),
+        })
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            # Timeouts and throttling are temporary, other client errors mean the batch itself is bad
+            if 400 <= e.code < 500 and e.code not in (408, 429):
+                raise UploadRejected(f"HTTP {e.code} {e.reason}") from e
+            raise UploadError(f"HTTP {e.code} {e.reason}") from e
+        except (urllib.error.URLError, OSError) as e:
+            raise UploadError(str(getattr(e, 'reason', e))) from e
+
+class SqlSink:
+    """
+    Inserts batches into a table of a central SQL database through a DB-API 2 driver, one row per unit
+    with its record as JSON. Units whose idempotency key is already in the table are skipped, so a
+    resent batch does not create duplicates.
+
+    Example:
+        SqlSink(lambda: psycopg2.connect(dsn), paramstyle="pyformat")
+    """
+
+    def __init__(self, connect, table="hipot_units", paramstyle="qmark", create_table=True):
+        """
+        Args:
+            connect: Callable returning a new DB-API 2 connection. A connection is opened per batch, so
+                the sink recovers by itself after the database was unreachable.
+            table (str): Table the units are inserted into.
+            paramstyle (str): The driver's paramstyle: qmark, numeric, named, format or pyformat.
+            create_table (bool): Create the table on the first batch if it does not exist.
+        """
+        if paramstyle not in ("qmark", "numeric", "named", "format", "pyformat"):
+            raise ValueError(f"Unsupported paramstyle '{paramstyle}'.")
+        self.connect = connect
+        self.table = table
+        self.paramstyle = paramstyle
+        self.create_table = create_table
+        self._table_created = False
+
+    def _statement(self, sql, count):
+        """Replaces the {} in sql by `count` placeholders and returns (sql, function making the parameters)."""
+        if self.paramstyle == "qmark":
+            placeholders = ["?"] * count
+        elif self.paramstyle == "numeric":
+            placeholders = [f":{i}" for i in range(1, count + 1)]
+        elif self.paramstyle == "named":
+            placeholders = [f":p{i}" for i in range(count)]
+        elif self.paramstyle == "format":
+            placeholders = ["%s"] * count
+        else:
+            placeholders = [f"%(p{i})s" for i in range(count)]
+        if self.paramstyle in ("named", "pyformat"):
+            parameters = lambda values: {f"p{i}": value for i, value in enumerate(values)}
+        else:
+            parameters = tuple
+        return sql.format(", ".join(placeholders)), parameters
+
+    def send(self, body, keys):
+        records = json.loads(gzip.decompress(body))["records"]
+        try:
+            connection = self.connect()
+        except Exception as e:
+            raise UploadError(f"Cannot connect to the results database: {e}") from e
+        try:
+            cursor = connection.cursor()
+            if self.create_table and not self._table_created:
+                cursor.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                    "idempotency_key VARCHAR(255) PRIMARY KEY, serial_number VARCHAR(255) NOT NULL, "
+                    "finished_at DOUBLE PRECISION, payload TEXT NOT NULL)")
+                self._table_created = True
+            sql, parameters = self._statement(f"SELECT idempotency_key FROM {self.table} WHERE idempotency_key IN ({{}})", len(keys))
+            cursor.execute(sql, parameters(keys))
+            existing = {row[0] for row in cursor.fetchall()}
+            sql, parameters = self._statement(
+                f"INSERT INTO {self.table} (idempotency_key, serial_number, finished_at, payload) VALUES ({{}})", 4)
+            rows = [parameters((record["idempotency_key"], record["serial_number"], record["finished_at"],
+                                json.dumps(record, separators=(',', ':'))))
+                    for record in records if record["idempotency_key"] not in existing]
+            if rows:
+                cursor.executemany(sql, rows)
+            connection.commit()
+        except Exception as e:
+            try:
+                connection.rollback()
+            except Exception:
+                pass
+            raise UploadError(f"Cannot insert into {self.table}: {e}") from e
+        finally:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+class LocalSink:
+    """
+    Stand-in for the central database when testing: keeps the received records by idempotency key,
+    so resent records overwrite instead of duplicating, and optionally writes every batch to a
+    directory. Set `available` to False to simulate an outage.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.available = True
+        self.records = {}  # idempotency key -> record
+        self.batches = 0
+
+    def send(self, body, keys):
+        if not self.available:
+            raise UploadError("Local sink unavailable")
+        records = json.loads(gzip.decompress(body))["records"]
+        for record in records:
+            self.records[record["idempotency_key"]] = record
+        self.batches += 1
+        if self.directory:
+            path = os.path.join(self.directory, f"batch_{batch_key(keys)[:16]}.json.gz")
+            with open(path, 'wb') as batch_file:
+                batch_file.write(body)
@@ -1,3 +1,8 @@
 from .test_runner import TestRunner
 from .sub_test import SubTest
+from .station import Station, StationPool
+from .test_plan import TestPlan, PlanStep, TestPlanError, load_test_plan
+from .adaptive_dwell import DwellMonitor, DwellDecision
+from .waveform import Waveform
+from .spc import SpcEngine, ProcessStatistics
 from .batch_information import BatchInformation
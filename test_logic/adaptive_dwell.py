@@ -0,0 +1,92 @@
+"""
+Decides, sample by sample, when a sub-test has measured enough.
+
+While the hi-pot voltage is applied, the leakage current is sampled continuously. The measurement ends:
+- at once with OVERCURRENT when a sample exceeds the trip current, if one is set,
+- early with PASS once the last `window` samples are stable and clearly below the cut-off, i.e. the
+  upper confidence bound of their mean, extended by any upward trend over the remaining dwell,
+  stays below pass_fraction * cut-off,
+- with TIMEOUT when the full dwell has passed; the result is then judged on the final window.
+
+A streamed acquisition adds one value per block of samples: the block mean, plus the block peak for
+the overcurrent check.
+"""
+
+import math
+from collections import deque
+from enum import Enum
+
+class DwellDecision(Enum):
+    CONTINUE = "continue"
+    PASS = "pass"
+    OVERCURRENT = "overcurrent"
+    TIMEOUT = "timeout"
+
+class DwellMonitor:
+    def __init__(self, current_cut_off, max_dwell, min_dwell=0.5, window=8, pass_fraction=0.8, z=3.0, trip_current=None):
+        """
+        Args:
+            current_cut_off (float): Pass/fail limit in mA.
+            max_dwell (float): Seconds after which the measurement ends regardless.
+            min_dwell (float): Seconds before an early pass is allowed, so the charging current has decayed.
+            window (int): Number of most recent samples the stability check looks at.
+            pass_fraction (float): Early pass requires the projected current below this fraction of the cut-off.
+            z (float): Width of the confidence bound in standard errors.
+            trip_current (float): Sample that aborts the measurement at once. None never aborts; a raw peak
+                above the cut-off alone is not a failure, the verdict is judged on the mean.
+        """
+        self.current_cut_off = current_cut_off
+        self.max_dwell = max_dwell
+        self.min_dwell = min_dwell
+        self.pass_fraction = pass_fraction
+        self.z = z
+        self.trip_current = trip_current
+        self.samples = deque(maxlen=window)  # (elapsed seconds, current in mA)
+        self.sample_count = 0
+        self.elapsed = 0.0
+        self.peak = None  # Highest current of the last sample or block
+        self.decision = DwellDecision.CONTINUE
+
+    def add(self, elapsed, current, peak=None):
+        """Adds a sample, or the mean and peak of a block of samples, and returns the resulting DwellDecision."""
+        self.samples.append((elapsed, current))
+        self.sample_count += 1
+        self.elapsed = elapsed
+        self.peak = current if peak is None else peak
+        if self.trip_current is not None and self.peak > self.trip_current:
+            self.decision = DwellDecision.OVERCURRENT
+        elif elapsed >= self.max_dwell:
+            self.decision = DwellDecision.TIMEOUT
+        elif elapsed >= self.min_dwell and len(self.samples) == self.samples.maxlen and self._stable_below_cut_off(elapsed):
+            self.decision = DwellDecision.PASS
+        return self.decision
+
+    def _stable_below_cut_off(self, elapsed):
+        mean, std, slope = self.statistics()
+        upper = mean + self.z * std / math.sqrt(len(self.samples))
+        # A current still rising would keep rising until the end of the full dwell
+        projected = upper + max(0.0, slope) * (self.max_dwell - elapsed)
+        return projected < self.pass_fraction * self.current_cut_off
+
+    def statistics(self):
+        """Returns (mean, sample standard deviation, least-squares slope in mA/s) of the window."""
+        n = len(self.samples)
+        times = [t for t, _ in self.samples]
+        currents = [c for _, c in self.samples]
+        mean = sum(currents) / n
+        if n < 2:
+            return mean, 0.0, 0.0
+        std = math.sqrt(sum((c - mean) ** 2 for c in currents) / (n - 1))
+        mean_time = sum(times) / n
+        spread = sum((t - mean_time) ** 2 for t in times)
+        slope = sum((t - mean_time) * (c - mean) for t, c in zip(times, currents)) / spread if spread else 0.0
+        return mean, std, slope
+
+    @property
+    def current(self):
+        """Reported current: the tripping peak on overcurrent, otherwise the mean of the final window."""
+        if not self.samples:
+            return None
+        if self.decision is DwellDecision.OVERCURRENT:
+            return self.peak
+        return self.statistics()[0]
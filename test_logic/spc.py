@@ -0,0 +1,174 @@
+"""
+Online statistical process control of the measured leakage currents.
+
+Every concluded sub-test updates the statistics of its process, keyed by (test number, voltage, hardener
+lot), in constant time and memory. The lot is taken from the batch in the event, so a unit still under
+test when the next batch is entered counts towards its own lot:
+- Welford's running mean and variance of all readings,
+- an EWMA of the readings, which follows slow drifts,
+- a one-sided upper CUSUM, which accumulates small persistent increases.
+
+The first `baseline` readings of a process fix its in-control mean and standard deviation. A new lot
+takes them from the in-control lot with the most readings for the same test and voltage, so a bad
+lot is judged against the known-good process from its first unit instead of becoming its own baseline.
+Once a process has a baseline, an SPC_ALARM event and a warning are dispatched when the EWMA leaves its
+upper control limit, when the CUSUM exceeds its decision interval, or when the EWMA comes within
+`limit_fraction` of the cut-off.
+Each alarm fires once and re-arms when its statistic is back in control, so a drifted process warns
+once instead of on every unit.
+"""
+
+import math
+import threading
+from dataclasses import dataclass
+
+from utils import event_system, EventType, LogLevel, DeliveryMode
+
+@dataclass
+class ProcessStatistics:
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0  # Sum of squared deviations from the mean (Welford)
+    ewma: float = None
+    cusum: float = 0.0
+    baseline_mean: float = None
+    baseline_std: float = None
+    current_cut_off: float = None
+    alarms: frozenset = frozenset()  # Rules currently in alarm
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    @property
+    def cpk(self):
+        """Process capability against the cut-off, from the running mean and standard deviation."""
+        if self.current_cut_off is None or self.std == 0.0:
+            return None
+        return (self.current_cut_off - self.mean) / (3 * self.std)
+
+class SpcEngine:
+    RULES = {
+        "ewma": "EWMA above its upper control limit",
+        "cusum": "CUSUM detected a sustained increase",
+        "limit": "EWMA approaching the cut-off",
+    }
+
+    def __init__(self, baseline=50, ewma_lambda=0.2, ewma_width=3.0, cusum_k=0.5, cusum_h=5.0, limit_fraction=0.8):
+        """
+        Args:
+            baseline (int): Readings that fix a process's in-control mean and standard deviation.
+            ewma_lambda (float): Weight of the newest reading in the EWMA.
+            ewma_width (float): Width of the EWMA control limit in standard deviations of the EWMA.
+            cusum_k (float): CUSUM allowance, in baseline standard deviations.
+            cusum_h (float): CUSUM decision interval, in baseline standard deviations.
+            limit_fraction (float): Alarm when the EWMA exceeds this fraction of the cut-off.
+        """
+        self.baseline = baseline
+        self.ewma_lambda = ewma_lambda
+        self.ewma_width = ewma_width
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+        self.limit_fraction = limit_fraction
+        self.processes = {}  # (test_number, voltage, lot) -> ProcessStatistics
+        self._lock = threading.Lock()
+
+        self._listeners = (
+            (EventType.SUB_TEST_CONCLUDED, self.handle_sub_test_concluded, DeliveryMode.BACKGROUND),
+        )
+        for event_type, listener, mode in self._listeners:
+            event_system.register_listener(event_type, listener, mode)
+
+    def handle_sub_test_concluded(self, data):
+        # Errors carry no valid reading
+        if data.get("status") == "ERROR" or data.get("current") is None:
+            return
+        batch_info = data.get("batch_info")
+        lot = batch_info.lot_hardener_number if batch_info else None
+        self.add(data["test_number"], data.get("voltage"), lot, data["current"], data.get("current_cut_off"))
+
+    def add(self, test_number, voltage, lot, current, current_cut_off=None):
+        """Updates the statistics of a process with one reading and dispatches any new alarms."""
+        key = (test_number, voltage, lot)
+        with self._lock:
+            stats = self.processes.get(key)
+            if stats is None:
+                stats = self.processes[key] = ProcessStatistics()
+                reference = self._reference(test_number, voltage)
+                if reference:
+                    # All readings of the reference estimate the process better than its first `baseline`
+                    stats.baseline_mean = reference.mean
+                    stats.baseline_std = max(reference.std, 1e-3 * abs(reference.mean), 1e-9)
+            if current_cut_off is not None:
+                stats.current_cut_off = current_cut_off
+
+            stats.count += 1
+            delta = current - stats.mean
+            stats.mean += delta / stats.count
+            stats.m2 += delta * (current - stats.mean)
+            previous = stats.ewma if stats.ewma is not None else stats.baseline_mean
+            stats.ewma = current if previous is None else self.ewma_lambda * current + (1 - self.ewma_lambda) * previous
+
+            if stats.baseline_mean is None:
+                if stats.count >= self.baseline:
+                    # The baseline ends here; the EWMA restarts from the in-control mean
+                    stats.baseline_mean = stats.mean
+                    stats.baseline_std = max(stats.std, 1e-3 * abs(stats.mean), 1e-9)
+                    stats.ewma = stats.mean
+                return
+
+            sigma = stats.baseline_std
+            stats.cusum = max(0.0, stats.cusum + current - stats.baseline_mean - self.cusum_k * sigma)
+            # Asymptotic EWMA limit: the baseline is long enough for the start-up term to be negligible
+            ewma_limit = stats.baseline_mean + self.ewma_width * sigma * math.sqrt(self.ewma_lambda / (2 - self.ewma_lambda))
+            in_alarm = set()
+            if stats.ewma > ewma_limit:
+                in_alarm.add("ewma")
+            if stats.cusum > self.cusum_h * sigma:
+                in_alarm.add("cusum")
+            if stats.current_cut_off is not None and stats.ewma > self.limit_fraction * stats.current_cut_off:
+                in_alarm.add("limit")
+            new_alarms = in_alarm - stats.alarms
+            stats.alarms = frozenset(in_alarm)
+            snapshot = (stats.count, stats.ewma, ewma_limit, stats.baseline_mean)
+
+        for rule in sorted(new_alarms):
+            self._alarm(rule, key, snapshot)
+
+    def _reference(self, test_number, voltage):
+        """The in-control process with a baseline and the most readings for the same test and voltage. Caller holds the lock."""
+        candidates = [stats for (number, volts, _), stats in self.processes.items()
+                      if number == test_number and volts == voltage and stats.baseline_mean is not None and not stats.alarms]
+        return max(candidates, key=lambda stats: stats.count, default=None)
+
+    def _alarm(self, rule, key, snapshot):
+        test_number, voltage, lot = key
+        count, ewma, ewma_limit, baseline_mean = snapshot
+        event_system.dispatch_event(EventType.LOG_EVENT, {
+            "message": f"SPC: {self.RULES[rule]} for sub-test {test_number} at {voltage} V, lot {lot or 'unknown'}: "
+                       f"EWMA {ewma:.3f} mA against a baseline of {baseline_mean:.3f} mA after {count} units.",
+            "level": LogLevel.WARNING
+        })
+        event_system.dispatch_event(EventType.SPC_ALARM, {
+            "rule": rule,
+            "test_number": test_number,
+            "voltage": voltage,
+            "lot": lot,
+            "count": count,
+            "ewma": ewma,
+            "ewma_limit": ewma_limit,
+            "baseline_mean": baseline_mean,
+        })
+
+    def statistics(self, test_number, voltage, lot):
+        """A copy of the statistics of a process, or None."""
+        with self._lock:
+            stats = self.processes.get((test_number, voltage, lot))
+            return None if stats is None else ProcessStatistics(**vars(stats))
+
+    def close(self):
+        for event_type, listener, _ in self._listeners:
+            try:
+                event_system.unregister_listener(event_type, listener)
+            except ValueError:
+                pass
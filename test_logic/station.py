@@ -0,0 +1,158 @@
+# station.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import event_system, EventType, LogLevel
+from test_logic.sub_test import SubTest
+from test_logic.test_plan import load_test_plan
+
+class Station:
+    """
+    One test fixture: its own HardwareClient endpoint (and with it its own backup relay controller
+    and relay watchdog) and its own result stream. A station tests one unit at a time.
+    """
+
+    def __init__(self, name, hardware_client, plan=None):
+        """
+        Args:
+            plan (TestPlan): Compiled test plan the station runs. Defaults to the default plan file.
+        """
+        self.name = name
+        self.hardware_client = hardware_client
+        self.plan = plan or load_test_plan()
+        self.serial_number = None
+        self.batch_info = None
+        self.started_at = None
+        self.results = []
+        self.is_running = False
+
+    def run_unit(self, serial_number, batch_info=None, preflight=None):
+        """
+        Runs the sub-tests on one unit and collects their results in self.results.
+        Returns True if the unit went through the whole sequence, False if the connection check
+        failed, the watchdog could not switch relays off, a sub-test ended in an error or the station
+        was stopped.
+
+        Args:
+            batch_info (BatchInformation): Batch the unit belongs to, kept with its results.
+            preflight (Future): Connection check submitted when the unit was staged. If it has
+                succeeded, the unit starts without checking the connection again.
+        """
+        self.serial_number = serial_number
+        self.batch_info = batch_info
+        self.started_at = time.time()
+        self.results = []
+        self.is_running = True
+        held_relays = ()  # Relays the last sub-test left closed for the next one
+        try:
+            stuck_relays = self.hardware_client.stuck_relays()
+            if stuck_relays:
+                event_system.dispatch_event(EventType.LOG_EVENT, {
+                    "message": f"{self.name}: Relays {stuck_relays} could not be switched off after their timeout. Test execution aborted.",
+                    "level": LogLevel.ERROR,
+                    "station": self.name,
+                    "serial_number": serial_number
+                })
+                return False
+
+            # Check connection with hardware client, unless it was already verified while the unit was staged
+            verified = preflight is not None and self.hardware_client.connection_verified(preflight)
+            if not verified and not self.hardware_client.check_connection():
+                event_system.dispatch_event(EventType.LOG_EVENT, {
+                    "message": f"{self.name}: Hardware connection check failed. Test execution aborted.",
+                    "level": LogLevel.ERROR,
+                    "station": self.name,
+                    "serial_number": serial_number
+                })
+                return False
+
+            self._progress(1)
+            for i, step in enumerate(self.plan, start=1):
+                if not self.is_running:
+                    break
+                if i > 1:
+                    self._progress(i)
+
+                sub_test = SubTest.from_step(step, self.hardware_client, self.name, serial_number, batch_info)
+                status = sub_test.run()
+                if sub_test.held_relays is not None:
+                    held_relays = sub_test.held_relays
+                self.results.append(sub_test.get_result())
+                if step.pause:
+                    time.sleep(step.pause)
+                if status == "ERROR":
+                    return False  # Aborted mid-sequence, the unit did not go through every step
+            return self.is_running
+        finally:
+            self.is_running = False
+            # A stop or an error between steps would otherwise leave the held relays closed until their watchdog trips
+            if held_relays:
+                self._release_relays(held_relays)
+
+    def _release_relays(self, relays):
+        """Opens relays left closed by the sequence and disarms their watchdog entries."""
+        try:
+            self.hardware_client.set_relays({"relays": list(relays), "state": False})
+        except Exception as e:
+            event_system.dispatch_event(EventType.LOG_EVENT, {
+                "message": f"{self.name}: Could not release relays {list(relays)}: {e}",
+                "level": LogLevel.ERROR,
+                "station": self.name,
+                "serial_number": self.serial_number
+            })
+
+    def _progress(self, position):
+        event_system.dispatch_event(EventType.PROGRESS_UPDATE, {
+            "position": position,
+            "station": self.name,
+            "serial_number": self.serial_number,
+            "message": f"Progress update: Position {position}."
+        })
+
+    def stop(self):
+        self.is_running = False
+
+class StationPool:
+    """Runs units on several stations concurrently, one worker thread per station."""
+
+    def __init__(self, stations):
+        self.stations = list(stations)
+        self._busy = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.stations)), thread_name_prefix="Station")
+
+    def submit(self, station, serial_number, on_complete=None, **run_options):
+        """
+        Starts a unit on the station and returns a future of run_unit's result; run_options are
+        passed on to run_unit.
+        on_complete(station, completed) is called on the station's worker thread once the unit is done.
+        Raises RuntimeError if the station is still testing another unit.
+        """
+        with self._lock:
+            if station in self._busy:
+                raise RuntimeError(f"{station.name} is still testing {station.serial_number}.")
+            self._busy.add(station)
+        return self._executor.submit(self._run, station, serial_number, on_complete, run_options)
+
+    def _run(self, station, serial_number, on_complete, run_options):
+        try:
+            completed = station.run_unit(serial_number, **run_options)
+            if on_complete:
+                on_complete(station, completed)
+            return completed
+        finally:
+            with self._lock:
+                self._busy.discard(station)
+
+    def is_busy(self, station=None):
+        with self._lock:
+            return station in self._busy if station else bool(self._busy)
+
+    def stop_all(self):
+        for station in self.stations:
+            station.stop()
+
+    def close(self):
+        self.stop_all()
+        self._executor.shutdown(wait=True)
@@ -1,79 +1,148 @@
 import time
 import random
 from utils import event_system, EventType, TestConstants, test_number_to_relays, LogLevel
+from hardware.current_stream import SampleRingBuffer
+from test_logic.adaptive_dwell import DwellMonitor, DwellDecision
+from test_logic.waveform import Waveform, summarize
+
+STREAM_STALL_TIMEOUT = 1.0  # Seconds without samples before a streamed measurement is abandoned
 
 class SubTest:
-    def __init__(self, test_number, voltage):
+    def __init__(self, test_number, voltage, hardware_client=None, station=None, serial_number=None, step=None, batch_info=None):
+        """
+        Args:
+            step (PlanStep): Compiled test plan step with the relays, relay mask, dwell, cut-off and relay
+                timeout of this sub-test. Without one, they come from utils.constants.
+            hardware_client (HardwareClient): Client of the station running this sub-test. Without one,
+                the hardware is driven through events handled by the primary HardwareClient.
+            station (str): Name of the station, added to the sub-test events.
+            serial_number (str): Unit under test, added to the sub-test events.
+            batch_info (BatchInformation): Batch of the unit, added to SUB_TEST_CONCLUDED so listeners
+                attribute the reading to the unit's own lot even while the next batch is being entered.
+        """
         self.test_number = test_number
         self.voltage = voltage
+        self.hardware_client = hardware_client
+        self.station = station
+        self.serial_number = serial_number
+        self.step = step
+        self.batch_info = batch_info
+        self.current_cut_off = step.current_cut_off if step else TestConstants.CURRENT_CUT_OFF.value
         self.current = None
         self.status = None
+        self.dwell_time = None  # Seconds the voltage was applied before the verdict
+        self.decision = None  # DwellDecision of a measured sub-test
+        self.waveform = None  # Waveform of the current during the dwell
+        self.stats = {}  # Peak, mean, RMS and slope of the current during the dwell
+        self.held_relays = None  # Relays this sub-test left closed; None until it switched any
+
+    def _event_data(self, **data):
+        """Adds the station and serial number, when known, so listeners can tell concurrent units apart."""
+        if self.station is not None:
+            data["station"] = self.station
+        if self.serial_number is not None:
+            data["serial_number"] = self.serial_number
+        return data
+
+    @classmethod
+    def from_step(cls, step, hardware_client=None, station=None, serial_number=None, batch_info=None):
+        return cls(step.test_number, step.voltage, hardware_client, station, serial_number, step, batch_info)
+
+    def _relay_request(self, state, release_all=False):
+        """
+        Relay request for the hardware. Plan steps carry their precomputed mask, which skips re-validation.
+        Relays the plan holds for the next step are left closed after the measurement, unless release_all.
+        """
+        if self.step:
+            if state or release_all:
+                relays, relay_mask = self.step.relays, self.step.relay_mask
+            else:
+                relays, relay_mask = self.step.release_relays, self.step.relay_mask & ~self.step.hold_mask
+            return {"relays": relays, "relay_mask": relay_mask, "timeout": self.step.relay_timeout, "state": state}
+        return {"relays": test_number_to_relays[self.test_number], "timeout": TestConstants.TIMEOUT.value, "state": state}
+
+    def _set_test_conditions(self, event_data):
+        if self.hardware_client:
+            self.hardware_client.set_test_conditions(event_data)
+        else:
+            event_system.dispatch_event(EventType.SET_TEST_CONDITIONS, event_data)
+
+    def _set_relays(self, event_data):
+        if self.hardware_client:
+            self.hardware_client.set_relays(event_data)
+        else:
+            event_system.dispatch_event(EventType.SET_RELAYS, event_data)
 
     def run(self):
         try:
             # Dispatch SUB_TEST_STARTED event
-            event_system.dispatch_event(EventType.SUB_TEST_STARTED, {
-                "test_number": self.test_number,
-                "voltage": self.voltage
-            })
-
-            # Log setting hi-pot voltage
-            event_system.dispatch_event(EventType.LOG_EVENT, {
-                "message": f"Setting hi-pot tester to {self.voltage}V",
-                "level": LogLevel.DEBUG
-            })
-            event_system.dispatch_event(EventType.SET_HIPOT_VOLTAGE, {"voltage": self.voltage})
-
-            relays = test_number_to_relays[self.test_number]
-            event_system.dispatch_event(EventType.LOG_EVENT, {
-                "message": f"Setting relays {relays} to open before measurement",
-                "level": LogLevel.DEBUG
-            })
-            event_system.dispatch_event(EventType.SET_RELAYS, {
-                "relays": relays,
-                "timeout": 10,
-                "state": True
-            })
-
-            # Simulate test runtime
-            time.sleep(TestConstants.RUNTIME.value)
-            
-            # Simulate reading current (replace with actual hardware interface)
-            self.current = self._simulate_current_measurement()
+            event_system.dispatch_event(EventType.SUB_TEST_STARTED, self._event_data(
+                test_number=self.test_number,
+                voltage=self.voltage
+            ))
+
+            # Apply voltage and relays in one pipelined exchange with the hardware
+            relays = self.step.relays if self.step else test_number_to_relays[self.test_number]
+            dwell = self.step.dwell if self.step else TestConstants.RUNTIME.value
+            current_cut_off = self.current_cut_off
+            event_system.dispatch_event(EventType.LOG_EVENT, self._event_data(
+                message=f"Setting hi-pot tester to {self.voltage}V and relays {relays} to open before measurement",
+                level=LogLevel.DEBUG
+            ))
+            # Counted as closed before the request, the hardware may have switched them when it fails
+            self.held_relays = tuple(relays)
+            self._set_test_conditions({"voltage": self.voltage, **self._relay_request(True)})
+
+            if self.hardware_client and self.step:
+                # Acquire the current during the dwell; adaptive steps stop as soon as the verdict is clear
+                self.current = self._measure(dwell, current_cut_off)
+            else:
+                # Simulate test runtime
+                time.sleep(dwell)
+                self.dwell_time = dwell
+
+                # Simulate reading current (replace with actual hardware interface)
+                self.current = self._simulate_current_measurement()
             
             # Log measured current
-            event_system.dispatch_event(EventType.LOG_EVENT, {
-                "message": f"Measured current test {self.test_number}: {self.current:.2f} mA",
-                "level": LogLevel.INFO
-            })
+            event_system.dispatch_event(EventType.LOG_EVENT, self._event_data(
+                message=f"Measured current test {self.test_number}: {self.current:.2f} mA",
+                level=LogLevel.INFO
+            ))
 
             # Evaluate test result
-            if 0 <= self.current <= TestConstants.CURRENT_CUT_OFF.value:
+            if 0 <= self.current <= current_cut_off:
                 self.status = "SUCCESS"
-                event_system.dispatch_event(EventType.LOG_EVENT, {
-                    "message": f"Sub-test {self.test_number} passed.",
-                    "level": LogLevel.DEBUG
-                })
+                event_system.dispatch_event(EventType.LOG_EVENT, self._event_data(
+                    message=f"Sub-test {self.test_number} passed.",
+                    level=LogLevel.DEBUG
+                ))
             else:
                 self.status = "FAILURE"
-                event_system.dispatch_event(EventType.LOG_EVENT, {
-                    "message": f"Sub-test {self.test_number} failed.",
-                    "level": LogLevel.WARNING
-                })
+                event_system.dispatch_event(EventType.LOG_EVENT, self._event_data(
+                    message=f"Sub-test {self.test_number} failed.",
+                    level=LogLevel.WARNING
+                ))
 
             # Log setting relays to closed after measurement
-            event_system.dispatch_event(EventType.LOG_EVENT, {
-                "message": f"Setting relays {relays} to closed after measurement",
-                "level": LogLevel.DEBUG
-            })
-            event_system.dispatch_event(EventType.SET_RELAYS, {"relays": relays, "state": False})
+            release = self._relay_request(False, release_all=self.decision is DwellDecision.OVERCURRENT)
+            if release["relays"]:
+                event_system.dispatch_event(EventType.LOG_EVENT, self._event_data(
+                    message=f"Setting relays {release['relays']} to closed after measurement",
+                    level=LogLevel.DEBUG
+                ))
+                self._set_relays(release)
+            self.held_relays = tuple(relay for relay in relays if relay not in release["relays"])
 
             # Dispatch SUB_TEST_CONCLUDED event
-            event_system.dispatch_event(EventType.SUB_TEST_CONCLUDED, {
-                "test_number": self.test_number,
-                "status": self.status,
-                "current": self.current
-            })
+            event_system.dispatch_event(EventType.SUB_TEST_CONCLUDED, self._event_data(
+                test_number=self.test_number,
+                voltage=self.voltage,
+                status=self.status,
+                current=self.current,
+                current_cut_off=current_cut_off,
+                batch_info=self.batch_info
+            ))
 
             return self.status
 
@@ -82,28 +151,98 @@ class SubTest:
             error_message = f"Error in sub-test {self.test_number}: {str(e)}"
             
             # Replace ERROR_OCCURRED with LOG_EVENT at ERROR level
-            event_system.dispatch_event(EventType.LOG_EVENT, {
-                "message": error_message,
-                "level": LogLevel.ERROR
-            })
+            event_system.dispatch_event(EventType.LOG_EVENT, self._event_data(
+                message=error_message,
+                level=LogLevel.ERROR
+            ))
             
             # Dispatch SUB_TEST_CONCLUDED event for error case
-            event_system.dispatch_event(EventType.SUB_TEST_CONCLUDED, {
-                "test_number": self.test_number,
-                "status": self.status,
-                "current": self.current  # This might be None in case of an error
-            })
+            event_system.dispatch_event(EventType.SUB_TEST_CONCLUDED, self._event_data(
+                test_number=self.test_number,
+                voltage=self.voltage,
+                status=self.status,
+                current=self.current,  # This might be None in case of an error
+                current_cut_off=self.current_cut_off,
+                batch_info=self.batch_info
+            ))
             
             return self.status
 
+    def _measure(self, dwell, current_cut_off):
+        """Acquires the current until the DwellMonitor reaches a decision and keeps the waveform."""
+        min_dwell = self.step.min_dwell if self.step.adaptive else dwell
+        monitor = DwellMonitor(current_cut_off, dwell, min_dwell=min_dwell, trip_current=self.step.trip_current)
+        stream = self.hardware_client.start_current_stream(
+            rate=self.step.sample_rate,
+            block_size=max(1, round(self.step.sample_rate * self.step.sample_interval)),
+            max_duration=self.step.relay_timeout
+        )
+        if stream is None:
+            buffer, sample_rate = self._poll_current(monitor), 1 / self.step.sample_interval
+        else:
+            buffer, sample_rate = self._stream_current(stream, monitor), stream.rate
+
+        times, currents, _ = buffer.read()
+        self.waveform = Waveform.from_samples(times, currents, sample_rate)
+        self.stats = summarize(times, currents)
+        self.decision = monitor.decision
+        self.dwell_time = monitor.elapsed
+        if monitor.decision is DwellDecision.OVERCURRENT:
+            event_system.dispatch_event(EventType.LOG_EVENT, self._event_data(
+                message=f"Overcurrent of {monitor.current:.2f} mA in sub-test {self.test_number} after {monitor.elapsed:.2f} s, de-energizing.",
+                level=LogLevel.WARNING
+            ))
+        elif monitor.decision is DwellDecision.PASS:
+            event_system.dispatch_event(EventType.LOG_EVENT, self._event_data(
+                message=f"Sub-test {self.test_number} stable after {monitor.elapsed:.2f} s ({len(currents)} samples), ending dwell early.",
+                level=LogLevel.DEBUG
+            ))
+        return monitor.current
+
+    def _stream_current(self, stream, monitor):
+        """Feeds the monitor the mean and peak of each sample_interval of the stream."""
+        position = 0
+        last_samples = time.monotonic()
+        try:
+            while True:
+                stream.ended.wait(self.step.sample_interval)
+                times, currents, position = stream.buffer.read(position)
+                if len(currents):
+                    last_samples = time.monotonic()
+                    if monitor.add(float(times[-1]), float(currents.mean()), float(currents.max())) is not DwellDecision.CONTINUE:
+                        return stream.buffer
+                elif stream.ended.is_set() or time.monotonic() - last_samples > STREAM_STALL_TIMEOUT:
+                    raise RuntimeError(f"Current stream stopped delivering samples ({stream.end_reason or 'stalled'}).")
+        finally:
+            self.hardware_client.stop_current_stream(stream)
+
+    def _poll_current(self, monitor):
+        """Reads the current every sample_interval, for servers that cannot stream."""
+        buffer = SampleRingBuffer(int(self.step.dwell / self.step.sample_interval) + 2)
+        start = time.monotonic()
+        next_sample = start
+        while True:
+            response = self.hardware_client.read_current()
+            if response.get('status') != 'success':
+                raise RuntimeError(f"Reading the current failed: {response.get('message')}")
+            elapsed = time.monotonic() - start
+            buffer.extend((elapsed,), (response['current'],))
+            if monitor.add(elapsed, response['current']) is not DwellDecision.CONTINUE:
+                return buffer
+            next_sample += self.step.sample_interval
+            time.sleep(max(0.0, next_sample - time.monotonic()))
+
     def _simulate_current_measurement(self):
         # Replace this with actual hardware interface
         return random.uniform(0.0, 6)
 
     def get_result(self):
-        return {
-            "test_number": self.test_number,
-            "voltage": self.voltage,
-            "current": self.current,
-            "status": self.status
-        }
+        return self._event_data(
+            test_number=self.test_number,
+            voltage=self.voltage,
+            current=self.current,
+            status=self.status,
+            dwell_time=self.dwell_time,
+            waveform=self.waveform,
+            **self.stats
+        )
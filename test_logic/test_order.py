@@ -0,0 +1,136 @@
+"""
+Orders the steps of a test plan to minimize hi-pot voltage changes and relay switching.
+
+Every voltage change costs settling time and every relay state change costs contact wear, so a
+transition between two steps costs (voltage changed, relays switched). Relay switches follow what the
+sub-tests do: after a step its relays are opened, except those held for the next step (only with
+hold_shared_relays and an unchanged voltage), and the next step closes its relays that were not held.
+The relays of the last step are opened at the end. Costs compare as tuples:
+fewer voltage changes always win, then fewer relay switches. The order is found exactly with the
+Held-Karp dynamic program over subsets, honouring each step's `after` constraints. Plans with more
+steps than EXACT_LIMIT fall back to a greedy order under the same constraints.
+"""
+
+EXACT_LIMIT = 13  # Held-Karp needs 2^n * n states; 13 steps optimize in well under a second
+
+class OrderError(ValueError):
+    """Raised when the precedence constraints of a plan cannot all be met."""
+
+def _popcount(mask):
+    return bin(mask).count("1")
+
+def held_mask(previous, step, hold_shared_relays=False):
+    """Relays previous leaves closed for step, as compile_plan sets PlanStep.hold_mask."""
+    if hold_shared_relays and previous is not None and previous.voltage == step.voltage:
+        return previous.relay_mask & step.relay_mask
+    return 0
+
+def transition_cost(previous, step, hold_shared_relays=False):
+    """(voltage changes, relay switches) of going from previous (None at the start) to step."""
+    if previous is None:
+        return (1, _popcount(step.relay_mask))
+    held = held_mask(previous, step, hold_shared_relays)
+    opened = _popcount(previous.relay_mask & ~held)
+    closed = _popcount(step.relay_mask & ~held)
+    return (int(previous.voltage != step.voltage), opened + closed)
+
+def schedule_cost(steps, hold_shared_relays=False):
+    """Total (voltage changes, relay switches) of running the steps in the given order."""
+    voltage_changes = relay_switches = 0
+    previous = None
+    for step in steps:
+        voltages, relays = transition_cost(previous, step, hold_shared_relays)
+        voltage_changes += voltages
+        relay_switches += relays
+        previous = step
+    if previous is not None:
+        relay_switches += _popcount(previous.relay_mask)  # Opened after the last measurement
+    return voltage_changes, relay_switches
+
+def _prerequisites(steps):
+    """Bitmask of the steps each step must come after, by position in steps."""
+    positions = {step.test_number: i for i, step in enumerate(steps)}
+    prerequisites = []
+    for step in steps:
+        mask = 0
+        for test_number in step.after:
+            if test_number not in positions:
+                raise OrderError(f"Step {step.test_number} must come after unknown test {test_number}.")
+            mask |= 1 << positions[test_number]
+        prerequisites.append(mask)
+    return prerequisites
+
+def optimize_order(steps, hold_shared_relays=False):
+    """Returns the steps in the cheapest order that satisfies every `after` constraint. Raises OrderError."""
+    steps = list(steps)
+    if len(steps) <= 1:
+        return steps
+    prerequisites = _prerequisites(steps)
+    if len(steps) <= EXACT_LIMIT:
+        order = _held_karp(steps, prerequisites, hold_shared_relays)
+    else:
+        order = _greedy(steps, prerequisites, hold_shared_relays)
+    if order is None:
+        raise OrderError("The 'after' constraints of the test plan form a cycle.")
+    return [steps[i] for i in order]
+
+def _held_karp(steps, prerequisites, hold_shared_relays):
+    n = len(steps)
+    full = (1 << n) - 1
+    # Costs are packed into one int per transition so the inner loop compares plain integers;
+    # voltage changes are scaled above any possible number of relay switches (16 per transition), and
+    # those above a tie-break counting the transitions that leave the plan's order, so among equally
+    # cheap orders the one closest to the plan wins.
+    tie_scale = n + 1
+    scale = (16 * (n + 1) + 1) * tie_scale
+    packed = lambda cost, out_of_order: cost[0] * scale + cost[1] * tie_scale + out_of_order
+    start = [packed(transition_cost(None, step), int(i != 0)) for i, step in enumerate(steps)]
+    between = [[packed(transition_cost(a, b, hold_shared_relays), int(j != i + 1)) for j, b in enumerate(steps)]
+               for i, a in enumerate(steps)]
+    end = [_popcount(step.relay_mask) * tie_scale for step in steps]
+
+    infinity = float('inf')
+    # best[visited][last] is the cheapest cost of visiting `visited` and ending at `last`
+    best = [[infinity] * n for _ in range(full + 1)]
+    previous = [[-1] * n for _ in range(full + 1)]
+    for i in range(n):
+        if not prerequisites[i]:
+            best[1 << i][i] = start[i]
+
+    for visited in range(1, full + 1):
+        costs = best[visited]
+        candidates = [i for i in range(n) if not visited & (1 << i) and not prerequisites[i] & ~visited]
+        if not candidates:
+            continue
+        for last in range(n):
+            cost = costs[last]
+            if cost == infinity:
+                continue
+            row = between[last]
+            for i in candidates:
+                candidate = cost + row[i]
+                target = visited | (1 << i)
+                if candidate < best[target][i]:
+                    best[target][i] = candidate
+                    previous[target][i] = last
+
+    last = min(range(n), key=lambda i: (best[full][i] + end[i], i))
+    if best[full][last] == infinity:
+        return None
+    order, visited = [], full
+    while last != -1:
+        order.append(last)
+        last, visited = previous[visited][last], visited & ~(1 << last)
+    return order[::-1]
+
+def _greedy(steps, prerequisites, hold_shared_relays):
+    order, visited, previous = [], 0, None
+    for _ in steps:
+        ready = [i for i in range(len(steps)) if not visited & (1 << i) and not prerequisites[i] & ~visited]
+        if not ready:
+            return None
+        i = min(ready, key=lambda i: (transition_cost(previous, steps[i], hold_shared_relays), i))
+        order.append(i)
+        visited |= 1 << i
+        previous = steps[i]
+    return order
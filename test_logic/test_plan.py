@@ -0,0 +1,250 @@
+"""
+Declarative test plans.
+
+A plan file (JSON, TOML or YAML) lists the sub-tests of a product variant with their voltage and relays,
+plus defaults for dwell, pause and cut-off. load_test_plan validates the file once and compiles it into
+a TestPlan of PlanSteps with precomputed relay masks, so nothing is re-validated while measuring.
+
+Example (TOML):
+
+    name = "Standard"
+    dwell = 1.5             # Seconds at voltage before the reading
+    pause = 1.0             # Seconds between sub-tests
+    current_cut_off = 5.2   # mA
+    trip_current = 8.0      # Optional, mA: a sample above it de-energizes at once
+    relay_timeout = 10      # Watchdog limit for the relays of a step, in seconds
+    order = "optimized"     # "fixed" (default) runs the steps as listed, see test_logic.test_order
+    hold_shared_relays = true  # Keep relays shared with the next step closed if the voltage stays the same
+    adaptive_dwell = true   # Sample during the dwell and end it early, see test_logic.adaptive_dwell
+    min_dwell = 0.5         # Earliest early pass, in seconds
+    sample_interval = 0.05  # Seconds between dwell decisions (between readings when polling)
+    sample_rate = 1000      # Streamed current samples per second
+
+    [[steps]]
+    test_number = 1
+    voltage = 500
+    relays = [2, 3]
+
+    [[steps]]
+    test_number = 2
+    voltage = 500
+    relays = [2, 6]
+    after = [1]             # Optional ordering constraint
+"""
+
+import os
+import json
+from dataclasses import dataclass, replace
+
+from utils import TestConstants, MAX_TEST_NUMBER
+from hardware.ni_usb_6525 import relays_to_mask, mask_to_relays, RELAY_COUNT
+from test_logic.test_order import optimize_order, schedule_cost, held_mask, OrderError
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+DEFAULT_PLAN_PATH = os.path.join(os.path.dirname(__file__), "plans", "default.json")
+MAX_VOLTAGE = 5000  # Upper limit accepted in plan files, in volts
+MAX_SAMPLE_RATE = 20000  # Samples per second
+
+# (minimum, maximum) of every plan value that a step can override, checked the same at both levels
+LIMITS = {
+    "dwell": (0.01, None),
+    "pause": (0.0, None),
+    "current_cut_off": (0.001, None),
+    "relay_timeout": (0.01, None),
+    "min_dwell": (0.01, None),
+    "sample_interval": (0.005, None),
+    "sample_rate": (1, MAX_SAMPLE_RATE),
+}
+
+class TestPlanError(ValueError):
+    """Raised when a test plan file cannot be read or does not validate."""
+
+@dataclass(frozen=True)
+class PlanStep:
+    test_number: int
+    voltage: float
+    relays: tuple
+    relay_mask: int  # Relays as an 8-bit port mask, bit n = relay n
+    dwell: float
+    pause: float  # Pause after this step; 0 for the last step
+    current_cut_off: float
+    relay_timeout: float
+    after: tuple = ()  # Test numbers that must run before this step
+    hold_mask: int = 0  # Relays left closed for the next step instead of being opened after this one
+    adaptive: bool = False  # Sample during the dwell and stop early, see test_logic.adaptive_dwell
+    min_dwell: float = 0.5
+    sample_interval: float = 0.05
+    sample_rate: float = 1000.0
+    trip_current: float = None  # Sample in mA that ends the dwell at once as an overcurrent; None never does
+
+    @property
+    def release_relays(self):
+        """Relays opened after the measurement."""
+        return mask_to_relays(self.relay_mask & ~self.hold_mask)
+
+@dataclass(frozen=True)
+class TestPlan:
+    name: str
+    steps: tuple
+    source: str = None
+    optimized: bool = False
+    hold_shared_relays: bool = False
+
+    @property
+    def cost(self):
+        """(voltage changes, relay switches) per unit, see test_logic.test_order."""
+        return schedule_cost(self.steps, self.hold_shared_relays)
+
+    def __iter__(self):
+        return iter(self.steps)
+
+    def __len__(self):
+        return len(self.steps)
+
+def _read_plan_file(path):
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        if extension == '.json':
+            with open(path, 'r', encoding='utf-8') as plan_file:
+                return json.load(plan_file)
+        if extension == '.toml':
+            if tomllib is None:
+                raise TestPlanError("Reading TOML test plans requires Python 3.11 or the tomli package.")
+            with open(path, 'rb') as plan_file:
+                return tomllib.load(plan_file)
+        if extension in ('.yaml', '.yml'):
+            if yaml is None:
+                raise TestPlanError("Reading YAML test plans requires the PyYAML package.")
+            with open(path, 'r', encoding='utf-8') as plan_file:
+                return yaml.safe_load(plan_file)
+    except TestPlanError:
+        raise
+    except Exception as e:
+        raise TestPlanError(f"Cannot read test plan '{path}': {e}") from e
+    raise TestPlanError(f"Unsupported test plan format '{extension}', use .json, .toml or .yaml.")
+
+def _number(spec, key, default, where, minimum=0.0, maximum=None):
+    value = spec.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise TestPlanError(f"{where}: '{key}' must be a number.")
+    if value < minimum or (maximum is not None and value > maximum):
+        raise TestPlanError(f"{where}: '{key}' must be between {minimum} and {maximum}." if maximum is not None
+                            else f"{where}: '{key}' must be at least {minimum}.")
+    return value
+
+def _trip_current(spec, default, where):
+    """The optional trip current; None, also given explicitly, leaves the overcurrent abort off."""
+    if spec.get("trip_current", default) is None:
+        return None
+    return _number(spec, "trip_current", default, where, *LIMITS["current_cut_off"])
+
+def compile_plan(spec, source=None):
+    """Validates a parsed plan and compiles it into a TestPlan. Raises TestPlanError."""
+    if not isinstance(spec, dict) or not isinstance(spec.get("steps"), list) or not spec["steps"]:
+        raise TestPlanError(f"{source or 'Test plan'}: a plan needs a non-empty 'steps' list.")
+
+    defaults = {
+        "dwell": TestConstants.RUNTIME.value,
+        "pause": TestConstants.PAUSE_TIME.value,
+        "current_cut_off": TestConstants.CURRENT_CUT_OFF.value,
+        "relay_timeout": TestConstants.TIMEOUT.value,
+        "min_dwell": 0.5,
+        "sample_interval": 0.05,
+        "sample_rate": 1000.0,
+    }
+    defaults = {key: _number(spec, key, default, "Plan", *LIMITS[key]) for key, default in defaults.items()}
+    adaptive = spec.get("adaptive_dwell", False)
+    if not isinstance(adaptive, bool):
+        raise TestPlanError("Plan: 'adaptive_dwell' must be true or false.")
+
+    trip_current = _trip_current(spec, None, "Plan")
+
+    steps = []
+    seen = set()
+    for position, step_spec in enumerate(spec["steps"], start=1):
+        where = f"Step {position}"
+        if not isinstance(step_spec, dict):
+            raise TestPlanError(f"{where}: must be a table/object.")
+        test_number = step_spec.get("test_number", position)
+        if isinstance(test_number, bool) or not isinstance(test_number, int) or test_number in seen:
+            raise TestPlanError(f"{where}: 'test_number' must be a unique integer.")
+        if not 1 <= test_number <= MAX_TEST_NUMBER:
+            raise TestPlanError(f"{where}: 'test_number' must be between 1 and {MAX_TEST_NUMBER}, one per meter on the screen.")
+        seen.add(test_number)
+
+        relays = step_spec.get("relays")
+        if not isinstance(relays, list) or not relays or len(set(relays)) != len(relays):
+            raise TestPlanError(f"{where}: 'relays' must be a non-empty list of distinct relay indices.")
+        try:
+            relay_mask = relays_to_mask(relays)
+        except (TypeError, ValueError) as e:
+            raise TestPlanError(f"{where}: {e} Got {relays}, the port has {RELAY_COUNT} relays.") from e
+
+        values = {key: _number(step_spec, key, default, where, *LIMITS[key]) for key, default in defaults.items()}
+        after = step_spec.get("after", [])
+        if not isinstance(after, list) or not all(isinstance(n, int) and not isinstance(n, bool) for n in after):
+            raise TestPlanError(f"{where}: 'after' must be a list of test numbers.")
+        if values["relay_timeout"] <= values["dwell"]:
+            raise TestPlanError(f"{where}: 'relay_timeout' must be longer than 'dwell', or the watchdog opens the relays mid-measurement.")
+        if values["min_dwell"] > values["dwell"]:
+            raise TestPlanError(f"{where}: 'min_dwell' cannot be longer than 'dwell'.")
+        values["trip_current"] = _trip_current(step_spec, trip_current, where)
+        if values["trip_current"] is not None and values["trip_current"] < values["current_cut_off"]:
+            raise TestPlanError(f"{where}: 'trip_current' cannot be below 'current_cut_off'.")
+
+        steps.append(PlanStep(
+            test_number=test_number,
+            voltage=_number(step_spec, "voltage", None, where, minimum=1, maximum=MAX_VOLTAGE),
+            relays=tuple(relays),
+            relay_mask=relay_mask,
+            after=tuple(after),
+            adaptive=step_spec.get("adaptive_dwell", adaptive) is True,
+            **values
+        ))
+
+    hold_shared_relays = spec.get("hold_shared_relays", False)
+    if not isinstance(hold_shared_relays, bool):
+        raise TestPlanError("Plan: 'hold_shared_relays' must be true or false.")
+    order = spec.get("order", "fixed")
+    if order not in ("fixed", "optimized"):
+        raise TestPlanError("Plan: 'order' must be 'fixed' or 'optimized'.")
+    if order == "optimized":
+        try:
+            steps = optimize_order(steps, hold_shared_relays)
+        except OrderError as e:
+            raise TestPlanError(f"Plan: {e}") from e
+    else:
+        position = {step.test_number: i for i, step in enumerate(steps)}
+        for step in steps:
+            unknown = [n for n in step.after if n not in position]
+            if unknown:
+                raise TestPlanError(f"Step {step.test_number} must come after unknown test(s) {unknown}.")
+            late = [n for n in step.after if position[n] > position[step.test_number]]
+            if late:
+                raise TestPlanError(f"Step {step.test_number} is listed before {late}, which it must come after.")
+
+    # Hold relays shared with the next step when the voltage does not change; no pause after the last step
+    for i, step in enumerate(steps):
+        following = steps[i + 1] if i + 1 < len(steps) else None
+        hold_mask = held_mask(step, following, hold_shared_relays) if following else 0
+        steps[i] = replace(step, hold_mask=hold_mask, pause=step.pause if following else 0.0)
+
+    return TestPlan(name=str(spec.get("name", source or "Unnamed plan")), steps=tuple(steps), source=source,
+                    optimized=order == "optimized", hold_shared_relays=hold_shared_relays)
+
+def load_test_plan(path=None):
+    """Reads, validates and compiles a plan file. Without a path, the default plan is loaded."""
+    path = path or DEFAULT_PLAN_PATH
+    return compile_plan(_read_plan_file(path), source=path)
@@ -3,20 +3,48 @@ import threading
 import time
 import json
 import socket
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+from dataclasses import dataclass, field, fields
 
 from utils import event_system, EventType, LogLevel, TestConstants
-from test_logic.sub_test import SubTest
+from test_logic.station import Station, StationPool
 from hardware.hardware_client import HardwareClient
 from ui.widgets.serial_number_window import SerialNumberWindow 
 
+@dataclass
+class StagedUnit:
+    """A unit scanned while another one is under test, waiting for a free station."""
+    serial_number: str
+    batch_info: object
+    preflight: dict = field(default_factory=dict)  # Station -> connection check future
+    staged_at: float = field(default_factory=time.time)
+
 class TestRunner:
-    def __init__(self, hardware_client: HardwareClient):
+    def __init__(self, hardware_client: HardwareClient, stations=None, pipelined=False, max_staged=None, results_store=None):
+        """
+        Args:
+            stations (list): Stations to run units on. Defaults to one station on hardware_client.
+            pipelined (bool): Let the operator scan the next unit while the current one is under test.
+                Staged units start as soon as a station is free.
+            max_staged (int): Maximum number of staged units, one per station by default.
+            results_store (ResultsStore): Local database the results of every finished unit are written to.
+        """
         self.hardware_client = hardware_client
+        # Without explicit stations, the primary hardware client is the only fixture
+        self.stations = stations or [Station("Station 1", hardware_client)]
+        self.station_pool = StationPool(self.stations)
+        self.pipelined = pipelined
+        self.max_staged = max_staged or len(self.stations)
+        self.staged = deque()  # StagedUnit queue, oldest first
         self.serial_number = None
         self.is_running = False
-        self.results = []
-        self.current_position = 0
+        self.results = []  # Results of the last finished unit; earlier units are only kept in the results store
+        self._results_lock = threading.Lock()
+        self._lock = threading.Lock()  # Guards staged and _active
+        self._active = False  # True while _execute_tests is running units
         self.batch_info = None  # Add this
+        self.results_store = results_store
         
         # Register event listeners for batch information
         event_system.register_listener(EventType.BATCH_INFO_CONFIRMED, self.handle_batch_info_confirmed)
@@ -29,27 +57,102 @@ class TestRunner:
         self.batch_info = None
 
     def run_tests(self):
-        if self.is_running:
-            event_system.dispatch_event(EventType.LOG_EVENT, {"message": "Test already running.", "level": LogLevel.ERROR})
+        if self.is_running or self._active:
+            if self.pipelined:
+                self.stage_next_unit()
+            else:
+                event_system.dispatch_event(EventType.LOG_EVENT, {"message": "Test already running.", "level": LogLevel.ERROR})
             return
         if not self.batch_info:
             event_system.dispatch_event(EventType.LOG_EVENT, {"message": "Batch information not set.", "level": LogLevel.ERROR})
             return
         event_system.dispatch_event(EventType.TEST_STARTED, {})
         event_system.dispatch_event(EventType.PROGRESS_UPDATE, {"position": 0, "message": "Progress update: Position 0."})
-        serial_number = self.get_serial_number()
-        if serial_number:
-            event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Submitted serial number: {serial_number}.", "level": LogLevel.INFO})
-            event_system.dispatch_event(EventType.SERIAL_NUMBER_CONFIRMED, {"serial_number": serial_number})
-        else:
-            event_system.dispatch_event(EventType.LOG_EVENT, {"message": "Serial number not provided.", "level": LogLevel.ERROR})
-            return
-        
-        self.serial_number = serial_number
+        # One unit per station; every station starts once all serial numbers are in
+        assignments = []
+        for station in self.stations:
+            serial_number = self.get_serial_number()
+            if serial_number:
+                self._confirm_serial_number(station, serial_number)
+            else:
+                event_system.dispatch_event(EventType.LOG_EVENT, {"message": "Serial number not provided.", "level": LogLevel.ERROR})
+                return
+            assignments.append((station, StagedUnit(serial_number, self.batch_info)))
+
+        self._start(assignments)
+
+    def _start(self, assignments):
+        """Starts running (station, StagedUnit) assignments on a background thread."""
+        with self._lock:
+            self._active = True
+        self.serial_number = assignments[0][1].serial_number
         event_system.dispatch_event(EventType.LOG_EVENT, {"message": "Test started.", "level": LogLevel.DEBUG})
         self.is_running = True
         self.results = []
-        threading.Thread(target=self._execute_tests, daemon=True).start()
+        threading.Thread(target=self._execute_tests, args=(assignments,), daemon=True).start()
+
+    def stage_next_unit(self):
+        """
+        Scans and validates the next unit while the current one is under test, and checks the
+        station connections ahead of time. The unit starts the moment a station is free.
+        """
+        with self._lock:
+            staged_count = len(self.staged)
+        if staged_count >= self.max_staged:
+            event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"{staged_count} unit(s) already waiting to be tested.", "level": LogLevel.WARNING})
+            return
+        batch_info = self.batch_info
+        problem = self._validate_batch(batch_info)
+        if problem:
+            event_system.dispatch_event(EventType.LOG_EVENT, {"message": problem, "level": LogLevel.ERROR})
+            return
+
+        serial_number = self.get_serial_number()
+        if not serial_number:
+            event_system.dispatch_event(EventType.LOG_EVENT, {"message": "Serial number not provided.", "level": LogLevel.ERROR})
+            return
+        if serial_number in self._serials_in_progress():
+            event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Serial number {serial_number} is already under test or waiting.", "level": LogLevel.ERROR})
+            return
+
+        unit = StagedUnit(serial_number, batch_info, {
+            station: station.hardware_client.submit_connection_check() for station in self.stations
+        })
+        with self._lock:
+            staged = self._active and self.is_running
+            stopping = self._active and not self.is_running
+            if staged:
+                self.staged.append(unit)
+        if staged:
+            event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Serial number {serial_number} staged as the next unit.", "level": LogLevel.INFO})
+        elif stopping:
+            event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Test is stopping, serial number {serial_number} was not staged.", "level": LogLevel.ERROR})
+        else:
+            # The previous units finished while the serial number was being scanned
+            event_system.dispatch_event(EventType.TEST_STARTED, {"serial_number": serial_number, "station": self.stations[0].name})
+            self._confirm_serial_number(self.stations[0], serial_number)
+            self._start([(self.stations[0], unit)])
+
+    def _validate_batch(self, batch_info):
+        """Returns why the batch information cannot be used, or None."""
+        if not batch_info:
+            return "Batch information not set."
+        missing = [batch_field.name for batch_field in fields(batch_info) if not getattr(batch_info, batch_field.name)]
+        if missing:
+            return f"Batch information incomplete: {', '.join(missing)} not set."
+        return None
+
+    def _serials_in_progress(self):
+        with self._lock:
+            staged = {unit.serial_number for unit in self.staged}
+        return staged | {station.serial_number for station in self.stations if station.is_running}
+
+    def _confirm_serial_number(self, station, serial_number):
+        event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Submitted serial number: {serial_number}{self._station_suffix(station)}.", "level": LogLevel.INFO})
+        event_system.dispatch_event(EventType.SERIAL_NUMBER_CONFIRMED, {"serial_number": serial_number, "station": station.name})
+
+    def _station_suffix(self, station):
+        return f" on {station.name}" if len(self.stations) > 1 else ""
 
     def get_serial_number(self):
         # Instantiate and display the SerialNumberWindow
@@ -58,62 +161,91 @@ class TestRunner:
         serial_window.wait_window()  # Wait for the window to close
         return serial_window.serial_number
 
-    def _execute_tests(self):
+    def _execute_tests(self, assignments):
         try:
-            # Check connection with hardware client
-            if not self.hardware_client.check_connection():
-                event_system.dispatch_event(EventType.LOG_EVENT, {
-                    "message": "Hardware connection check failed. Test execution aborted.",
-                    "level": LogLevel.ERROR
-                })
-                event_system.dispatch_event(EventType.TEST_TERMINATED, {"message": "Test terminated.", "level": LogLevel.INFO})
-                return
-
-            event_system.dispatch_event(EventType.PROGRESS_UPDATE, {"position": 1, "message": "Progress update: Position 1."})
-            self.current_position = 1
-
-            sub_tests = [
-                SubTest(1, 500), SubTest(2, 500), SubTest(3, 500),
-                SubTest(4, 1600), SubTest(5, 1600), SubTest(6, 1600)
-            ]
-
-            for i, sub_test in enumerate(sub_tests, start=1):
-                if not self.is_running:
-                    break
-                if i > self.current_position:
-                    self.current_position = i
-                    event_system.dispatch_event(EventType.PROGRESS_UPDATE, {"position": i, "message": f"Progress update: Position {i}."})
-                
-                status = sub_test.run()
-                self.results.append(sub_test.get_result())
-                if (i != len(sub_tests)):
-                    time.sleep(TestConstants.PAUSE_TIME.value)
-                if status == "ERROR":
-                    break
-
-            if self.is_running:
-                self._upload_results()
-                event_system.dispatch_event(EventType.PROGRESS_UPDATE, {"position": 7, "message": "Progress update: Position 7."})
+            running = {self._submit(station, unit): station for station, unit in assignments}
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    station = running.pop(future)
+                    try:
+                        future.result()
+                    except Exception as e:
+                        event_system.dispatch_event(EventType.LOG_EVENT, {"message": str(e), "level": LogLevel.ERROR})
+
+                    # Hand the free station the next staged unit right away
+                    unit = self._next_staged_unit(finished=not running)
+                    if unit:
+                        event_system.dispatch_event(EventType.TEST_STARTED, {"serial_number": unit.serial_number, "station": station.name})
+                        self._confirm_serial_number(station, unit.serial_number)
+                        running[self._submit(station, unit)] = station
 
             event_system.dispatch_event(EventType.TEST_TERMINATED, {"message": "Test terminated.", "level": LogLevel.INFO})
         except Exception as e:
             event_system.dispatch_event(EventType.LOG_EVENT, {"message": str(e), "level": LogLevel.ERROR})
         finally:
+            with self._lock:
+                self._active = False
             self.is_running = False
 
-    def _upload_results(self):
-        event_system.dispatch_event(EventType.LOG_EVENT, {"message": "Uploading results to the database.", "level": LogLevel.INFO})
-        # Perform upload
-        # You can access self.results and self.batch_info here to upload the data
+    def _submit(self, station, unit):
+        return self.station_pool.submit(station, unit.serial_number, self._on_unit_complete,
+                                        batch_info=unit.batch_info, preflight=unit.preflight.get(station))
+
+    def _next_staged_unit(self, finished):
+        """Returns the oldest staged unit. With nothing staged and no unit left running, ends the run."""
+        with self._lock:
+            if self.staged and self.is_running:
+                return self.staged.popleft()
+            if finished:
+                self._active = False
+            return None
+
+    def _on_unit_complete(self, station, completed):
+        """Called on the station's worker thread when its unit is done, before the station takes the next one."""
+        # Stopped and aborted units are recorded too, with their completion status
+        self._upload_results(station, completed)
+        with self._results_lock:
+            # Waveforms are in the store now; keeping them for every unit of a long run would grow without bound
+            self.results = [{key: value for key, value in result.items() if key != "waveform"} for result in station.results]
+        station.results = []
+        if not completed and self.is_running:
+            event_system.dispatch_event(EventType.LOG_EVENT, {
+                "message": f"{station.name}: Unit {station.serial_number} was aborted before completing the test sequence.",
+                "level": LogLevel.ERROR,
+                "station": station.name,
+                "serial_number": station.serial_number
+            })
+        elif completed and self.is_running:
+            event_system.dispatch_event(EventType.PROGRESS_UPDATE, {
+                "position": 7,
+                "station": station.name,
+                "serial_number": station.serial_number,
+                "message": "Progress update: Position 7."
+            })
+
+    def _upload_results(self, station, completed=True):
+        if self.results_store is None:
+            event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"No results database configured, results of {station.serial_number} are not stored.", "level": LogLevel.WARNING})
+            return
+        event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Uploading results of {station.serial_number} to the database.", "level": LogLevel.INFO})
+        # Queued for the store's writer thread, so the station is free for the next unit right away
+        self.results_store.record_unit(station.serial_number, station.batch_info, station.results, station=station.name,
+                                       plan=station.plan.name, started_at=station.started_at, completed=completed)
 
     def stop_tests(self):
         if self.is_running:
             self.is_running = False
+            self.station_pool.stop_all()
+            with self._lock:
+                discarded = [unit.serial_number for unit in self.staged]
+                self.staged.clear()
+            if discarded:
+                event_system.dispatch_event(EventType.LOG_EVENT, {"message": f"Discarded staged serial number(s) {', '.join(discarded)}.", "level": LogLevel.WARNING})
             event_system.dispatch_event(EventType.LOG_EVENT, {"message": "Test execution stopped by user.", "level": LogLevel.WARNING})
 
     def get_results(self):
         return self.results
 
     def close(self):
-        # Implement any necessary cleanup for TestRunner
-        pass
+        self.station_pool.close()
@@ -0,0 +1,71 @@
+"""
+Current waveform of a sub-test, kept with its result for breakdown diagnosis.
+
+The summary statistics are computed on every acquired sample; the stored waveform is reduced to at
+most MAX_POINTS samples by keeping the minimum and maximum of each interval, so short spikes survive.
+"""
+
+import base64
+from dataclasses import dataclass
+
+import numpy as np
+
+MAX_POINTS = 1000
+
+def summarize(times, currents):
+    """Returns the peak, mean, RMS (mA) and least-squares slope (mA/s) of the samples."""
+    if len(currents) == 0:
+        return {"peak": None, "mean": None, "rms": None, "slope": None}
+    currents = np.asarray(currents, dtype=np.float64)
+    times = np.asarray(times, dtype=np.float64)
+    centered_times = times - times.mean()
+    spread = float(np.dot(centered_times, centered_times))
+    mean = float(currents.mean())
+    return {
+        "peak": float(currents.max()),
+        "mean": mean,
+        "rms": float(np.sqrt(np.dot(currents, currents) / len(currents))),
+        "slope": float(np.dot(centered_times, currents - mean) / spread) if spread else 0.0,
+    }
+
+def decimate(times, currents, max_points=MAX_POINTS):
+    """Keeps the minimum and maximum sample of each of max_points / 2 intervals, in time order."""
+    count = len(currents)
+    if count <= max_points:
+        return times, currents
+    interval = -(-count // (max_points // 2))
+    padded = np.concatenate((currents, np.repeat(currents[-1:], -count % interval))).reshape(-1, interval)
+    offsets = np.arange(len(padded)) * interval
+    indices = np.unique(np.concatenate((offsets + padded.argmin(axis=1), offsets + padded.argmax(axis=1))))
+    indices = indices[indices < count]
+    return times[indices], currents[indices]
+
+@dataclass(frozen=True, eq=False)
+class Waveform:
+    times: np.ndarray  # float32 seconds since the voltage was applied
+    currents: np.ndarray  # float32 mA
+    sample_rate: float  # Acquisition rate in samples per second
+    sample_count: int  # Samples acquired, before decimation
+
+    @classmethod
+    def from_samples(cls, times, currents, sample_rate, max_points=MAX_POINTS):
+        reduced_times, reduced_currents = decimate(times, currents, max_points)
+        return cls(np.asarray(reduced_times, dtype=np.float32), np.asarray(reduced_currents, dtype=np.float32),
+                   sample_rate, len(currents))
+
+    def to_dict(self):
+        """JSON-friendly form with the arrays as base64 of little-endian float32."""
+        return {
+            "sample_rate": self.sample_rate,
+            "sample_count": self.sample_count,
+            "times": base64.b64encode(self.times.astype('<f4').tobytes()).decode('ascii'),
+            "currents": base64.b64encode(self.currents.astype('<f4').tobytes()).decode('ascii'),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        decode = lambda key: np.frombuffer(base64.b64decode(data[key]), dtype='<f4').astype(np.float32)
+        return cls(decode("times"), decode("currents"), data["sample_rate"], data["sample_count"])
+
+    def __len__(self):
+        return len(self.currents)
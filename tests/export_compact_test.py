@@ -0,0 +1,70 @@
+"""
+Test of the Parquet export: two exports into the same partition, compaction of their part files, and the
+removal of part files left behind by an interrupted compaction. Needs pyarrow.
+"""
+import sys
+import os
+import glob
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pyarrow.parquet as pq
+
+from storage import ResultsStore, export_results, compact
+
+SUB_TESTS = 6
+
+def record_units(store, serial_numbers):
+    # Stands in for test_logic's BatchInformation, whose package pulls in the UI
+    batch_info = SimpleNamespace(work_order_number="WO1", lot_hardener_number="H1", lot_molding_compound_number="M1")
+    for serial_number in serial_numbers:
+        results = [{"test_number": n, "voltage": 500, "current": 0.1 * n, "status": "SUCCESS"} for n in range(1, SUB_TESTS + 1)]
+        store.record_unit(serial_number, batch_info, results, station="Station 1", plan="Test", finished_at=time.time())
+    store.flush(wait=True)
+
+def part_files(directory):
+    return sorted(glob.glob(os.path.join(directory, "date=*", "work_order=*", "part-*.parquet")))
+
+def row_count(directory):
+    return sum(pq.read_metadata(path).num_rows for path in part_files(directory))
+
+def test_compact():
+    directory = tempfile.mkdtemp()
+    try:
+        out = os.path.join(directory, "parquet")
+        store = ResultsStore(os.path.join(directory, "results.sqlite3"))
+        record_units(store, ["A1", "A2", "A3"])
+        assert export_results(store.path, out) == 3 * SUB_TESTS
+        record_units(store, ["B1", "B2"])
+        assert export_results(store.path, out) == 2 * SUB_TESTS
+        assert export_results(store.path, out) == 0, "units must be exported only once"
+        store.close()
+
+        first, second = part_files(out)
+        assert os.path.basename(first) == "part-0000000001-0000000003.parquet", first
+        assert os.path.basename(second) == "part-0000000004-0000000005.parquet", second
+        leftover = os.path.join(directory, "leftover.parquet")
+        shutil.copy(first, leftover)
+
+        # Both exports went to the same partition, so they are merged into one file covering all units
+        assert compact(out) == 1
+        (merged,) = part_files(out)
+        assert os.path.basename(merged) == "part-0000000001-0000000005.parquet", merged
+        assert row_count(out) == 5 * SUB_TESTS
+        assert sorted(set(pq.read_table(merged).column("serial_number").to_pylist())) == ["A1", "A2", "A3", "B1", "B2"]
+
+        # A compaction interrupted before removing its inputs leaves files the merged one covers
+        shutil.copy(leftover, first)
+        assert compact(out) == 0, "a single file left after removing the covered one needs no merge"
+        assert part_files(out) == [merged]
+        assert row_count(out) == 5 * SUB_TESTS
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    test_compact()
+    print("Export and compaction OK.")
@@ -0,0 +1,71 @@
+"""
+Checks that the cost the test plan optimizer minimizes matches the hardware: runs plans through a
+Station against a recording hardware client and compares the relay switches and voltage changes it
+makes with TestPlan.cost, with and without hold_shared_relays and for both step orders.
+"""
+import sys
+import os
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from test_logic.station import Station
+from test_logic.test_plan import compile_plan, DEFAULT_PLAN_PATH
+
+class RecordingHardwareClient:
+    """Keeps the relay port state of the requests a station makes and counts what they switch."""
+
+    def __init__(self):
+        self.mask = 0
+        self.voltage = None
+        self.relay_switches = 0
+        self.voltage_changes = 0
+
+    def _write(self, mask):
+        self.relay_switches += bin(self.mask ^ mask).count("1")
+        self.mask = mask
+
+    def stuck_relays(self):
+        return []
+
+    def check_connection(self, event_data=None):
+        return True
+
+    def set_test_conditions(self, event_data):
+        if event_data["voltage"] != self.voltage:
+            self.voltage_changes += 1
+            self.voltage = event_data["voltage"]
+        self.set_relays(event_data)
+
+    def set_relays(self, event_data):
+        mask = sum(1 << relay for relay in event_data["relays"])
+        self._write(self.mask | mask if event_data["state"] else self.mask & ~mask)
+
+    def start_current_stream(self, **kwargs):
+        return None  # Measures by polling
+
+    def read_current(self):
+        return {"status": "success", "current": 0.1}
+
+def run_plan(spec):
+    plan = compile_plan(spec)
+    client = RecordingHardwareClient()
+    assert Station("Station 1", client, plan).run_unit("RELAYS1"), "the unit did not complete"
+    assert client.mask == 0, f"relays {client.mask:#010b} left closed"
+    return plan, (client.voltage_changes, client.relay_switches)
+
+def test_relay_switching():
+    with open(DEFAULT_PLAN_PATH, 'r', encoding='utf-8') as plan_file:
+        spec = json.load(plan_file)
+    # Short dwell and no pauses, only the switching matters here
+    spec.update(dwell=0.02, min_dwell=0.01, sample_interval=0.005, pause=0.0)
+    for hold_shared_relays in (False, True):
+        for order in ("fixed", "optimized"):
+            plan, measured = run_plan({**spec, "hold_shared_relays": hold_shared_relays, "order": order})
+            print(f"hold_shared_relays={hold_shared_relays}, {order}: order {[step.test_number for step in plan]}, "
+                  f"cost {plan.cost}, measured {measured}")
+            assert plan.cost == measured, f"plan cost {plan.cost} differs from the {measured} made"
+
+if __name__ == "__main__":
+    test_relay_switching()
+    print("Relay switching OK.")
@@ -0,0 +1,67 @@
+"""
+Test of the ResultsStore writer: a unit that cannot be stored must not take the other units of its
+batch with it, and a database locked for a moment by another connection must not lose any unit.
+"""
+import sys
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from storage import ResultsStore
+
+def results(status="SUCCESS", waveform=None):
+    return [{"test_number": n, "voltage": 500, "current": 0.1, "status": status, "waveform": waveform} for n in range(1, 4)]
+
+def stored_serials(store):
+    return sorted(unit["serial_number"] for unit in store.units())
+
+def test_malformed_unit():
+    directory = tempfile.mkdtemp()
+    try:
+        # One long flush interval, so every unit lands in the same transaction
+        store = ResultsStore(os.path.join(directory, "results.sqlite3"), flush_interval=60, outbox=True)
+        store.record_unit("GOOD1", None, results())
+        store.record_unit("BAD1", None, results(waveform=object()))  # Has no samples to store
+        store.record_unit("GOOD2", None, results())
+        store.flush(wait=True)
+        assert stored_serials(store) == ["GOOD1", "GOOD2"], stored_serials(store)
+        for unit in store.units():
+            assert len(store.sub_tests(unit["id"])) == 3
+        (outbox,) = store.query("SELECT COUNT(*) FROM outbox")
+        assert outbox[0] == 2, "the outbox rows go with their units"
+
+        store.record_unit("GOOD3", None, results())
+        store.close()
+        assert stored_serials(store) == ["GOOD1", "GOOD2", "GOOD3"]
+    finally:
+        shutil.rmtree(directory)
+
+def test_locked_database():
+    directory = tempfile.mkdtemp()
+    try:
+        store = ResultsStore(os.path.join(directory, "results.sqlite3"), flush_interval=0.05)
+        other = sqlite3.connect(store.path, isolation_level=None, check_same_thread=False)
+        other.execute("BEGIN IMMEDIATE")  # Holds the write lock like a long export or a crashed tool
+        release = threading.Timer(1.0, lambda: other.execute("COMMIT"))
+        release.start()
+        start = time.monotonic()
+        for i in range(5):
+            store.record_unit(f"LOCKED{i}", None, results())
+        store.flush(wait=True)
+        release.join()
+        assert stored_serials(store) == [f"LOCKED{i}" for i in range(5)], stored_serials(store)
+        print(f"Units written {time.monotonic() - start:.2f} s after the lock was taken.")
+        other.close()
+        store.close()
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    test_malformed_unit()
+    test_locked_database()
+    print("Results store OK.")
@@ -0,0 +1,42 @@
+"""
+Load test of the HardwareClient against the local Raspberry Pi server simulator.
+Runs a number of simulated units through the six sub-test exchanges and prints latency figures.
+"""
+import sys
+import os
+import time
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from hardware import HardwareClient
+from hardware.pi_server_simulator import PiServerSimulator, SimulatorConfig
+from utils import test_number_to_relays
+
+UNITS = 50
+VOLTAGES = {1: 500, 2: 500, 3: 500, 4: 1600, 5: 1600, 6: 1600}
+
+simulator = PiServerSimulator(port=0, config=SimulatorConfig(latency=0.005, jitter=0.003, split_probability=0.2, seed=1))
+port = simulator.start_in_thread()
+client = HardwareClient('127.0.0.1', port)
+
+exchange_times = []
+start = time.perf_counter()
+for unit in range(UNITS):
+    client.check_connection()
+    for test_number, relays in test_number_to_relays.items():
+        t0 = time.perf_counter()
+        client.set_test_conditions({"voltage": VOLTAGES[test_number], "relays": relays, "state": True})
+        current = client.read_current()
+        client.set_relays({"relays": relays, "state": False})
+        exchange_times.append(time.perf_counter() - t0)
+elapsed = time.perf_counter() - start
+
+exchange_times.sort()
+print(f"{UNITS} units in {elapsed:.2f} s ({UNITS / elapsed:.1f} units/s)")
+print(f"Sub-test exchange: median {statistics.median(exchange_times) * 1000:.2f} ms, "
+      f"p99 {exchange_times[int(len(exchange_times) * 0.99)] * 1000:.2f} ms")
+print(f"Commands handled: {simulator.command_counts}")
+
+client.close()
+simulator.stop()
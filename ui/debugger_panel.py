@@ -1,8 +1,13 @@
 import customtkinter as ctk
-from utils import event_system, EventType, LogLevel, MAIN_COLOR
+from utils import event_system, EventType, LogLevel, MAIN_COLOR, DeliveryMode
 import time
+import heapq
+import itertools
+from collections import deque
 from enum import Enum, auto
 
+HEADER_LINES = 2  # "Debugger Panel" and a blank line above the first log entry
+
 
 class DebuggerPanel(ctk.CTkFrame):
     _instance = None
@@ -13,7 +18,7 @@ class DebuggerPanel(ctk.CTkFrame):
             cls._instance = super(DebuggerPanel, cls).__new__(cls)
         return cls._instance
 
-    def __init__(self, parent, max_logs=500):
+    def __init__(self, parent, max_logs=500, refresh_ms=16, history_per_level=5000):
         if self._initialized:
             return
         self._initialized = True
@@ -53,6 +58,14 @@ class DebuggerPanel(ctk.CTkFrame):
             command=self.show_debug_level_selection
         )
         self.debug_level_button.pack(side="left", padx=5)
+
+        # Opens the full history, including the on-disk log, in a virtualized viewer
+        self.history_button = ctk.CTkButton(
+            self.button_frame,
+            text="History",
+            command=self.show_log_history
+        )
+        self.history_button.pack(side="left", padx=5)
         
         # Move clear button to button frame
         self.clear_button = ctk.CTkButton(
@@ -62,26 +75,63 @@ class DebuggerPanel(ctk.CTkFrame):
         )
         self.clear_button.pack(side="right", padx=5)
         
-        # Initialize log storage
-        self.logs = []
+        # Every level is retained, so changing the filter can show what was already logged.
+        # Entries are (sequence, timestamp, message); they are only formatted when displayed.
+        self.history = {level: deque(maxlen=history_per_level) for level in LogLevel}
+        self.logged_count = 0  # Also the sequence number of the next entry
         self.max_logs = max_logs
+        self.refresh_ms = refresh_ms
+        self._pending = []
+        self._displayed = deque()  # Line count of every entry currently in the textbox
+        self._refresh_id = None
         self.show_debug = False  # Initialize the show_debug flag
         self.active_debug_levels = {LogLevel.INFO, LogLevel.WARNING, LogLevel.ERROR}
         
         # Register event listeners using EventType Enum
-        event_system.register_listener(EventType.LOG_EVENT, self.handle_log_event)
-        event_system.register_listener(EventType.DEBUG_LEVELS_CHANGED, self.handle_debug_levels_changed)
+        event_system.register_listener(EventType.LOG_EVENT, self.handle_log_event, DeliveryMode.UI)
+        event_system.register_listener(EventType.DEBUG_LEVELS_CHANGED, self.handle_debug_levels_changed, DeliveryMode.UI)
 
     def show_debug_level_selection(self):
         from ui.widgets.debug_level_window import DebugLevelWindow
         DebugLevelWindow(self, self.active_debug_levels)
     
+    def show_log_history(self):
+        from ui.widgets.log_viewer import LogHistoryWindow
+        LogHistoryWindow(self, panel=self)
+
     def handle_debug_levels_changed(self, data):
         self.active_debug_levels = data.get("levels", {LogLevel.INFO, LogLevel.WARNING, LogLevel.ERROR})
+        self.redraw()
+
+    def redraw(self):
+        """Replaces the textbox content with the newest retained entries of the active levels, in one pass."""
+        if self._refresh_id is not None:
+            self.after_cancel(self._refresh_id)
+            self._refresh_id = None
+        self._pending = []
+
+        entries = self.retained_entries(limit=self.max_logs)
+
+        self.textbox.configure(state="normal")
+        self.textbox.delete(f"{HEADER_LINES + 1}.0", "end")
+        self.textbox.insert("end", "".join(entries))
+        self._displayed = deque(entry.count("\n") for entry in entries)
+        self.textbox.see("end")
+        self.textbox.configure(state="disabled")
     
+    def retained_entries(self, levels=None, limit=None):
+        """Returns the newest `limit` retained entries of the given levels (default: active levels), formatted, oldest first."""
+        levels = self.active_debug_levels if levels is None else levels
+        # Each level's history is already ordered by sequence number, so a merge restores the original order
+        merged = heapq.merge(*(zip(self.history[level], itertools.repeat(level)) for level in levels))
+        return [self._format(level, timestamp, message) for (_, timestamp, message), level in deque(merged, maxlen=limit)]
+
     def clear_log(self):
         """Clears the debugger log."""
-        self.logs = []
+        for entries in self.history.values():
+            entries.clear()
+        self._pending.clear()
+        self._displayed.clear()
         self.textbox.configure(state="normal")
         self.textbox.delete("1.0", "end")
         self.textbox.insert("0.0", "Debugger Panel\n\n")
@@ -91,22 +141,39 @@ class DebuggerPanel(ctk.CTkFrame):
         if isinstance(level, str):
             level = LogLevel.from_string(level)
         
+        timestamp = time.time()
+        # The per-level deque drops its oldest entry once history_per_level is reached
+        self.history[level].append((self.logged_count, timestamp, message))
+        self.logged_count += 1
+
         if level not in self.active_debug_levels:
             return
-            
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[{timestamp}] [{level.name}] {message}\n"
-        
-        # Manage log size
-        if len(self.logs) >= self.max_logs:
-            self.logs.pop(0)  # Remove the oldest log entry
 
-        self.logs.append(log_entry)
+        self._pending.append(self._format(level, timestamp, message))
+        if self._refresh_id is None:
+            self._refresh_id = self.after(self.refresh_ms, self._flush_pending)
+
+    @staticmethod
+    def _format(level, timestamp, message):
+        return f"[{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))}] [{level.name}] {message}\n"
+
+    def _flush_pending(self):
+        """Appends all entries logged since the last frame and trims the oldest lines from the top."""
+        self._refresh_id = None
+        pending = self._pending[-self.max_logs:]
+        self._pending = []
+        if not pending:
+            return
 
-        # Update the textbox
         self.textbox.configure(state="normal")
-        self.textbox.delete("1.0", "end")  # Clear current content
-        self.textbox.insert("0.0", "Debugger Panel\n\n" + "".join(self.logs))
+        self.textbox.insert("end", "".join(pending))
+        self._displayed.extend(entry.count("\n") for entry in pending)
+
+        excess = len(self._displayed) - self.max_logs
+        if excess > 0:
+            trimmed_lines = sum(self._displayed.popleft() for _ in range(excess))
+            first = HEADER_LINES + 1
+            self.textbox.delete(f"{first}.0", f"{first + trimmed_lines}.0")
         self.textbox.see("end")  # Scroll to the bottom
         self.textbox.configure(state="disabled")
 
@@ -119,6 +186,9 @@ class DebuggerPanel(ctk.CTkFrame):
 
     def destroy(self):
         """Override destroy to unregister event listeners and theme callback."""
+        if self._refresh_id is not None:
+            self.after_cancel(self._refresh_id)
+            self._refresh_id = None
         event_system.unregister_listener(EventType.LOG_EVENT, self.handle_log_event)
         event_system.unregister_listener(EventType.DEBUG_LEVELS_CHANGED, self.handle_debug_levels_changed)
         # Removed unregistration for EventType.DEBUG_EVENT
@@ -15,6 +15,8 @@ class MainFrame(ctk.CTkFrame):
 
         self.test_runner = test_runner
         self.hardware_client = hardware_client
+        # With several stations, the status, progress and meters follow the first one
+        self.station = test_runner.stations[0].name
 
         bg_color = get_theme_background()
         super().__init__(parent, fg_color=bg_color)
@@ -38,14 +40,14 @@ class MainFrame(ctk.CTkFrame):
         self.debugger_panel.grid(row=1, column=0, padx=(10, 8), pady=(10, 10), sticky="nsew")
 
         # Replace the middle_frame creation with the new MiddleFrame class
-        self.middle_frame = MiddleFrame(self, self.test_runner, self.hardware_client)
+        self.middle_frame = MiddleFrame(self, self.test_runner, self.hardware_client, self.station)
         self.middle_frame.grid(row=0, column=1, rowspan=3, pady=(10, 10), sticky="nsew")
 
-        self.progress_frame = ProgressFrame(self)
+        self.progress_frame = ProgressFrame(self, self.station)
         self.progress_frame.grid(row=0, column=2, rowspan=2, padx=(8, 0), pady=(10, 10), sticky="nsew")
 
         # Add meters to main_frame
-        self.meters_frame = MetersFrame(self)
+        self.meters_frame = MetersFrame(self, self.station)
         self.meters_frame.grid(row=0, column=3, rowspan=3, sticky="nsew")
 
     def destroy(self):
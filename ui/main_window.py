@@ -6,6 +6,7 @@ import customtkinter as ctk
 
 from ui.widgets import MenuBar
 from ui.main_frame import MainFrame 
+from utils import event_system
 #Get the current directory
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
@@ -34,8 +35,12 @@ class MainWindow(ctk.CTk):
         # Create and attach the main frame
         self.main_frame = MainFrame(self, self.test_runner, self.hardware_client)
 
+        # Deliver events for UI listeners on this (the Tk main) thread
+        event_system.attach_ui(self)
+
     def destroy(self):
         """Override destroy to ensure proper cleanup."""
+        event_system.detach_ui()
         super().destroy()
 
 if __name__ == "__main__":
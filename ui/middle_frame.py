@@ -8,7 +8,7 @@ from ui.control_frame import ControlFrame
 from ui.left_frame import LeftFrame
 
 class MiddleFrame(StylizedFrame):
-    def __init__(self, parent, test_runner, hardware_client):
+    def __init__(self, parent, test_runner, hardware_client, station=None):
         super().__init__(parent)
         
         self.test_runner = test_runner
@@ -34,7 +34,7 @@ class MiddleFrame(StylizedFrame):
         self.control_frame.grid(row=1, column=2, rowspan=2, padx=(5, 10), pady=(10, 5), sticky="nsew")
         
         # Use the new TestStatusFrame
-        self.test_status_frame = TestStatusFrame(self)
+        self.test_status_frame = TestStatusFrame(self, station)
         self.test_status_frame.grid(row=3, column=0, columnspan=3, padx=10, pady=(5, 10), sticky="nsew")
     
     def update_theme(self, new_theme: str):
@@ -4,7 +4,7 @@ from ui.widgets.stylized_label import StylizedLabel
 from ui.widgets import InvertedCTkProgressBar  
 
 class ProgressFrame(StylizedFrame):
-    def __init__(self, parent):
+    def __init__(self, parent, station=None):
         super().__init__(parent)
         
         # Configure grid with padding
@@ -18,7 +18,8 @@ class ProgressFrame(StylizedFrame):
             corner_radius=15, 
             width=30, 
             border_width=2, 
-            orientation="vertical"
+            orientation="vertical",
+            station=station
         )
         self.progress_bar.grid(padx=10, pady=10, sticky="nsew")
         
@@ -1,15 +1,20 @@
 import customtkinter as ctk
 
-from utils import MAIN_COLOR, TestConstants, event_system, EventType       
+from utils import MAIN_COLOR, TestConstants, event_system, EventType, DeliveryMode, concerns_station
 from ui.widgets.bordered_label import BorderedLabel
 from ui.widgets.stylized_frame import StylizedFrame
 from ui.widgets.stylized_label import StylizedLabel
 from ui.widgets.headings import Heading2
 
 class TestStatusFrame(StylizedFrame):
-    def __init__(self, parent):
+    def __init__(self, parent, station=None):
+        """
+        Args:
+            station (str): Station whose unit is shown. Events of other stations are ignored; None shows every event.
+        """
         super().__init__(parent)
         
+        self.station = station
         self.highest_current = 0.0
 
         # Configure grid
@@ -75,12 +80,16 @@ class TestStatusFrame(StylizedFrame):
         )
         self.max_current_button.grid(row=2, column=3, sticky="e", padx=(5, 20), pady=(10, 0))
         
-        event_system.register_listener(EventType.TEST_STARTED, self.on_test_started)
-        event_system.register_listener(EventType.SUB_TEST_STARTED, self.on_sub_test_started)
-        event_system.register_listener(EventType.SUB_TEST_CONCLUDED, self.on_sub_test_concluded)
-        event_system.register_listener(EventType.SERIAL_NUMBER_CONFIRMED, self.on_serial_number_confirmed)
+        # Coalesced per station, so updates of other stations never replace the shown station's
+        by_station = lambda data: data.get("station")
+        event_system.register_listener(EventType.TEST_STARTED, self.on_test_started, DeliveryMode.UI)
+        event_system.register_listener(EventType.SUB_TEST_STARTED, self.on_sub_test_started, DeliveryMode.UI, coalesce=by_station)
+        event_system.register_listener(EventType.SUB_TEST_CONCLUDED, self.on_sub_test_concluded, DeliveryMode.UI)
+        event_system.register_listener(EventType.SERIAL_NUMBER_CONFIRMED, self.on_serial_number_confirmed, DeliveryMode.UI, coalesce=by_station)
 
     def on_test_started(self, event_data):
+        if not concerns_station(event_data, self.station):
+            return
         self.serial_button.configure(text="")
         self.voltage_button.configure(text="")
         self.highest_current = 0.0
@@ -88,15 +97,21 @@ class TestStatusFrame(StylizedFrame):
         self.max_current_button.configure(text=f"{TestConstants.CURRENT_CUT_OFF.value}mA")
     
     def on_sub_test_started(self, event_data):
+        if not concerns_station(event_data, self.station):
+            return
         voltage = event_data.get("voltage")
         self.voltage_button.configure(text=f"{voltage}V")
     
     def on_sub_test_concluded(self, event_data):
+        if not concerns_station(event_data, self.station):
+            return
         current = event_data.get("current")
-        if current > self.highest_current:
+        if current is not None and current > self.highest_current:
             self.highest_current = current
             self.highest_current_button.configure(text=f"{self.highest_current:.3f}mA")
     
     def on_serial_number_confirmed(self, event_data):
+        if not concerns_station(event_data, self.station):
+            return
         serial_number = event_data.get("serial_number")
         self.serial_button.configure(text=serial_number)
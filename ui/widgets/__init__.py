@@ -11,3 +11,4 @@ from .stylized_label import StylizedLabel
 from .serial_number_window import SerialNumberWindow
 from .relay_selection_window import RelaySelectionWindow
 from .debug_level_window import DebugLevelWindow
+from .log_viewer import LogViewer, LogHistoryWindow, MemoryLogStore, FileLogStore
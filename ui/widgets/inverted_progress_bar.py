@@ -3,11 +3,12 @@ import time
 import random
 
 import customtkinter as ctk
-from utils.event_system import event_system, EventType
+from utils.event_system import event_system, EventType, DeliveryMode, concerns_station
 
 class InvertedCTkProgressBar(ctk.CTkProgressBar):
-    def __init__(self, master=None, **kwargs):
+    def __init__(self, master=None, station=None, **kwargs):
         super().__init__(master, **kwargs)
+        self.station = station  # Station whose progress is shown, None for every station
         self._animation_delay = 16  # Delay in milliseconds (~60 FPS)
         self._is_animating = False
         self._animation_after_id = None
@@ -19,7 +20,8 @@ class InvertedCTkProgressBar(ctk.CTkProgressBar):
         self.positions = [0, 0.036, 0.218, 0.402, 0.582, 0.762, 0.947, 1]
 
         # Add event listener
-        event_system.register_listener(EventType.PROGRESS_UPDATE, self.on_progress_update)
+        event_system.register_listener(EventType.PROGRESS_UPDATE, self.on_progress_update, DeliveryMode.UI,
+                                       coalesce=lambda data: data.get("station"))
 
     def _draw(self, no_color_updates=False):
         # Call the parent class's _draw method to set up the canvas
@@ -131,6 +133,8 @@ class InvertedCTkProgressBar(ctk.CTkProgressBar):
         self.after(delay + 100, self.animation_loop)  # Schedule the next loop
 
     def on_progress_update(self, event_data):
+        if not concerns_station(event_data, self.station):
+            return
         position = event_data.get("position", 0)
         if 0 <= position <= 7:
             self.after(0, self.go_to, self.positions[position])
@@ -0,0 +1,343 @@
+"""
+Virtualized log viewer.
+
+The viewer only ever holds the lines that fit in its window; everything else stays in a backing store.
+FileLogStore indexes the start offset of every line of a log file once, so scrolling anywhere in a
+shift's log is a slice of the file, and search runs over the raw bytes instead of a Tk text widget.
+"""
+
+import os
+import glob
+import gzip
+import bisect
+import itertools
+from array import array
+
+import customtkinter as ctk
+
+from utils import Logger, MAIN_COLOR
+from utils.log_rotation import zstandard
+
+class MemoryLogStore:
+    """
+    Lines held in memory, re-read from `source` (a callable returning a list of lines) on refresh.
+    If given, `version` is a callable whose value changes whenever the source does.
+    """
+
+    def __init__(self, source, version=None):
+        self.source = source
+        self.version = version
+        self._version = version() if version else None
+        self._lines = list(source())
+
+    def __len__(self):
+        return len(self._lines)
+
+    def refresh(self):
+        """Re-reads the source. Returns True if the content changed."""
+        if self.version:
+            version = self.version()
+            if version == self._version:
+                return False
+            self._version = version
+        lines = list(self.source())
+        changed = lines != self._lines
+        self._lines = lines
+        return changed
+
+    def lines(self, start, count):
+        return [line.rstrip("\n") for line in self._lines[start:start + count]]
+
+    def search(self, text, start, backwards=False):
+        """Returns the index of the next line containing text, starting at line `start`, or None."""
+        indices = range(min(start, len(self._lines) - 1), -1, -1) if backwards else range(start, len(self._lines))
+        for index in indices:
+            if text in self._lines[index]:
+                return index
+        return None
+
+class FileLogStore:
+    """
+    Lines of a log file, plain or compressed (.gz, .zst), indexed by byte offset.
+
+    Only complete lines are indexed; for a plain file that is still being written, refresh()
+    reads and indexes whatever was appended since the last call.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.compressed = path.endswith(('.gz', '.zst'))
+        self._data = bytearray()
+        self._offsets = array('Q', [0])  # Start offset of every line, plus the end of the last complete line
+        self.refresh()
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def refresh(self):
+        """Reads and indexes new lines. Returns True if any were found."""
+        if self.compressed:
+            if self._data:
+                return False  # Archives never change
+            self._data = bytearray(self._read_compressed())
+        else:
+            try:
+                with open(self.path, 'rb') as log_file:
+                    log_file.seek(len(self._data))
+                    self._data += log_file.read()
+            except FileNotFoundError:
+                return False  # The segment was rotated and archived
+
+        start = self._offsets[-1]
+        end = self._data.rfind(b'\n', start) + 1
+        if end <= start:
+            return False
+        # Line lengths from a C-level split, turned into offsets by a running sum
+        lengths = (len(line) + 1 for line in self._data[start:end - 1].split(b'\n'))
+        self._offsets.extend(itertools.islice(itertools.accumulate(lengths, initial=start), 1, None))
+        return True
+
+    def _read_compressed(self):
+        if self.path.endswith('.zst'):
+            if zstandard is None:
+                raise OSError("zstandard is not installed, cannot read .zst log archives.")
+            with open(self.path, 'rb') as archive:
+                return zstandard.ZstdDecompressor().stream_reader(archive).read()
+        with gzip.open(self.path, 'rb') as archive:
+            return archive.read()
+
+    def lines(self, start, count):
+        stop = min(start + count, len(self))
+        return [
+            self._data[self._offsets[i]:self._offsets[i + 1]].decode('utf-8', errors='replace').rstrip("\r\n")
+            for i in range(start, stop)
+        ]
+
+    def search(self, text, start, backwards=False):
+        """Returns the index of the next line containing text, starting at line `start`, or None."""
+        if not len(self):
+            return None
+        needle = text.encode('utf-8')
+        start = min(start, len(self) - 1)
+        if backwards:
+            position = self._data.rfind(needle, 0, self._offsets[start + 1])
+        else:
+            position = self._data.find(needle, self._offsets[start], self._offsets[-1])
+        if position == -1:
+            return None
+        return bisect.bisect_right(self._offsets, position) - 1
+
+class LogViewer(ctk.CTkFrame):
+    """Shows the lines of a store that fit in the widget and re-renders them as the view scrolls."""
+
+    def __init__(self, parent, store, **kwargs):
+        super().__init__(parent, fg_color="transparent", **kwargs)
+        self.store = store
+        self.top = 0  # Index of the first visible line
+        self.rows = 1  # Number of lines that fit in the textbox
+        self.match = None  # (line index, search text) of the highlighted search result
+
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.font = ctk.CTkFont(family="Courier New", size=12)
+        self.textbox = ctk.CTkTextbox(
+            self,
+            font=self.font,
+            wrap="none",
+            activate_scrollbars=False,
+            corner_radius=15,
+            border_width=2,
+            border_color=MAIN_COLOR
+        )
+        self.textbox.grid(row=0, column=0, sticky="nsew")
+        self.textbox.tag_config("match", background=MAIN_COLOR)
+        self.textbox.configure(state="disabled")
+
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, padx=(4, 0), sticky="ns")
+
+        self.textbox.bind("<Configure>", self._on_resize)
+        self.textbox.bind("<MouseWheel>", self._on_mousewheel)
+        self.textbox.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.textbox.bind("<Button-5>", lambda event: self.scroll(3))
+
+    @property
+    def at_end(self):
+        return self.top + self.rows >= len(self.store)
+
+    def set_store(self, store):
+        self.store = store
+        self.match = None
+        self.scroll_to_end()
+
+    def render(self):
+        total = len(self.store)
+        self.top = max(0, min(self.top, total - self.rows))
+        lines = self.store.lines(self.top, self.rows)
+
+        self.textbox.configure(state="normal")
+        self.textbox.delete("1.0", "end")
+        self.textbox.insert("1.0", "\n".join(lines))
+        if self.match and self.top <= self.match[0] < self.top + len(lines):
+            line_index, text = self.match
+            row = line_index - self.top + 1
+            column = lines[row - 1].find(text)
+            if column >= 0:
+                self.textbox.tag_add("match", f"{row}.{column}", f"{row}.{column + len(text)}")
+        self.textbox.configure(state="disabled")
+
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + len(lines)) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def scroll(self, lines):
+        self.top += lines
+        self.render()
+
+    def scroll_to_end(self):
+        self.top = len(self.store)
+        self.render()
+
+    def find(self, text, backwards=False):
+        """Moves to the next (or previous) line containing text, wrapping around. Returns False if there is none."""
+        if not text:
+            return False
+        if self.match and self.match[1] == text:
+            start = self.match[0] - 1 if backwards else self.match[0] + 1
+        else:
+            start = self.top + self.rows - 1 if backwards else self.top
+        line_index = self.store.search(text, start, backwards) if 0 <= start < len(self.store) else None
+        if line_index is None:
+            # Wrap around to the other end of the log
+            line_index = self.store.search(text, len(self.store) - 1 if backwards else 0, backwards)
+        if line_index is None:
+            return False
+        self.match = (line_index, text)
+        self.top = line_index - self.rows // 2
+        self.render()
+        return True
+
+    def _on_resize(self, event):
+        rows = max(1, event.height // self.font.metrics("linespace"))
+        if rows != self.rows:
+            self.rows = rows
+            self.render()
+
+    def _on_mousewheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.top = int(float(amount) * len(self.store))
+            self.render()
+        elif action == "scroll":
+            self.scroll(int(amount) * (self.rows if unit == "pages" else 1))
+
+class LogHistoryWindow(ctk.CTkToplevel):
+    """Browses the debugger panel history or any log file, following sources that are still growing."""
+
+    PANEL_SOURCE = "Debugger Panel"
+
+    def __init__(self, parent, panel=None, refresh_ms=1000):
+        super().__init__(parent)
+
+        self.title("Log History")
+        self.geometry("1000x650")
+        self.panel = panel
+        self.refresh_ms = refresh_ms
+        self._refresh_id = None
+        self.logger = Logger()  # The application's logger, created at startup
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        # Source selection and search bar
+        self.toolbar = ctk.CTkFrame(self, fg_color="transparent")
+        self.toolbar.grid(row=0, column=0, padx=10, pady=(10, 5), sticky="ew")
+        self.toolbar.grid_columnconfigure(1, weight=1)
+
+        self.sources = self._list_sources()
+        self.source_menu = ctk.CTkOptionMenu(self.toolbar, values=list(self.sources), command=self.open_source, width=260)
+        self.source_menu.grid(row=0, column=0, padx=(0, 10))
+
+        self.search_entry = ctk.CTkEntry(self.toolbar, placeholder_text="Search")
+        self.search_entry.grid(row=0, column=1, sticky="ew")
+        self.search_entry.bind("<Return>", lambda event: self.find())
+
+        self.previous_button = ctk.CTkButton(self.toolbar, text="Previous", width=90, command=lambda: self.find(backwards=True))
+        self.previous_button.grid(row=0, column=2, padx=(10, 5))
+        self.next_button = ctk.CTkButton(self.toolbar, text="Next", width=90, command=self.find)
+        self.next_button.grid(row=0, column=3, padx=(5, 0))
+
+        self.status_label = ctk.CTkLabel(self, text="", anchor="w")
+        self.status_label.grid(row=2, column=0, padx=15, pady=(0, 5), sticky="ew")
+
+        initial = self.PANEL_SOURCE if self.PANEL_SOURCE in self.sources else os.path.basename(self.logger.log_file_path)
+        self.viewer = LogViewer(self, self._create_store(initial))
+        self.viewer.grid(row=1, column=0, padx=10, pady=5, sticky="nsew")
+        self.viewer.scroll_to_end()
+        self.source_menu.set(initial)
+        self.current_source = initial
+        self._update_status()
+        self._refresh_id = self.after(self.refresh_ms, self._refresh)
+
+    def _list_sources(self):
+        """Returns {menu label: path or None for the panel}, newest log files first."""
+        sources = {self.PANEL_SOURCE: None} if self.panel else {}
+        paths = glob.glob(os.path.join(self.logger.log_directory, "HV_tester_log_*.txt*"))
+        for path in sorted(paths, key=os.path.getmtime, reverse=True):
+            if not path.endswith('.tmp'):
+                sources[os.path.basename(path)] = path
+        return sources
+
+    def _create_store(self, source):
+        if source == self.PANEL_SOURCE:
+            return MemoryLogStore(self.panel.retained_entries, lambda: self.panel.logged_count)
+        return FileLogStore(self.sources[source])
+
+    def _is_live(self):
+        """Only the panel and the active log segment keep growing."""
+        path = self.sources.get(self.current_source)
+        return path is None or os.path.abspath(path) == os.path.abspath(self.logger.log_file_path)
+
+    def open_source(self, source):
+        try:
+            store = self._create_store(source)
+        except OSError as e:
+            self.status_label.configure(text=f"Cannot open {source}: {e}")
+            return
+        self.current_source = source
+        self.viewer.set_store(store)
+        self._update_status()
+
+    def find(self, backwards=False):
+        text = self.search_entry.get()
+        if text and not self.viewer.find(text, backwards):
+            self.status_label.configure(text=f"'{text}' not found")
+        else:
+            self._update_status()
+
+    def _update_status(self):
+        match = f", match at line {self.viewer.match[0] + 1}" if self.viewer.match else ""
+        self.status_label.configure(text=f"{len(self.viewer.store):,} lines{match}")
+
+    def _refresh(self):
+        if self._is_live():
+            if self.current_source != self.PANEL_SOURCE:
+                self.logger.writer.flush()  # Picked up on the next refresh
+            following = self.viewer.at_end
+            if self.viewer.store.refresh():
+                if following:
+                    self.viewer.scroll_to_end()
+                else:
+                    self.viewer.render()
+                self._update_status()
+        self._refresh_id = self.after(self.refresh_ms, self._refresh)
+
+    def destroy(self):
+        if self._refresh_id is not None:
+            self.after_cancel(self._refresh_id)
+            self._refresh_id = None
+        super().destroy()
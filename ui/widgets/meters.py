@@ -5,9 +5,9 @@ import threading
 import customtkinter as ctk
 from tkdial import Meter
 
-from utils import get_theme_background, MAIN_COLOR, Colors, TestConstants, LogLevel
+from utils import get_theme_background, MAIN_COLOR, Colors, TestConstants, LogLevel, MAX_TEST_NUMBER
 from ui.widgets.bordered_label import BorderedLabel
-from utils.event_system import event_system, EventType
+from utils.event_system import event_system, EventType, DeliveryMode, concerns_station
 
 class MeterWidget(ctk.CTkFrame):
     """
@@ -213,8 +213,13 @@ class MetersFrame(ctk.CTkFrame):
     """
     A frame that contains a 6x1 stack of MeterWidgets with labels.
     """
-    def __init__(self, parent, **kwargs):
+    def __init__(self, parent, station=None, **kwargs):
+        """
+        Args:
+            station (str): Station whose sub-tests the meters show. None shows every station's.
+        """
         super().__init__(parent, fg_color=("#f0f0f0", "#1f1f1f"), **kwargs)
+        self.station = station
         
         # Configure grid layout with 6 rows and 2 columns
         for row in range(6):
@@ -222,21 +227,25 @@ class MetersFrame(ctk.CTkFrame):
         self.grid_columnconfigure(0, weight=0)  # Column for labels
         self.grid_columnconfigure(1, weight=1)  # Column for meters
         
-        # Create and place six MeterWidgets
+        # Create and place one MeterWidget per test number; test plans cannot use others
         self.meter_widgets = []
-        for row in range(6):
+        for row in range(MAX_TEST_NUMBER):
             label_text = f"Test #{row + 1}"
             meter_widget = MeterWidget(self, label_text, test_number=row + 1)
             meter_widget.grid(row=row, column=0, columnspan=2, padx=(10,10), pady=0, sticky="nsew")
             self.meter_widgets.append(meter_widget)
 
-        event_system.register_listener(EventType.TEST_STARTED, self.on_test_started)
-        event_system.register_listener(EventType.SUB_TEST_STARTED, self.on_sub_test_started)
-        event_system.register_listener(EventType.SUB_TEST_CONCLUDED, self.on_sub_test_concluded)
+        # Tk widgets are updated on the main thread; only the latest result per meter and station is drawn
+        event_system.register_listener(EventType.TEST_STARTED, self.on_test_started, DeliveryMode.UI)
+        event_system.register_listener(EventType.SUB_TEST_STARTED, self.on_sub_test_started, DeliveryMode.UI)
+        event_system.register_listener(EventType.SUB_TEST_CONCLUDED, self.on_sub_test_concluded, DeliveryMode.UI,
+                                       coalesce=lambda data: (data.get("station"), data.get("test_number")))
     def on_test_started(self, event_data):
         """
         Handles test start to reset all meters and their border colors.
         """
+        if not concerns_station(event_data, self.station):
+            return
         for meter_widget in self.meter_widgets:
             meter_widget.go_to_zero()
             meter_widget.end_test("RESET")
@@ -245,6 +254,8 @@ class MetersFrame(ctk.CTkFrame):
         """
         Handles sub-test start to reset the specific meter.
         """
+        if not concerns_station(event_data, self.station):
+            return
         test_number = event_data.get("test_number")
         self.meter_widgets[test_number - 1].start_test()
     
@@ -252,6 +263,8 @@ class MetersFrame(ctk.CTkFrame):
         """
         Handles sub-test conclusion to end the specific meter.
         """
+        if not concerns_station(event_data, self.station):
+            return
         test_number = event_data.get("test_number")
         self.meter_widgets[test_number - 1].end_test(event_data.get("status"))
         self.meter_widgets[test_number - 1].go_to(event_data.get("current"))
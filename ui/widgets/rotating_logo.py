@@ -7,7 +7,7 @@ import numpy as np
 import customtkinter as ctk
 from PIL import Image, ImageTk  # Ensure Pillow is installed
 
-from utils import get_theme_background, MAIN_COLOR, event_system, EventType
+from utils import get_theme_background, MAIN_COLOR, event_system, EventType, DeliveryMode
 
 class RotatingLogo(ctk.CTkFrame):
     def __init__(self, master=None, size=200, padding_percentage=-0.02, display_text=False, text_above_logo=False):
@@ -99,8 +99,8 @@ class RotatingLogo(ctk.CTkFrame):
         self.after(0, self.update_animation)
 
         # Register event listeners
-        event_system.register_listener(EventType.SUB_TEST_STARTED, self.go_to_random_position)
-        event_system.register_listener(EventType.TEST_TERMINATED, self.return_to_default_position)
+        event_system.register_listener(EventType.SUB_TEST_STARTED, self.go_to_random_position, DeliveryMode.UI, coalesce=True)
+        event_system.register_listener(EventType.TEST_TERMINATED, self.return_to_default_position, DeliveryMode.UI)
 
     def destroy(self):
         """Override destroy to unregister the theme callback."""
@@ -1,5 +1,6 @@
 from .get_background_color import get_theme_background
-from .constants import Colors, MAIN_COLOR, TestStatus, TestConstants, test_number_to_relays
+from .constants import Colors, MAIN_COLOR, TestStatus, TestConstants, test_number_to_relays, MAX_TEST_NUMBER
 from .darken_hex_color import darken_hex_color
-from .event_system import event_system, EventType, LogLevel
-from .logger import logger
+from .event_system import event_system, EventType, LogLevel, DeliveryMode, concerns_station
+from .logger import Logger
+from .structured_log import StructuredLogSink, StructuredLogIndex
@@ -35,4 +35,6 @@ test_number_to_relays = {
     4: (0, 7),
     5: (1, 3),
     6: (0, 3)
-}
\ No newline at end of file
+}
+
+MAX_TEST_NUMBER = len(test_number_to_relays)  # The UI has one meter per test number, 1 to 6
@@ -1,4 +1,8 @@
 from enum import Enum, auto
+from collections import deque
+import itertools
+import logging
+import queue
 import threading
 
 class EventType(Enum):
@@ -9,6 +13,7 @@ class EventType(Enum):
     BATCH_INFO_CLEARED = "batch_info_cleared"
     SET_HIPOT_VOLTAGE = "set_hipot_voltage"
     SET_RELAYS = "set_relays"
+    SET_TEST_CONDITIONS = "set_test_conditions"
     DEFAULT_RELAY_SELECTED = "default_relay_selected"
     VERIFY_RASPBERRY_PI_CONNECTION = "verify_raspberry_pi_connection"
     TEST_STARTED = "test_started"
@@ -16,6 +21,7 @@ class EventType(Enum):
     SERIAL_NUMBER_CONFIRMED = "serial_number_confirmed"
     TEST_TERMINATED = "test_terminated"
     DEBUG_LEVELS_CHANGED = "debug_levels_changed"
+    SPC_ALARM = "spc_alarm"
     # Add any other necessary event types here
 
 class LogLevel(Enum):
@@ -31,14 +37,27 @@ class LogLevel(Enum):
         except KeyError:
             raise ValueError(f"Invalid log level: {level_str}. Must be one of {[level.name for level in cls]}")
 
+class DeliveryMode(Enum):
+    SYNC = auto()        # Called on the dispatching thread before dispatch_event returns (default)
+    BACKGROUND = auto()  # Queued and called on an event worker thread
+    UI = auto()          # Queued and called on the Tk main thread by the UI pump
+
 class EventSystem:
     _instance = None
+    background_workers = 2
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(EventSystem, cls).__new__(cls)
-            cls._instance.listeners = {}
+            cls._instance.listeners = {}  # event_type -> list of (callback, mode, worker_index, coalesce)
             cls._instance.lock = threading.Lock()
+            cls._instance._worker_queues = []
+            cls._instance._workers = []
+            cls._instance._worker_assignment = itertools.count()
+            cls._instance._ui_queue = deque()  # deque append/popleft are atomic, so producers need no lock
+            cls._instance._ui_root = None
+            cls._instance._ui_interval = 16
+            cls._instance._ui_thread_id = None
         return cls._instance
 
     def _validate_event_type(self, event_type: EventType) -> None:
@@ -47,19 +66,38 @@ class EventSystem:
             raise TypeError(f"Event type must be an instance of EventType enum, not {type(event_type)}. "
                           f"Use EventType.EVENT_NAME instead of string values.")
 
-    def register_listener(self, event_type: EventType, callback):
+    def register_listener(self, event_type: EventType, callback, mode: DeliveryMode = DeliveryMode.SYNC, coalesce=None):
+        """
+        Registers a callback for an event type. With BACKGROUND delivery, each listener is pinned to
+        one worker thread, so it still sees its events in dispatch order.
+
+        For UI delivery, `coalesce` lets the pump skip redundant updates: True keeps only the latest
+        queued event for the listener, and a callable data -> key keeps the latest event per key.
+        """
         self._validate_event_type(event_type)
+        if not isinstance(mode, DeliveryMode):
+            raise TypeError(f"Delivery mode must be an instance of DeliveryMode enum, not {type(mode)}.")
         with self._instance.lock:
+            worker_index = None
+            if mode is DeliveryMode.BACKGROUND:
+                self._start_workers()
+                worker_index = next(self._instance._worker_assignment) % len(self._instance._worker_queues)
             if event_type not in self._instance.listeners:
                 self._instance.listeners[event_type] = []
-            self._instance.listeners[event_type].append(callback)
+            self._instance.listeners[event_type].append((callback, mode, worker_index, coalesce))
 
     def unregister_listener(self, event_type: EventType, callback):
         self._validate_event_type(event_type)
         with self._instance.lock:
             if event_type in self._instance.listeners:
-                self._instance.listeners[event_type].remove(callback)
-                if not self._instance.listeners[event_type]:
+                listeners = self._instance.listeners[event_type]
+                for i, (registered_callback, _, _, _) in enumerate(listeners):
+                    if registered_callback == callback:
+                        del listeners[i]
+                        break
+                else:
+                    raise ValueError(f"Callback {callback} is not registered for {event_type}.")
+                if not listeners:
                     del self._instance.listeners[event_type]
 
     def dispatch_event(self, event_type: EventType, data=None):
@@ -74,8 +112,139 @@ class EventSystem:
         
         with self._instance.lock:
             listeners = self._instance.listeners.get(event_type, []).copy()
-        for callback in listeners:
+            # Queued under the lock: shutdown() turns these listeners synchronous and stops their workers
+            # under it too, so an event is either queued ahead of the stop or delivered synchronously
+            for callback, mode, worker_index, _ in listeners:
+                if mode is DeliveryMode.BACKGROUND:
+                    self._instance._worker_queues[worker_index].put((callback, data))
+        for callback, mode, worker_index, coalesce in listeners:
+            if mode is DeliveryMode.SYNC:
+                callback(data)
+            elif mode is DeliveryMode.UI:
+                self._deliver_ui(callback, data, coalesce)
+
+    # Background delivery
+
+    def _start_workers(self):
+        """Starts the event worker threads on first use. Caller holds the lock."""
+        if self._instance._workers:
+            return
+        for i in range(self.background_workers):
+            worker_queue = queue.Queue()
+            worker = threading.Thread(target=self._run_worker, args=(worker_queue,), name=f"EventWorker-{i}", daemon=True)
+            self._instance._worker_queues.append(worker_queue)
+            self._instance._workers.append(worker)
+            worker.start()
+
+    def _run_worker(self, worker_queue):
+        while True:
+            item = worker_queue.get()
+            try:
+                if item is None:
+                    return
+                callback, data = item
+                self._invoke(callback, data)
+            finally:
+                worker_queue.task_done()
+
+    def _invoke(self, callback, data):
+        """Calls a queued listener. Errors are logged rather than raised, since there is no caller to raise to."""
+        try:
+            callback(data)
+        except Exception:
+            logging.exception(f"Event listener {callback} failed.")
+
+    def flush(self):
+        """Blocks until every queued background event has been delivered."""
+        for worker_queue in list(self._instance._worker_queues):
+            worker_queue.join()
+
+    def shutdown(self):
+        """Delivers the queued background events and stops the worker threads."""
+        with self._instance.lock:
+            worker_queues, workers = self._instance._worker_queues, self._instance._workers
+            self._instance._worker_queues, self._instance._workers = [], []
+            # Listeners pinned to the stopped workers fall back to synchronous delivery
+            for event_type, listeners in self._instance.listeners.items():
+                self._instance.listeners[event_type] = [
+                    (callback, DeliveryMode.SYNC if mode is DeliveryMode.BACKGROUND else mode, None, coalesce)
+                    for callback, mode, _, coalesce in listeners
+                ]
+            for worker_queue in worker_queues:
+                worker_queue.put(None)  # After every event queued before the switch
+        for worker in workers:
+            worker.join(timeout=5)
+        self.detach_ui()
+
+    # Tk main-thread delivery
+
+    def attach_ui(self, root, interval_ms=16):
+        """
+        Starts pumping UI listeners from the Tk main loop. Must be called on the Tk main thread.
+        Until a root is attached, UI listeners are called synchronously.
+        """
+        self._instance._ui_root = root
+        self._instance._ui_interval = interval_ms
+        self._instance._ui_thread_id = threading.get_ident()
+        root.after(interval_ms, self._pump_ui)
+
+    def detach_ui(self):
+        self._instance._ui_root = None
+        self._instance._ui_thread_id = None
+
+    def _deliver_ui(self, callback, data, coalesce):
+        if self._instance._ui_root is None:
             callback(data)
+        elif threading.get_ident() == self._instance._ui_thread_id:
+            # Already on the Tk thread: deliver what is queued first to keep the order, then call inline
+            self.process_ui_events()
+            callback(data)
+        else:
+            if coalesce is None:
+                key = None
+            elif coalesce is True:
+                key = (callback,)
+            else:
+                key = (callback, coalesce(data))
+            self._instance._ui_queue.append((callback, data, key))
+
+    def process_ui_events(self):
+        """
+        Delivers every queued UI event in one batch on the Tk main thread. For coalescing listeners,
+        only the latest event per key in the batch is delivered.
+        """
+        ui_queue = self._instance._ui_queue
+        batch = []
+        while True:
+            try:
+                batch.append(ui_queue.popleft())
+            except IndexError:
+                break
+        if not batch:
+            return
+        latest = {key: i for i, (_, _, key) in enumerate(batch) if key is not None}
+        for i, (callback, data, key) in enumerate(batch):
+            if key is None or latest[key] == i:
+                self._invoke(callback, data)
+
+    def _pump_ui(self):
+        root = self._instance._ui_root
+        if root is None:
+            return
+        self.process_ui_events()
+        try:
+            root.after(self._instance._ui_interval, self._pump_ui)
+        except Exception:
+            # The root window was destroyed
+            self._instance._ui_root = None
+
+def concerns_station(data, station):
+    """
+    True if an event is about the given station. Events without a station (e.g. a run starting on
+    every station) concern all stations, and a station of None accepts every event.
+    """
+    event_station = data.get("station") if data else None
+    return station is None or event_station is None or event_station == station
 
 # Initialize the singleton instance
 event_system = EventSystem()
@@ -0,0 +1,182 @@
+import os
+import glob
+import gzip
+import shutil
+import logging
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+class SegmentLock:
+    """
+    Marks a log segment as in use by a live process: an exclusive lock on a hidden side file
+    (.<segment name>.lock), taken before the segment is created and held while it is written.
+    The operating system drops the lock when the process exits, also when it crashes.
+    """
+
+    def __init__(self, segment_path):
+        directory, name = os.path.split(segment_path)
+        self.path = os.path.join(directory, f".{name}.lock")
+        self._file = None
+
+    def acquire(self):
+        """Takes the lock without waiting. Returns False if another process holds it."""
+        lock_file = open(self.path, 'a+b')
+        try:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file
+        return True
+
+    def release(self):
+        """Releases the lock and removes the side file."""
+        if self._file is None:
+            return
+        try:
+            # Removed while still locked, so no other process can take a lock on a file that is going away
+            os.remove(self.path)
+        except OSError:
+            pass  # Windows does not remove open files; the next acquire reuses it
+        self._file.close()
+        self._file = None
+
+class LogRotationPolicy:
+    """
+    Decides when the active log segment is closed and how long archives are kept.
+
+    A segment is rotated when it grows beyond max_bytes or when a shift boundary passes.
+    Closed segments are compressed, and archives beyond max_archives or older than
+    max_age_days are deleted.
+    """
+
+    def __init__(self, max_bytes=50 * 1024 * 1024, shift_hours=(6, 14, 22), compression='gzip',
+                 max_archives=500, max_age_days=180):
+        self.max_bytes = max_bytes
+        self.shift_hours = tuple(sorted(shift_hours))
+        self.compression = compression
+        self.max_archives = max_archives
+        self.max_age_days = max_age_days
+
+    def next_boundary(self, opened_at):
+        """Returns the epoch time of the first shift boundary after opened_at, or None without shifts."""
+        if not self.shift_hours:
+            return None
+        opened = datetime.datetime.fromtimestamp(opened_at)
+        for days in (0, 1):
+            day = opened.date() + datetime.timedelta(days=days)
+            for hour in self.shift_hours:
+                boundary = datetime.datetime.combine(day, datetime.time(hour))
+                if boundary > opened:
+                    return boundary.timestamp()
+        return None
+
+    def should_rotate(self, size, rotate_at, now):
+        return size >= self.max_bytes or (rotate_at is not None and now >= rotate_at)
+
+class LogArchiver:
+    """Compresses closed log segments on a background thread and applies the retention policy."""
+
+    def __init__(self, directory, pattern, policy):
+        """
+        Args:
+            directory (str): Directory holding the log segments.
+            pattern (str): Glob matching plain segments, e.g. "HV_tester_log_*.txt".
+            policy (LogRotationPolicy): Compression and retention settings.
+        """
+        self.directory = directory
+        self.pattern = pattern
+        self.policy = policy
+        self.compression = policy.compression
+        if self.compression == 'zstd' and zstandard is None:
+            logging.warning("zstandard is not installed, compressing log archives with gzip instead.")
+            self.compression = 'gzip'
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="LogArchiver")
+        self._lock = threading.Lock()
+
+    @property
+    def suffix(self):
+        return '.zst' if self.compression == 'zstd' else '.gz'
+
+    def archive(self, path, lock=None):
+        """Queues a closed segment for compression and releases its SegmentLock afterwards. Returns a future."""
+        return self._executor.submit(self._archive_locked, path, lock)
+
+    def archive_leftovers(self, active_path):
+        """
+        Queues plain segments left behind by processes that have exited. Segments whose SegmentLock is
+        held, i.e. the active segments of running processes, are left alone.
+        """
+        for path in glob.glob(os.path.join(self.directory, self.pattern)):
+            if os.path.abspath(path) == os.path.abspath(active_path):
+                continue
+            lock = SegmentLock(path)
+            if lock.acquire():
+                self.archive(path, lock)
+
+    def _archive_locked(self, path, lock):
+        try:
+            if os.path.exists(path):  # Another process may have archived it before the lock was taken
+                self._archive(path)
+        finally:
+            if lock:
+                lock.release()
+
+    def _archive(self, path):
+        try:
+            self._compress(path)
+        except OSError as e:
+            logging.error(f"Failed to archive log segment '{path}': {e}")
+        self.prune()
+
+    def _compress(self, path):
+        target = path + self.suffix
+        temporary = target + '.tmp'
+        with open(path, 'rb') as source, open(temporary, 'wb') as destination:
+            if self.compression == 'zstd':
+                zstandard.ZstdCompressor(level=10).copy_stream(source, destination)
+            else:
+                with gzip.GzipFile(fileobj=destination, mode='wb', compresslevel=6) as compressed:
+                    shutil.copyfileobj(source, compressed, 1024 * 1024)
+        # Only drop the plain segment once the archive is complete
+        os.replace(temporary, target)
+        os.remove(path)
+
+    def archives(self):
+        """Returns the archive paths, oldest first."""
+        archives = []
+        for suffix in ('.gz', '.zst'):
+            archives.extend(glob.glob(os.path.join(self.directory, self.pattern + suffix)))
+        return sorted(archives, key=os.path.getmtime)
+
+    def prune(self):
+        """Deletes archives beyond the retention count or age."""
+        with self._lock:
+            archives = self.archives()
+            cutoff = datetime.datetime.now().timestamp() - self.policy.max_age_days * 86400
+            excess = max(0, len(archives) - self.policy.max_archives)
+            for i, path in enumerate(archives):
+                try:
+                    if i < excess or os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except OSError as e:
+                    logging.error(f"Failed to delete log archive '{path}': {e}")
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,198 @@
+import os
+import queue
+import logging
+import threading
+import time
+
+ROTATION_RETRY_INTERVAL = 60.0  # Seconds before retrying a rotation whose new segment could not be opened
+
+_FLUSH = object()
+_CLOSE = object()
+
+class BufferedLogWriter:
+    """
+    Appends lines to a log file from a dedicated thread.
+
+    Lines are batched and written when the batch reaches max_batch_lines or max_batch_bytes,
+    or when flush_interval seconds have passed since the first unwritten line. A durable flush
+    also fsyncs the file, which is only requested at test boundaries.
+
+    With a rotation policy, a new segment is opened at next_path() once the policy says so, the
+    active segment is closed and its path is passed to on_rotate. If the new segment cannot be
+    opened, lines keep going to the active segment and rotation is retried later.
+
+    File errors are reported through the logging module and the failed batch is dropped; the
+    writer thread keeps running so later lines are still written.
+    """
+
+    def __init__(self, path, max_batch_lines=256, max_batch_bytes=64 * 1024, flush_interval=1.0,
+                 rotation=None, next_path=None, on_rotate=None, header=None, on_write=None):
+        """
+        Args:
+            path (str): Path of the first segment.
+            rotation (LogRotationPolicy): When to close the active segment. None disables rotation.
+            next_path (callable): Returns the path of the next segment.
+            on_rotate (callable): Called on the writer thread with the path of each closed segment.
+            header (callable): Returns text written at the start of every new segment.
+            on_write (callable): Called on the writer thread with the file offset a batch was written at
+                                 and the batch's lines, e.g. to index the lines.
+        """
+        self.max_batch_lines = max_batch_lines
+        self.max_batch_bytes = max_batch_bytes
+        self.flush_interval = flush_interval
+        self.rotation = rotation
+        self.next_path = next_path
+        self.on_rotate = on_rotate
+        self.header = header
+        self.on_write = on_write
+
+        self._queue = queue.SimpleQueue()
+        self.errors = 0  # File operations that failed on the writer thread
+        self._retry_rotation_at = 0.0
+        self._open_segment(path)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="LogWriter", daemon=True)
+        self._thread.start()
+
+    def write(self, line):
+        """Queues a line for writing. Never blocks on file I/O."""
+        if not self._closed:
+            self._queue.put(line)
+
+    def flush(self, durable=False, wait=False, timeout=None):
+        """
+        Writes everything queued so far. With durable=True the file is also fsynced.
+        With wait=True, blocks until that has happened or `timeout` seconds have passed, and
+        returns False if the flush did not complete.
+        """
+        if self._closed:
+            return False
+        done = threading.Event()
+        self._queue.put((_FLUSH, durable, done))
+        if not wait:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # Checks on the thread so a writer that died cannot block the caller forever
+        while not done.wait(0.1):
+            if not self._thread.is_alive() or (deadline is not None and time.monotonic() >= deadline):
+                return False
+        return True
+
+    def close(self):
+        """Writes and fsyncs everything queued, then stops the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_CLOSE)
+        self._thread.join()
+
+    def _open_segment(self, path):
+        self._use_segment(path, open(path, 'ab'))
+
+    def _use_segment(self, path, file):
+        self.path = path
+        self._file = file
+        self._size = self._file.tell()
+        self._rotate_at = self.rotation.next_boundary(time.time()) if self.rotation else None
+        if self.header and self._size == 0:
+            self._write(self.header().encode('utf-8'))
+
+    def _rotate(self):
+        # The new segment is opened before the active one is closed, so a failure leaves a usable file
+        try:
+            path = self.next_path()
+            file = open(path, 'ab')
+        except Exception as e:
+            self._report(f"Cannot open a new log segment, continuing in '{self.path}'", e)
+            self._retry_rotation_at = time.time() + ROTATION_RETRY_INTERVAL
+            return
+        self._sync()
+        closed_file, closed_path = self._file, self.path
+        self._use_segment(path, file)
+        try:
+            closed_file.close()
+        except Exception as e:
+            self._report(f"Cannot close log file '{closed_path}'", e)
+        if self.on_rotate:
+            self.on_rotate(closed_path)
+
+    def _write(self, data):
+        self._file.write(data)
+        self._size += len(data)
+
+    def _write_batch(self, batch):
+        if not batch:
+            return
+        try:
+            data = ''.join(batch).encode('utf-8')
+            now = time.time()
+            if (self.rotation and now >= self._retry_rotation_at
+                    and self.rotation.should_rotate(self._size + len(data), self._rotate_at, now)):
+                self._rotate()
+            self._write(data)
+            self._file.flush()
+            # In append mode the position after the write is the real end of the file, even when
+            # another process appended to it in the meantime
+            offset = self._file.tell() - len(data)
+        except Exception as e:
+            self._report(f"Dropped {len(batch)} log line(s) for '{self.path}'", e)
+            batch.clear()
+            return
+        try:
+            if self.on_write:
+                self.on_write(offset, batch)
+        except Exception as e:
+            self._report(f"Cannot process the lines written to '{self.path}'", e)
+        finally:
+            batch.clear()
+
+    def _sync(self):
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except Exception as e:
+            self._report(f"Cannot sync log file '{self.path}'", e)
+
+    def _report(self, message, error):
+        # Not through the event system: the Logger listens to LOG_EVENT and writes through this writer
+        self.errors += 1
+        logging.error(f"{message}: {error}")
+
+    def _run(self):
+        batch = []
+        batch_bytes = 0
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _CLOSE:
+                self._write_batch(batch)
+                self._sync()
+                try:
+                    self._file.close()
+                except Exception as e:
+                    self._report(f"Cannot close log file '{self.path}'", e)
+                return
+            if isinstance(item, tuple) and item[0] is _FLUSH:
+                _, durable, done = item
+                try:
+                    self._write_batch(batch)
+                    if durable:
+                        self._sync()
+                finally:
+                    done.set()
+                batch_bytes, deadline = 0, None
+                continue
+            if item is not None:
+                batch.append(item)
+                batch_bytes += len(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if batch and (item is None or len(batch) >= self.max_batch_lines or batch_bytes >= self.max_batch_bytes):
+                self._write_batch(batch)
+                batch_bytes, deadline = 0, None
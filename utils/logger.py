@@ -1,34 +1,69 @@
 import os
 import time
 from utils.event_system import event_system, EventType
+from utils.log_writer import BufferedLogWriter
+from utils.log_rotation import LogRotationPolicy, LogArchiver, SegmentLock
 
 class Logger:
     _instance = None
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
-            cls._instance = super(Logger, cls).__new__(cls, *args, **kwargs)
+            cls._instance = super(Logger, cls).__new__(cls)
             cls._instance._initialized = False
         return cls._instance
 
-    def __init__(self):
+    def __init__(self, rotation=None):
         if self._initialized:
             return
         self._initialized = True
 
         self.log_directory = os.path.join(os.getcwd(), "log_files")
         os.makedirs(self.log_directory, exist_ok=True)
-        start_time = time.strftime("%Y%m%d_%H%M%S")
-        self.log_file_path = os.path.join(self.log_directory, f"HV_tester_log_{start_time}.txt")
-        self._initialize_log_file()
+        self.rotation = rotation or LogRotationPolicy()
+        self.archiver = LogArchiver(self.log_directory, "HV_tester_log_*.txt", self.rotation)
+        self._segment_locks = {}  # Path -> SegmentLock of the segments this process has not archived yet
+        # File I/O happens on the writer thread; closed segments are compressed by the archiver
+        self.writer = BufferedLogWriter(
+            self._new_log_file_path(),
+            rotation=self.rotation,
+            next_path=self._new_log_file_path,
+            on_rotate=self._archive_segment,
+            header=self._log_file_header
+        )
+        self.archiver.archive_leftovers(self.log_file_path)
         
-        # Register the log_event listener
+        # Register the log_event listener. Formatting happens on the dispatching thread so timestamps are exact.
         event_system.register_listener(EventType.LOG_EVENT, self.handle_log_event)
+        # Make the audit trail durable at test boundaries
+        event_system.register_listener(EventType.TEST_STARTED, self.handle_test_boundary)
+        event_system.register_listener(EventType.TEST_TERMINATED, self.handle_test_boundary)
+
+    @property
+    def log_file_path(self):
+        """Path of the active log segment."""
+        return self.writer.path
+
+    def _new_log_file_path(self):
+        """Returns the path of a new segment, locked for this process so other processes leave it alone."""
+        start_time = time.strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(self.log_directory, f"HV_tester_log_{start_time}.txt")
+        suffix = 1
+        while True:
+            if not os.path.exists(path) and not os.path.exists(path + self.archiver.suffix):
+                lock = SegmentLock(path)
+                if lock.acquire():
+                    self._segment_locks[path] = lock
+                    return path
+            path = os.path.join(self.log_directory, f"HV_tester_log_{start_time}_{suffix}.txt")
+            suffix += 1
 
-    def _initialize_log_file(self):
-        with open(self.log_file_path, 'w') as log_file:
-            log_file.write("Log File Created\n")
-            log_file.write(f"Start Time: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+    def _archive_segment(self, path):
+        """Called on the writer thread with a rotated segment; its lock is released once it is archived."""
+        self.archiver.archive(path, self._segment_locks.pop(path, None))
+
+    def _log_file_header(self):
+        return f"Log File Created\nStart Time: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
 
     def handle_log_event(self, data):
         message = data.get('message', 'No message provided.')
@@ -38,12 +73,22 @@ class Logger:
         self._write_log(log_entry)
 
     def _write_log(self, log_entry):
-        with open(self.log_file_path, 'a') as log_file:
-            log_file.write(log_entry)
+        self.writer.write(log_entry)
+
+    def handle_test_boundary(self, data):
+        self.writer.flush(durable=True)
+
+    def close(self):
+        """Writes and fsyncs any buffered log lines, stops the writer thread and finishes pending archives."""
+        self.writer.close()
+        self.archiver.close()
+        # The active segment stays plain; the next process archives it as a leftover
+        for lock in self._segment_locks.values():
+            lock.release()
+        self._segment_locks.clear()
 
     def __del__(self):
-        # Unregister the listener when the Logger is destroyed
+        # Unregister the listeners when the Logger is destroyed
         event_system.unregister_listener(EventType.LOG_EVENT, self.handle_log_event)
-
-# Initialize the Logger instance at program start
-logger = Logger()
+        event_system.unregister_listener(EventType.TEST_STARTED, self.handle_test_boundary)
+        event_system.unregister_listener(EventType.TEST_TERMINATED, self.handle_test_boundary)
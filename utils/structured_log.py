@@ -0,0 +1,242 @@
+"""
+Structured event log: one JSON object per event in a daily JSONL file, next to the free-text log.
+
+Each JSONL file has a sidecar index (same name with .idx) holding the byte offset and length of every
+record that belongs to a serial number ({"s", "t", "o", "n"}), plus a sparse time index ({"t", "o"}).
+Lookups by serial number or time range read the small index and seek straight to the matching records instead of scanning the log.
+Offsets are taken on the writer thread from the file position of each written batch, so they stay right
+when several processes append to the same day file.
+
+Records are attributed to a unit by the serial number in the event, else by the unit under test on the
+event's station. An event without either is only attributed when a single unit is under test.
+"""
+
+import os
+import json
+import time
+import bisect
+import datetime
+import functools
+import threading
+
+from utils.event_system import event_system, EventType, LogLevel
+from utils.log_writer import BufferedLogWriter
+
+TIME_INDEX_INTERVAL = 256  # Records between sparse time index entries
+
+class StructuredLogSink:
+    EVENT_TYPES = (
+        EventType.LOG_EVENT,
+        EventType.TEST_STARTED,
+        EventType.SERIAL_NUMBER_CONFIRMED,
+        EventType.SUB_TEST_CONCLUDED,
+        EventType.BATCH_INFO_CONFIRMED,
+        EventType.TEST_TERMINATED,
+    )
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(os.getcwd(), "log_files")
+        os.makedirs(self.directory, exist_ok=True)
+        self.serial_numbers = {}  # Station -> serial number of the unit under test there
+        self.batch_info = None
+
+        self._lock = threading.Lock()
+        self._day = None
+        self._writer = None
+        self._index_writer = None
+        self._closing = []  # Threads closing the files of previous days
+
+        self._listeners = {event_type: functools.partial(self.handle_event, event_type) for event_type in self.EVENT_TYPES}
+        for event_type, listener in self._listeners.items():
+            event_system.register_listener(event_type, listener)
+
+    def _open_day(self, now):
+        """Switches to the JSONL file of the current day. Caller holds the lock."""
+        day = time.strftime("%Y%m%d", time.localtime(now))
+        if day == self._day:
+            return
+        if self._writer:
+            # Closing joins the writer threads and fsyncs; done in the background so the event that
+            # starts the new day does not hold every other station's events behind that I/O
+            closing = threading.Thread(target=self._close_writers, args=(self._writer, self._index_writer),
+                                       name="StructuredLogClose", daemon=True)
+            closing.start()
+            self._closing = [thread for thread in self._closing if thread.is_alive()] + [closing]
+        path = os.path.join(self.directory, f"HV_tester_events_{day}.jsonl")
+        # The index writer is created first, the records' writer thread writes to it
+        self._index_writer = BufferedLogWriter(path[:-len(".jsonl")] + ".idx")
+        # Each day has its own time index counter, the previous day's writer may still be indexing
+        self._writer = BufferedLogWriter(path, on_write=functools.partial(self._index_records, self._index_writer,
+                                                                         {"since_time_entry": TIME_INDEX_INTERVAL}))
+        self._day = day
+
+    @staticmethod
+    def _close_writers(writer, index_writer):
+        # Records first, so the index entries of their last batch are queued before the index closes
+        writer.close()
+        index_writer.close()
+
+    def _close_files(self):
+        if self._writer:
+            self._close_writers(self._writer, self._index_writer)
+        self._writer = self._index_writer = None
+
+    def _index_records(self, index_writer, counter, offset, lines):
+        """Called on the records' writer thread with the offset a batch of lines was written at."""
+        for line in lines:
+            length = len(line.encode('utf-8'))
+            record = json.loads(line)
+            if record.get("serial_number"):
+                index_writer.write(json.dumps({"s": record["serial_number"], "t": record["ts"], "o": offset, "n": length}, separators=(',', ':')) + "\n")
+            counter["since_time_entry"] += 1
+            if counter["since_time_entry"] >= TIME_INDEX_INTERVAL:
+                index_writer.write(json.dumps({"t": record["ts"], "o": offset}, separators=(',', ':')) + "\n")
+                counter["since_time_entry"] = 0
+            offset += length
+
+    def handle_event(self, event_type, data):
+        data = data or {}
+        now = time.time()
+        level = data.get("level")
+        record = {
+            "ts": round(now, 3),
+            "event": event_type.value,
+            "level": level.name if isinstance(level, LogLevel) else level,
+            "station": data.get("station"),
+            "serial_number": data.get("serial_number") or self._serial_number(data.get("station")),
+            "test_number": data.get("test_number"),
+            "voltage": data.get("voltage"),
+            "current": data.get("current"),
+            "status": data.get("status"),
+            "message": data.get("message"),
+        }
+        if event_type == EventType.BATCH_INFO_CONFIRMED:
+            self.batch_info = data.get("batch_info")
+        # Sub-test events carry the batch of their unit, which may differ from the batch entered last
+        batch_info = data.get("batch_info") or self.batch_info
+        if batch_info is not None:
+            record["work_order"] = batch_info.work_order_number
+            record["lot_hardener"] = batch_info.lot_hardener_number
+        line = json.dumps({key: value for key, value in record.items() if value is not None}) + "\n"
+
+        with self._lock:
+            self._open_day(now)
+            self._writer.write(line)
+
+        if event_type == EventType.SERIAL_NUMBER_CONFIRMED:
+            self.serial_numbers[data.get("station")] = data.get("serial_number")
+        elif event_type == EventType.TEST_TERMINATED:
+            self.serial_numbers.clear()
+            self.flush(durable=True)
+
+    def _serial_number(self, station):
+        """The unit under test on the station; without a station, the unit under test if there is only one."""
+        if station is not None:
+            return self.serial_numbers.get(station)
+        serial_numbers = set(self.serial_numbers.values())
+        return serial_numbers.pop() if len(serial_numbers) == 1 else None
+
+    def flush(self, durable=False, wait=False):
+        with self._lock:
+            if self._writer:
+                # With wait, the index entries of the flushed records are queued before the index is flushed
+                self._writer.flush(durable=durable, wait=wait)
+                self._index_writer.flush(durable=durable, wait=wait)
+
+    def close(self):
+        for event_type, listener in self._listeners.items():
+            event_system.unregister_listener(event_type, listener)
+        with self._lock:
+            self._close_files()
+            closing, self._closing = self._closing, []
+        for thread in closing:
+            thread.join()
+
+class StructuredLogIndex:
+    """Queries the structured event logs through their sidecar indexes."""
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(os.getcwd(), "log_files")
+        self._cache = {}  # index path -> (mtime, size, serial offsets, time entries)
+
+    def _files(self, start=None, end=None):
+        """Returns the JSONL files whose day overlaps [start, end], oldest first."""
+        first = time.strftime("%Y%m%d", time.localtime(start)) if start is not None else "00000000"
+        last = time.strftime("%Y%m%d", time.localtime(end)) if end is not None else "99999999"
+        files = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.startswith("HV_tester_events_") and name.endswith(".jsonl"):
+                day = name[len("HV_tester_events_"):-len(".jsonl")]
+                if first <= day <= last:
+                    files.append(os.path.join(self.directory, name))
+        return files
+
+    def _load_index(self, path):
+        index_path = path[:-len(".jsonl")] + ".idx"
+        if not os.path.exists(index_path):
+            return {}, []
+        stat = os.stat(index_path)
+        cached = self._cache.get(index_path)
+        if cached and cached[:2] == (stat.st_mtime, stat.st_size):
+            return cached[2], cached[3]
+        serials, time_entries = {}, []
+        with open(index_path, 'r', encoding='utf-8') as index_file:
+            for line in index_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # A partially written last line
+                if "s" in entry:
+                    serials.setdefault(entry["s"], []).append((entry["t"], entry["o"], entry["n"]))
+                else:
+                    time_entries.append((entry["t"], entry["o"]))
+        self._cache[index_path] = (stat.st_mtime, stat.st_size, serials, time_entries)
+        return serials, time_entries
+
+    def find_serial(self, serial_number, start=None, end=None):
+        """Returns every record of a serial number, optionally limited to a time range."""
+        records = []
+        for path in self._files(start, end):
+            serials, _ = self._load_index(path)
+            entries = [entry for entry in serials.get(serial_number, [])
+                       if (start is None or entry[0] >= start) and (end is None or entry[0] <= end)]
+            if not entries:
+                continue
+            with open(path, 'rb') as log_file:
+                for _, offset, length in entries:
+                    log_file.seek(offset)
+                    records.append(json.loads(log_file.read(length)))
+        return records
+
+    def find_between(self, start, end):
+        """Yields every record with start <= ts <= end, seeking to the nearest time index entry."""
+        for path in self._files(start, end):
+            _, time_entries = self._load_index(path)
+            position = bisect.bisect_right([ts for ts, _ in time_entries], start) - 1
+            offset = time_entries[position][1] if position >= 0 else 0
+            with open(path, 'rb') as log_file:
+                log_file.seek(offset)
+                for line in log_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record["ts"] > end:
+                        break
+                    if record["ts"] >= start:
+                        yield record
+
+    def failed_serials(self, test_number, start, end):
+        """Returns the serial numbers whose given sub-test did not succeed within the time range."""
+        return sorted({
+            record["serial_number"] for record in self.find_between(start, end)
+            if record["event"] == EventType.SUB_TEST_CONCLUDED.value
+            and record.get("test_number") == test_number
+            and record.get("status") != "SUCCESS"
+            and record.get("serial_number")
+        })
+
+def days_ago(days):
+    """Returns the epoch time of local midnight `days` days ago, for query ranges."""
+    midnight = datetime.datetime.combine(datetime.date.today() - datetime.timedelta(days=days), datetime.time())
+    return midnight.timestamp()